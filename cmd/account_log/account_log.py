@@ -9,7 +9,6 @@ Collects:
 import datetime
 import http
 import json
-import time
 
 import kucoin.exceptions
 import pandas as pd
@@ -36,18 +35,20 @@ def account_log(event, context):
 
     # Populate the table with all open trades, total values, and percentage of current account value
     try:
-        time.sleep(15) # allow the API a cooloff period after the initail calls
         df = pd.DataFrame(ACCOUNT.client.get_accounts())
-        df = df[df["balance"].astype(float) > 0.0001]
-        df["prices"] = df["currency"].apply(lambda x: ACCOUNT.client.get_fiat_prices(symbol=x).get(x))
-        df["total_value"] = df["balance"].astype(float) * df["prices"].astype(float)
+        # A currency can be held in several account types (main, trade). Rows are keyed by currency and
+        # datetime, and a key may appear only once per BatchWriteItem, so holdings are summed per currency
+        df[["balance", "available", "holds"]] = df[["balance", "available", "holds"]].astype(float)
+        df = df.groupby("currency", as_index=False)[["balance", "available", "holds"]].sum()
+        df = df[df["balance"] > 0.0001]
+        df["prices"] = df["currency"].map(ACCOUNT.prices.get)  # Snapshot init_account priced with, per-symbol fallback
+        df["total_value"] = df["balance"] * df["prices"].astype(float)
         df["percent_of_account"] = df["total_value"] / df["total_value"].sum() * 100
         df["datetime"] = datetime.datetime.utcnow().strftime(HC.time_format)
         df = df[["currency", "balance", "available", "holds", "prices", "total_value", "percent_of_account", "datetime"]]
 
-        for row in df.to_dict(orient="records"):
-            item = DYNAMO.create_item_from_dict(row)
-            DYNAMO.account_log_put_item(HC.table_account_position_log, item)
+        items = [DYNAMO.create_item_from_dict(row) for row in df.to_dict(orient="records")]
+        DYNAMO.batch_write_items(HC.table_account_position_log, items)
 
     except kucoin.exceptions.KucoinAPIException as e:
         if e.code == "503000":
@@ -59,6 +60,7 @@ def account_log(event, context):
                 })
             }
 
+    print(f"KuCoin client: {ACCOUNT.client.metrics()}")
     return {
         "statusCode": http.HTTPStatus.OK,
         "body": json.dumps({
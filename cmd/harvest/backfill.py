@@ -0,0 +1,221 @@
+"""
+backfill.py
+Backfill harvests years of history that the executor's 60 day lookback never reaches. The date range of each
+slug is split into chunks; every chunk is one `HarvestRequest` carrying all metrics, so the engine packs several
+chunks into each Santiment call under the shared request budget. A chunk is recorded in the checkpoint only once
+its rows are written, so an interrupted backfill resumes where it stopped. Rows are keyed by slug and
+datetime_metric and written with plain puts, so a chunk that is harvested twice stores the same items.
+
+`SantimentFixture` records Santiment responses to a JSON file and replays them, so a backfill can run locally
+without an API key.
+"""
+import json
+import os
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+import san
+
+from cmd.harvest.engine import HarvestEngine, HarvestRequest, frames_to_samples
+from internal.ratelimit.ratelimit import TokenBucket
+
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+def split_range(date_from: str, date_to: str, chunk_days: int) -> List[Tuple[str, str]]:
+    """
+    Consecutive, non-overlapping inclusive ranges covering [date_from, date_to]
+    :param date_from:
+    :param date_to: a bare date includes the whole day
+    :param chunk_days:
+    :return:
+    """
+    start = pd.Timestamp(date_from)
+    end = pd.Timestamp(date_to)
+    if len(date_to) == 10:
+        end += pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
+    chunks = list()
+    while start <= end:
+        stop = min(start + pd.Timedelta(days=chunk_days) - pd.Timedelta(seconds=1), end)
+        chunks.append((start.strftime(TIME_FORMAT), stop.strftime(TIME_FORMAT)))
+        start = stop + pd.Timedelta(seconds=1)
+    return chunks
+
+
+class Checkpoint:
+    def __init__(self, path: Optional[str]):
+        """
+        Completed chunks, kept in a JSON file. Without a path progress is only kept in memory
+        :param path:
+        """
+        self.path = path
+        self.completed = set()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.completed = set(json.load(f)["completed"])
+
+    def done(self, key: str) -> bool:
+        return key in self.completed
+
+    def mark(self, key: str) -> None:
+        self.completed.add(key)
+        if not self.path:
+            return
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"completed": sorted(self.completed)}, f)
+        os.replace(tmp, self.path)  # A crash mid-write leaves the previous checkpoint intact
+
+
+class SantimentFixture:
+    def __init__(self, series: Dict[str, List[List]] = None):
+        """
+        Recorded Santiment series keyed by query, e.g. "price_usd/bitcoin": [["2021-01-01T00:00:00Z", 1.0], ...]
+        :param series:
+        """
+        self.series = series or dict()
+
+    @classmethod
+    def load(cls, path: str) -> "SantimentFixture":
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def save(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(self.series, f)
+
+    def recorder(self, execute: Callable[[san.Batch], List[pd.DataFrame]] = None) \
+            -> Callable[[san.Batch], List[pd.DataFrame]]:
+        """
+        Wrap a live batch call so every response is recorded
+        :param execute: defaults to `san.Batch.execute`
+        :return:
+        """
+        execute = execute or (lambda batch: batch.execute())
+
+        def record(batch: san.Batch) -> List[pd.DataFrame]:
+            frames = execute(batch)
+            for (query, _), df in zip(batch.queries, frames):
+                if "value" not in df.columns:
+                    continue
+                rows = self.series.setdefault(query, list())
+                known = {row[0] for row in rows}
+                for dt, value in zip(df.index.strftime(TIME_FORMAT), df["value"]):
+                    if dt not in known:
+                        rows.append([dt, None if pd.isna(value) else float(value)])
+                rows.sort()
+            return frames
+
+        return record
+
+    def execute(self, batch: san.Batch) -> List[pd.DataFrame]:
+        """
+        Replay: one frame per query with the recorded rows inside its from_date/to_date range
+        :param batch:
+        :return:
+        """
+        frames = list()
+        for query, kwargs in batch.queries:
+            rows = self.series.get(query, list())
+            index = pd.DatetimeIndex(pd.to_datetime([row[0] for row in rows], utc=True), name="datetime")
+            df = pd.DataFrame({"value": [float("nan") if row[1] is None else row[1] for row in rows]}, index=index)
+            if kwargs.get("from_date"):
+                df = df[df.index >= utc(kwargs["from_date"])]
+            if kwargs.get("to_date"):
+                df = df[df.index <= utc(kwargs["to_date"])]
+            frames.append(df)
+        return frames
+
+
+def utc(value: str) -> pd.Timestamp:
+    ts = pd.Timestamp(value)
+    return ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+
+
+class Backfill:
+    def __init__(self, engine: HarvestEngine, write: Callable[[pd.DataFrame], bool], checkpoint: Checkpoint,
+                 wait_on_rate_limit: bool = True):
+        """
+        :param engine:
+        :param write: stores the rows of one chunk, returns False when some rows were not stored
+        :param checkpoint:
+        :param wait_on_rate_limit: sleep until Santiment accepts requests again, else stop and leave the rest
+            to a resumed run
+        """
+        self.engine = engine
+        self.write = write
+        self.checkpoint = checkpoint
+        self.wait_on_rate_limit = wait_on_rate_limit
+        self.stats = {"chunks": 0, "skipped": 0, "rows": 0, "failed": 0, "rate_limited": 0}
+        self.slugs_written = set()  # Slugs with rows stored by this run
+
+    def run(self, slugs: Iterable[str], date_from: str, date_to: str, chunk_days: int = 90) -> Dict:
+        """
+        :param slugs:
+        :param date_from:
+        :param date_to:
+        :param chunk_days: days per Santiment query
+        :return:
+            stats
+        """
+        requests = list()
+        for slug in slugs:
+            for chunk_from, chunk_to in split_range(date_from, date_to, chunk_days):
+                request = HarvestRequest.for_range(slug, chunk_from, chunk_to)
+                if self.checkpoint.done(request.message_id):
+                    self.stats["skipped"] += 1
+                    continue
+                requests.append(request)
+
+        while requests:
+            rate_limited = list()
+            for request, result in self.engine.harvest(requests):
+                if isinstance(result, Exception):
+                    if san.is_rate_limit_exception(result):
+                        rate_limited.append((request, result))
+                    else:
+                        print(f"Chunk {request.message_id} failed: {result}")
+                        self.stats["failed"] += 1
+                    continue
+                self.store(request, result)
+
+            requests = [request for request, _ in rate_limited]
+            self.stats["rate_limited"] += len(requests)
+            if not requests:
+                break
+            if not self.wait_on_rate_limit:
+                print(f"Rate limited: {len(requests)} chunks left for the next run")
+                break
+            seconds = san.rate_limit_time_left(rate_limited[0][1])
+            print(f"Rate limited: waiting {seconds}s for {len(requests)} chunks")
+            time.sleep(seconds)
+            self.engine.rate_limited = None
+        return self.stats
+
+    def store(self, request: HarvestRequest, frames: List[pd.DataFrame]) -> None:
+        samples, _ = frames_to_samples(request.slug, frames, metrics=self.engine.metrics)
+        if samples is not None and len(samples):
+            # Chunks never overlap, but a key must appear only once in a BatchWriteItem call
+            samples = samples.drop_duplicates(subset="datetime_metric", keep="last")
+            if not self.write(samples):
+                print(f"Chunk {request.message_id} not fully written")
+                self.stats["failed"] += 1
+                return
+            self.stats["rows"] += len(samples)
+            self.slugs_written.add(request.slug)
+        # No rows (the slug did not exist yet) is a completed chunk too
+        self.checkpoint.mark(request.message_id)
+        self.stats["chunks"] += 1
+
+
+def create_engine(rate: float = 1.0, capacity: int = 5, fixture: SantimentFixture = None, **kwargs) -> HarvestEngine:
+    """
+    :param rate: Santiment requests per second
+    :param capacity: burst
+    :param fixture: replay recorded responses instead of calling Santiment
+    :param kwargs: passed to `HarvestEngine`
+    :return:
+    """
+    execute = fixture.execute if fixture is not None else None
+    return HarvestEngine(TokenBucket(rate=rate, capacity=capacity), execute=execute, **kwargs)
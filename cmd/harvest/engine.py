@@ -0,0 +1,202 @@
+"""
+engine.py
+Harvest engine for many slugs per invocation. The metric queries of several slugs are packed into a single
+`san.Batch`, which Santiment receives as one GraphQL request. Every request takes a token from one shared
+budget, and results are yielded slug by slug as their request completes, so the caller can write each slug
+while the rest are still in flight.
+"""
+import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+import pandas as pd
+import san
+
+from internal.ratelimit.ratelimit import TokenBucket
+from internal.service_dynamo.codec import HARVEST_METRICS
+
+SANTIMENT_METRICS = list(HARVEST_METRICS)  # Queried metrics. Rows are stored by name, in the HARVEST_METRICS layout
+REQUIRED_METRICS = ["price_usd", "active_addresses_24h_change_1d"]
+
+
+class HarvestRequest:
+    """
+    One slug to harvest, parsed from a harvest queue record. `datetime_last_updated` is the slug's harvest
+    watermark: the datetime of the newest sample already stored, or "null" when the slug has none yet.
+    """
+
+    def __init__(self, record: Dict):
+        self.record = record
+        self.message_id = record.get("messageId")
+        self.slug = record["body"]
+        self.ticker = record["messageAttributes"]["ticker"]["stringValue"]
+        self.watermark = record["messageAttributes"]["datetime_last_updated"]["stringValue"]
+        # Stamp of the slug's last backfill, forwarded to the strategy so its cache reloads the series
+        self.backfilled = record["messageAttributes"].get("datetime_backfilled", {}).get("stringValue", "null")
+        self.from_date = None
+        self.to_date = None
+
+    @classmethod
+    def for_range(cls, slug: str, date_from: str, date_to: str, ticker: str = "") -> "HarvestRequest":
+        """
+        Request for a fixed date range, used by the backfill
+        :param slug:
+        :param date_from: inclusive
+        :param date_to: inclusive
+        :param ticker:
+        :return:
+        """
+        request = cls({
+            "messageId": f"{slug}/{date_from}/{date_to}", "body": slug,
+            "messageAttributes": {
+                "ticker": {"stringValue": ticker}, "datetime_last_updated": {"stringValue": "null"}
+            }
+        })
+        request.from_date = date_from
+        request.to_date = date_to
+        return request
+
+    def set_watermark(self, watermark: Optional[str], default_from_date: str) -> None:
+        """
+        Request only samples strictly newer than the watermark. Santiment treats `from` as inclusive,
+        so the request starts one second after it
+        :param watermark: "%Y-%m-%dT%H:%M:%SZ" (or a bare date), None when unknown
+        :param default_from_date: start for slugs without a watermark
+        :return:
+        """
+        self.watermark = watermark or "null"
+        if watermark is None:
+            self.from_date = default_from_date
+            return
+        after = pd.Timestamp(watermark) + pd.Timedelta(seconds=1)
+        self.from_date = after.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    def to_sqs_format(self, delay_seconds: int = 0) -> Dict:
+        return {
+            "DelaySeconds": delay_seconds,
+            "MessageBody": self.slug,
+            "MessageAttributes": {
+                "datetime_last_updated": {"StringValue": self.watermark, "DataType": "String"},
+                "ticker": {"StringValue": self.ticker, "DataType": "String"},
+                "datetime_backfilled": {"StringValue": self.backfilled, "DataType": "String"}
+            }
+        }
+
+
+class HarvestEngine:
+    def __init__(self, budget: TokenBucket, metrics: List[str] = None, slugs_per_call: int = 5,
+                 max_workers: int = 2, execute: Callable[[san.Batch], List[pd.DataFrame]] = None):
+        """
+        :param budget: shared Santiment request budget, one token per GraphQL call
+        :param metrics:
+        :param slugs_per_call: slugs packed into one batch query
+        :param max_workers: GraphQL calls in flight
+        :param execute: runs a batch. Defaults to `san.Batch.execute`; tests pass a recorded response
+        """
+        self.budget = budget
+        self.metrics = metrics or SANTIMENT_METRICS
+        self.slugs_per_call = slugs_per_call
+        self.max_workers = max_workers
+        self.execute = execute or (lambda batch: batch.execute())
+        self.rate_limited = None
+        self.stats = {"calls": 0, "slugs": 0, "throttle_seconds": 0.0, "split_retries": 0}
+
+    def fetch(self, requests: List[HarvestRequest]) -> List[List[pd.DataFrame]]:
+        """
+        Metric frames for each request from a single GraphQL call
+        :param requests:
+        :return:
+            One list of frames (in metric order) per request
+        """
+        if self.rate_limited is not None:
+            raise self.rate_limited  # The budget is spent. Do not spend more calls finding that out again
+
+        batch = san.Batch()
+        for request in requests:
+            kwargs = {"from_date": request.from_date}
+            if request.to_date is not None:
+                kwargs["to_date"] = request.to_date
+            for metric in self.metrics:
+                batch.get(f"{metric}/{request.slug}", **kwargs)
+        self.stats["throttle_seconds"] += self.budget.acquire()
+        self.stats["calls"] += 1
+        try:
+            frames = self.execute(batch)
+        except Exception as e:
+            if san.is_rate_limit_exception(e):
+                self.rate_limited = e
+            raise
+        n = len(self.metrics)
+        return [frames[i * n:(i + 1) * n] for i in range(len(requests))]
+
+    def harvest(self, requests: List[HarvestRequest]) -> Iterator[Tuple[HarvestRequest, Union[List, Exception]]]:
+        """
+        Harvest every request. A failed multi-slug call is retried slug by slug so one bad slug does not fail
+        its neighbours; rate limit errors are not retried.
+        :param requests:
+        :return:
+            (request, frames) or (request, exception) as each request completes
+        """
+        chunks = [requests[i:i + self.slugs_per_call] for i in range(0, len(requests), self.slugs_per_call)]
+        if not chunks:
+            return
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(chunks))) as pool:
+            futures = {pool.submit(self.fetch, chunk): chunk for chunk in chunks}
+            for future in as_completed(futures):
+                chunk = futures[future]
+                try:
+                    results = future.result()
+                except Exception as e:
+                    if len(chunk) == 1 or san.is_rate_limit_exception(e):
+                        for request in chunk:
+                            yield request, e
+                        continue
+                    self.stats["split_retries"] += 1
+                    for request in chunk:
+                        try:
+                            yield request, self.fetch([request])[0]
+                        except Exception as single:
+                            yield request, single
+                    continue
+                for request, frames in zip(chunk, results):
+                    self.stats["slugs"] += 1
+                    yield request, frames
+
+
+def frames_to_samples(slug: str, frames: List[pd.DataFrame], metrics: List[str] = None, after: str = None) \
+        -> Tuple[Optional[pd.DataFrame], Optional[datetime.datetime]]:
+    """
+    Join the metric frames of one slug into harvest rows
+    :param slug:
+    :param frames: in metric order
+    :param metrics:
+    :param after: watermark. Rows at or before it are already stored and are dropped
+    :return:
+        (rows with slug, datetime_metric and float64 metric columns, last datetime). An all-empty response
+        (nothing newer than the watermark) gives an empty frame and None. (None, None) when a non-empty
+        response is missing a required metric
+    """
+    metrics = metrics or SANTIMENT_METRICS
+    if all(df.empty for df in frames):
+        # sanpy answers a range without samples with a bare `pd.DataFrame([])`, no `value` column
+        return pd.DataFrame(columns=list(metrics) + ["datetime_metric", "slug"], dtype="float64"), None
+    for df, col in zip(frames, metrics):
+        df.rename(columns={"value": col}, inplace=True)
+    results = pd.concat(frames, axis=1)
+    if any(metric not in results.columns for metric in REQUIRED_METRICS):
+        print(f"Slug {slug} missing desire columns")
+        print(f"Result after concat: \n{results}")
+        return None, None
+
+    results = results.dropna(subset=REQUIRED_METRICS).reset_index()
+    if after is not None and after != "null":
+        cutoff = pd.Timestamp(after)
+        cutoff = cutoff.tz_localize("UTC") if cutoff.tzinfo is None else cutoff.tz_convert("UTC")
+        if results["datetime"].dt.tz is None:
+            cutoff = cutoff.tz_localize(None)
+        results = results[results["datetime"] > cutoff].copy()
+    results_last_datetime = results["datetime"].max() if len(results) else None
+    results["datetime_metric"] = results["datetime"].dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+    results.drop(labels=["datetime"], axis=1, inplace=True)
+    results["slug"] = slug
+    return results, results_last_datetime
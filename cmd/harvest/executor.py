@@ -1,34 +1,38 @@
 """
 executor.py
 executor is trigger by SQS Items. Each item contains a slug and date range. Desired
-metrics are harvested from Santiment over the date range. Once complete, an SNS message
-is published showing data are complete
+metrics are harvested from Santiment over the date range for every slug in the batch, several slugs per
+Santiment call (see `engine.py`). Each slug is written to Dynamo as soon as its call completes and is then
+passed on to the strategy queue.
 """
 import datetime
-import http
 import json
 import random
-from typing import Dict
 
-import pandas as pd
 import san
 
-from internal import HC, DYNAMO
+from cmd.harvest.engine import HarvestEngine, HarvestRequest, frames_to_samples
+from internal import HC, DYNAMO, Lazy
+from internal.ratelimit.ratelimit import TokenBucket
+from internal.service_dynamo.codec import ColumnarCodec, HARVEST_METRICS
 from internal.service_sqs.sqs import ServiceSQS
 
-SQSHarvest = ServiceSQS(HC.queue_harvest)
-SQSStrategy = ServiceSQS(HC.queue_strategy)
-san.ApiConfig.api_key = HC.santiment_key
+SQSHarvest = Lazy(lambda: ServiceSQS(HC.queue_harvest))
+SQSStrategy = Lazy(lambda: ServiceSQS(HC.queue_strategy))
 
 
-def send_to_queue_for_reprocessing(record: Dict, delay_seconds: int) -> str:
-    message = {
-        "DelaySeconds": delay_seconds,
-        "MessageBody": record["body"],
-        "MessageAttributes": record["messageAttributes"]
-    }
-    message_id = SQSHarvest.send_message(message)
-    return message_id
+def create_lake():
+    from internal.service_lake.lake import HarvestLake  # pyarrow is only needed when the mirror is enabled
+    return HarvestLake(HC.harvest_lake_uri)
+
+
+LAKE = Lazy(create_lake)
+# The blob layout is the one the readers decode with, whatever order Santiment is queried in
+CODEC = Lazy(lambda: ColumnarCodec(HARVEST_METRICS, float32=HC.harvest_float32))
+
+# Santiment request budget shared by every call this container makes. The function runs with a reserved
+# concurrency of 1, so this is the budget of the whole harvest
+SANTIMENT_BUDGET = TokenBucket(rate=1.0, capacity=5)
 
 
 def executor(event, context):
@@ -37,111 +41,102 @@ def executor(event, context):
     have the following attributes:
         1. MessageBody - slug
         2. MessageAttributes
-            datetime_last_updated: value or "null"
+            datetime_last_updated: harvest watermark of the slug or "null"
             ticker: str
+            datetime_backfilled: stamp of the slug's last backfill or "null", passed on to the strategy
 
+    Only samples strictly newer than the watermark are requested and written. After a slug is stored, its
+    watermark on the discovery table is advanced with a conditional write.
+
+    Records that fail are reported back to SQS as batch item failures; rate limited slugs are re-enqueued
+    with a delay.
     :param event:
     :param context:
     :return:
     """
-    # Metrics to collect
-    santiment_metrics = [
-        "price_usd", "marketcap_usd",
-        "exchange_outflow_change_1d", "exchange_inflow_change_1d",
-        "age_consumed",
-        "active_addresses_24h_change_1d", 'volume_usd_change_1d', 'volume_usd'
-    ]
-
-    for record in event["Records"]:
-        # Index for dynamo and santiment
-        slug = record["body"]
-        ticker = record["messageAttributes"]["ticker"]["stringValue"]
-
-        # Handle cases where things have not yet been updated
-        datetime_last_updated = record["messageAttributes"]["datetime_last_updated"]["stringValue"]
-        if datetime_last_updated == "null":
-            last_update = DYNAMO.harvest_get_last_update_for_slug(HC.table_harvest, slug)
-            if last_update is not None:
-                datetime_last_updated = last_update
+    san.ApiConfig.api_key = HC.santiment_key
+
+    default_from_date = (datetime.datetime.utcnow() - datetime.timedelta(days=60)).strftime("%Y-%m-%d")
+    requests = [HarvestRequest(record) for record in event["Records"]]
+    for request in requests:
+        # The watermark comes from the discovery scan in the primer. Only slugs harvested before watermarks
+        # were kept need the latest row looked up, once
+        watermark = request.watermark
+        if watermark == "null":
+            watermark = DYNAMO.harvest_get_last_update_for_slug(HC.table_harvest, request.slug)
+        request.set_watermark(watermark, default_from_date)
+
+    engine = HarvestEngine(SANTIMENT_BUDGET)
+    failures = list()
+    rate_limited = list()
+    strategy_messages = list()
+    written = 0
+    for request, result in engine.harvest(requests):
+        if isinstance(result, Exception):
+            if san.is_rate_limit_exception(result):
+                # Rate limit and random backoff between 1 and 10 minutes
+                delay_seconds = min(san.rate_limit_time_left(result) + random.randint(60, 600), 900)
+                rate_limited.append(request.to_sqs_format(delay_seconds))
             else:
-                datetime_last_updated = (datetime.datetime.utcnow() - datetime.timedelta(days=60)).strftime("%Y-%m-%d")
-
-        # Build the batch for each of the metrics
-        batch = san.Batch()
-        for metric in santiment_metrics:
-            batch.get(
-                f"{metric}/{slug}",
-                from_date=datetime_last_updated
+                print(f"Slug {request.slug} failed: {result}")
+                failures.append({"itemIdentifier": request.message_id})
+            continue
+
+        samples, results_last_datetime = frames_to_samples(request.slug, result, after=request.watermark)
+        if samples is None:
+            print(f"Deleting {request.slug} from {HC.table_discovery}")
+            DYNAMO.discovery_delete_item(HC.table_discovery, request.slug)
+            continue
+
+        # Write everything to Dynamo, one item per day with the metrics packed in a blob
+        items = CODEC.items_from_frame(samples)
+        report = DYNAMO.batch_write_items(HC.table_harvest, items, max_workers=4)
+        written += report["items"]
+        print(f"Slug {request.slug} wrote {report['items']} items in {report['calls']} calls. "
+              f"WCU: {sum(report['consumed_capacity'])}")
+
+        # Mirror the batch to the Parquet lake. Dynamo stays the source of truth, so a failure is only logged
+        if HC.harvest_lake_uri and len(samples):
+            try:
+                LAKE.write(samples)
+            except Exception as e:
+                print(f"Slug {request.slug} not mirrored to {HC.harvest_lake_uri}: {e}")
+
+        if results_last_datetime is None:
+            continue  # Nothing newer than the watermark
+
+        # Advance the watermark only once every row is stored, so unprocessed rows are fetched again
+        if report["unprocessed"] == 0:
+            DYNAMO.discovery_set_watermark(
+                HC.table_discovery, request.slug, results_last_datetime.strftime(HC.time_format)
             )
 
-        # Make the call. Handle rate-limiting
-        try:
-            results = batch.execute()
-        except Exception as e:
-            if san.is_rate_limit_exception(e):
-                print(e)
-                SQSHarvest.delete_message(record["receiptHandle"])
-                print(f"Deleting record for slug: {slug}")
-                # Rate limit and random backoff between 1 and 10 minutes
-                delay_seconds = min(san.rate_limit_time_left(e) + random.randint(60, 600), 900)
-                record["messageAttributes"]["datetime_last_updated"]["stringValue"] = datetime_last_updated
-                message_id = send_to_queue_for_reprocessing(record, delay_seconds)
-                print("Republished to SQS - MessageID: ", message_id)
-            else:
-                raise e
-
-        # Rename the columns to metric names
-        for df, col in zip(results, santiment_metrics):
-            df.rename(columns={"value": col}, inplace=True)
-
-        # Join the dataframes. If it is missing the two important metrics, it will be delete
-        results = pd.concat(results, axis=1)
-        if "price_usd" not in results.columns or "active_addresses_24h_change_1d" not in results.columns:
-            print(f"Slug {slug} missing desire columns")
-            print(f"Result after concat: \n{results}")
-            print(f"Deleting {slug} from {HC.table_discovery}")
-            DYNAMO.discovery_delete_item(HC.table_discovery, slug)
-
-        # Drop empty records and get datetime back into the columns
-        try:
-            results = results.dropna(subset=["price_usd", "active_addresses_24h_change_1d"]).reset_index()
-        except KeyError as e:
-            DYNAMO.discovery_delete_item(HC.table_discovery, slug)
-            print(f"Key Error: Deleting {slug} from {HC.table_discovery}")
-            return
-        results_last_datetime = results["datetime"].max()
-        results["datetime_metric"] = results["datetime"].dt.strftime("%Y-%m-%dT%H:%M:%SZ")
-        results.drop(labels=["datetime"], axis=1, inplace=True)
-
-        results["slug"] = slug
-        results = results.astype(str)
-        results = results.to_dict(orient="records")
-
-        # Write everything to Dynamo
-        for sample in results:
-            item = DYNAMO.create_item_from_dict(sample)
-            DYNAMO.harvest_create_item(HC.table_harvest, item)
-        SQSHarvest.delete_message(record["receiptHandle"])
-
-        # Publish to SQS
-        message_id = SQSStrategy.send_message({
-            "MessageBody": slug,
+        strategy_messages.append({
+            "MessageBody": request.slug,
             "MessageAttributes": {
                 "datetime_last_updated": {
                     "StringValue": results_last_datetime.strftime(HC.time_format),
                     "DataType": "String"
                 },
                 "ticker": {
-                    "StringValue": ticker,
+                    "StringValue": request.ticker,
+                    "DataType": "String"
+                },
+                "datetime_backfilled": {
+                    "StringValue": request.backfilled,
                     "DataType": "String"
                 }
             }
         })
-        print(f"Slug {slug} santiment scraped. Sent to next queue: {SQSStrategy.queue_name}")
-        return {
-            "statusCode": http.HTTPStatus.OK,
-            "body": json.dumps({
-                "message": f"Loaded data for {slug}",
-                "message_id": message_id
-            })
-        }
+
+    if rate_limited:
+        print(f"Rate limited: republishing {len(rate_limited)} slugs to {SQSHarvest.queue_name}")
+        SQSHarvest.send_in_batches(rate_limited)
+    if strategy_messages:
+        SQSStrategy.send_in_batches(strategy_messages)
+
+    print(json.dumps({
+        "slugs": len(requests), "written": written, "to_strategy": len(strategy_messages),
+        "rate_limited": len(rate_limited), "failed": len(failures), "santiment": engine.stats
+    }))
+    return {"batchItemFailures": failures}
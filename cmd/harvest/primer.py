@@ -4,31 +4,28 @@ Primer loads crypto slugs from the `TABLE_DISCOVERY`.
 For each pair in the table:
     A queue item is created with:
         slug
-        date_since last metrics harvested
-        date_to (daily close) to harvested data. This is the right end point of the interval
+        datetimeLastUpdate: the harvest watermark, read in bulk by the discovery scan. The executor advances it
+        after each successful harvest
+        datetimeBackfilled: when a backfill last rewrote the slug's history, passed on to the strategy cache
 """
 import http
 import json
-from random import shuffle
-from internal import HC, DYNAMO
+from internal import HC, DYNAMO, Lazy
 from internal.service_sqs.sqs import ServiceSQS
 
-SQS = ServiceSQS(HC.queue_harvest)
+SQS = Lazy(lambda: ServiceSQS(HC.queue_harvest))
 
 
 def primer(event, context):
     # Scan the dynamo table for pairs and last_udpated
     # Create SQS Items for each of the pairs
-    all_tickers = DYNAMO.discovery_scan(HC.table_discovery)
-    shuffle(all_tickers)
-    message_ids = [
-        SQS.send_message(item.to_sqs_format(delay_seconds=min(delay * 3, 900)))
-        for delay, item in enumerate(all_tickers)
-    ]
+    # Tickers are enqueued as scan pages arrive. Parallel segments already interleave the hash ranges.
+    # No spacing is needed: the executor takes many slugs per invocation and paces Santiment itself
+    all_tickers = DYNAMO.discovery_scan_iter(HC.table_discovery, total_segments=4)
+    messages = (item.to_sqs_format(delay_seconds=0) for item in all_tickers)
+    counts = SQS.send_in_batches(messages)
 
     return {
         "statusCode": http.HTTPStatus.OK,
-        "body": json.dumps({
-            "message_ids": message_ids
-        })
+        "body": json.dumps(counts)
     }
@@ -0,0 +1,80 @@
+import os
+
+import boto3
+import numpy as np
+import pandas as pd
+from moto import mock_aws
+
+from internal.service_dynamo.codec import ColumnarCodec
+from internal.service_dynamo.dynamo import ServiceDynamo
+from .backfill import Backfill, Checkpoint, SantimentFixture, create_engine, split_range
+from .engine import SANTIMENT_METRICS
+
+
+def santiment(batch):
+    """Stand-in for live Santiment: daily values from 2020-01-01 inside each query's range"""
+    frames = list()
+    for query, kwargs in batch.queries:
+        index = pd.date_range("2020-01-01", "2020-12-31", freq="D", tz="UTC", name="datetime")
+        df = pd.DataFrame({"value": np.arange(len(index), dtype=float)}, index=index)
+        frames.append(df[(df.index >= pd.Timestamp(kwargs["from_date"])) & (df.index <= pd.Timestamp(kwargs["to_date"]))])
+    return frames
+
+
+def record_fixture(path):
+    fixture = SantimentFixture()
+    engine = create_engine(rate=1000, capacity=1000, slugs_per_call=4)
+    engine.execute = fixture.recorder(santiment)
+    Backfill(engine, lambda samples: True, Checkpoint(None)).run(["bitcoin", "ethereum"], "2020-01-01", "2020-12-31")
+    fixture.save(path)
+
+
+class TestSplitRange:
+    def test_chunks_cover_the_range_without_overlap(self):
+        chunks = split_range("2019-12-01", "2020-03-01", 30)
+        assert chunks[0] == ("2019-12-01T00:00:00Z", "2019-12-30T23:59:59Z")
+        assert chunks[1][0] == "2019-12-31T00:00:00Z"
+        assert chunks[-1][1] == "2020-03-01T23:59:59Z"
+
+
+class TestBackfill:
+    @mock_aws
+    def test_resume_and_idempotent_writes(self, tmp_path):
+        os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+        boto3.client("dynamodb").create_table(
+            TableName="harvest",
+            AttributeDefinitions=[{"AttributeName": n, "AttributeType": "S"} for n in ["slug", "datetime_metric"]],
+            KeySchema=[{"AttributeName": "slug", "KeyType": "HASH"}, {"AttributeName": "datetime_metric", "KeyType": "RANGE"}],
+            BillingMode="PAY_PER_REQUEST"
+        )
+        record_fixture(tmp_path / "santiment.json")
+        fixture = SantimentFixture.load(tmp_path / "santiment.json")
+        assert len(fixture.series) == 2 * len(SANTIMENT_METRICS)
+        dynamo = ServiceDynamo()
+        codec = ColumnarCodec()
+        fail = {"ethereum"}
+
+        def write(samples):
+            if samples["slug"].iloc[0] in fail:
+                return False
+            return dynamo.batch_write_items("harvest", codec.items_from_frame(samples))["unprocessed"] == 0
+
+        def run():
+            engine = create_engine(rate=1000, capacity=1000, fixture=fixture, slugs_per_call=4)
+            backfill = Backfill(engine, write, Checkpoint(str(tmp_path / "checkpoint.json")))
+            stats = backfill.run(["bitcoin", "ethereum"], "2019-10-01", "2020-12-31", chunk_days=120)
+            return stats, engine.stats, backfill.slugs_written
+
+        stats, calls, written = run()
+        assert stats["chunks"] == 4 and stats["failed"] == 4  # 2019 chunks have no rows yet
+        assert stats["rows"] == 366 and written == {"bitcoin"}
+        fail.clear()
+        stats, calls, _ = run()  # Resumes with the ethereum chunks only
+        assert stats["skipped"] == 4 and stats["chunks"] == 4 and calls["calls"] == 1
+
+        os.remove(tmp_path / "checkpoint.json")
+        run()  # Everything again: the same keys are overwritten
+        items = list(dynamo.scan_iter("harvest"))
+        assert len(items) == 2 * 366
+        df = codec.frame_from_items(items).sort_values(["slug", "datetime_metric"])
+        assert df["price_usd"].iloc[-1] == 365.0
@@ -0,0 +1,87 @@
+import pandas as pd
+import san
+from san.pandas_utils import convert_to_datetime_idx_df
+
+from internal.ratelimit.ratelimit import TokenBucket
+from .engine import HarvestEngine, HarvestRequest, SANTIMENT_METRICS, frames_to_samples
+
+
+def record(slug: str):
+    return {
+        "messageId": slug, "body": slug,
+        "messageAttributes": {
+            "ticker": {"stringValue": slug.upper()},
+            "datetime_last_updated": {"stringValue": "2021-09-01"}
+        }
+    }
+
+
+def fake_execute(calls, bad_slug=None):
+    """Stand-in for a Santiment batch call: one frame per query, in query order"""
+    def execute(batch):
+        calls.append(len(batch.queries))
+        slugs = {query[0].split("/")[1] for query in batch.queries}
+        if bad_slug in slugs:
+            raise san.error.SanError(f"unknown slug {bad_slug}")
+        index = pd.DatetimeIndex(["2021-09-01", "2021-09-02"], name="datetime", tz="UTC")
+        return [pd.DataFrame({"value": [1.0, 2.0]}, index=index) for _ in batch.queries]
+    return execute
+
+
+class TestHarvestEngine:
+    def test_packs_slugs_into_few_calls(self):
+        calls = list()
+        engine = HarvestEngine(TokenBucket(1000, 1000), slugs_per_call=5, execute=fake_execute(calls))
+        results = dict((request.slug, frames) for request, frames in engine.harvest(
+            [HarvestRequest(record(f"slug{i}")) for i in range(12)]
+        ))
+        assert len(results) == 12
+        assert sorted(calls) == sorted([5 * 8, 5 * 8, 2 * 8])
+        samples, last = frames_to_samples("slug0", results["slug0"])
+        assert len(samples) == 2
+        assert set(SANTIMENT_METRICS) <= set(samples.columns)
+        assert samples["price_usd"].dtype == "float64"
+        assert last == pd.Timestamp("2021-09-02", tz="UTC")
+
+    def test_bad_slug_does_not_fail_its_neighbours(self):
+        calls = list()
+        engine = HarvestEngine(TokenBucket(1000, 1000), slugs_per_call=3, execute=fake_execute(calls, "bad"))
+        results = dict((r.slug, frames) for r, frames in engine.harvest(
+            [HarvestRequest(record(slug)) for slug in ["a", "bad", "c"]]
+        ))
+        assert isinstance(results["bad"], Exception)
+        assert not isinstance(results["a"], Exception) and not isinstance(results["c"], Exception)
+        assert engine.stats["split_retries"] == 1
+
+
+class TestWatermark:
+    def test_backfill_stamp_is_forwarded(self):
+        incoming = record("bitcoin")
+        assert HarvestRequest(incoming).backfilled == "null"
+        incoming["messageAttributes"]["datetime_backfilled"] = {"stringValue": "2021-09-02T00:00:00Z"}
+        message = HarvestRequest(incoming).to_sqs_format()
+        assert message["MessageAttributes"]["datetime_backfilled"]["StringValue"] == "2021-09-02T00:00:00Z"
+
+    def test_requests_strictly_newer_samples(self):
+        request = HarvestRequest(record("bitcoin"))
+        request.set_watermark("2021-09-01T00:00:00Z", "2021-07-01")
+        assert request.from_date == "2021-09-01T00:00:01Z"
+        request.set_watermark(None, "2021-07-01")
+        assert request.from_date == "2021-07-01" and request.watermark == "null"
+
+    def test_rows_at_watermark_are_dropped(self):
+        frames = fake_execute(list())(type("Batch", (), {"queries": [["m/bitcoin", {}]] * 8})())
+        samples, last = frames_to_samples("bitcoin", frames, after="2021-09-01T00:00:00Z")
+        assert list(samples["datetime_metric"]) == ["2021-09-02T00:00:00Z"]
+        samples, last = frames_to_samples("bitcoin", frames, after="2021-09-02T00:00:00Z")
+        assert samples.empty and last is None
+
+    def test_no_new_samples_is_not_a_missing_metric(self):
+        # The frame sanpy builds when Santiment has no sample in the range
+        frames = [convert_to_datetime_idx_df([]) for _ in SANTIMENT_METRICS]
+        samples, last = frames_to_samples("bitcoin", frames, after="2021-09-02T00:00:00Z")
+        assert samples is not None and samples.empty and last is None
+
+        frames = fake_execute(list())(type("Batch", (), {"queries": [["m/bitcoin", {}]] * 8})())
+        frames[0] = convert_to_datetime_idx_df([])  # price_usd missing while other metrics have rows
+        assert frames_to_samples("bitcoin", frames) == (None, None)
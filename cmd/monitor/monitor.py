@@ -1,67 +1,97 @@
 """
 monitor.py
-Monitor tracks open trades.  Should be triggered by single events due to the timeout visibility
-If open buy trades are canceled after their 1 hour lifetime, their details are removed from tradeMeta and tradeDetails.
-If open sell trades are filled, delete them from tradeMeta.
-
-If an item should not complete, delete receiptHandle and re-add to queue
-
-Once orders have filled, send a message to the TwitterBot to make a post about entry and exit
-
+Monitor tracks open orders placed by the trade services. Each SQS message carries a batch of orders
+(see `internal.service_sqs.signal_monitor`). Per invocation:
+    1. every active order on the account is listed once (paged); orders missing from the list are no longer
+       active and their final details are fetched concurrently
+    2. each order is moved through the state machine in `internal.service_kucoin.order_state`
+       (active, partially filled, filled, cancelled)
+    3. transitions are written to the order repository with conditional writes, so replays are no-ops
+    4. orders that are not filled or cancelled are re-enqueued, packed into as few messages as possible,
+       with a delay computed from the number of checks and the order's cancel time
 """
-from typing import Dict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
 
+import kucoin.exceptions
 from kucoin.client import Client
 
-from internal import HC
+from internal import HC, ORDERS, Lazy
+from internal.service_kucoin.client import RateLimitedClient
+from internal.service_kucoin.order_state import TERMINAL, next_delay, next_state, OrderState
+from internal.service_kucoin.orders import OpenOrderIndex
+from internal.service_sqs.signal_monitor import MonitoredOrder, create_monitor_messages
 from internal.service_sqs.sqs import ServiceSQS
 
-SQSMonitor = ServiceSQS(HC.queue_monitor)
+SQSMonitor = Lazy(lambda: ServiceSQS(HC.queue_monitor))
+
+MAX_ATTEMPTS = 200  # Stop following an order KuCoin cannot find after this many checks
+
 
+def get_kucoin_client(key: str, secret: str, api_pass_phrase: str) -> RateLimitedClient:
+    return RateLimitedClient(Client(api_key=key, api_secret=secret, passphrase=api_pass_phrase))
 
-class SQSMessage:
-    def __init__(self, record: Dict):
-        self.slug = record["slug"]
-        self.guid_meta = record["messageAttributes"]["guid_meta"]["stringValue"]
-        self.guid_details = record["messageAttributes"]["guid_details"]
-        self.order_id = record["messageAttributes"]["order_id"]["stringValue"]
 
+def fetch_order_details(client: RateLimitedClient, order_ids: List[str], max_workers: int = 8) -> Dict[str, Dict]:
+    """
+    `get_order` for each id concurrently. Orders KuCoin cannot return are left out
+    :param client:
+    :param order_ids:
+    :param max_workers:
+    :return:
+        {order_id: order}
+    """
+    def fetch(order_id: str):
+        try:
+            return client.get_order(order_id)
+        except kucoin.exceptions.KucoinAPIException as e:
+            print(f"Order {order_id} not fetched: {e}")
+            return None
 
-def get_kucoin_client(key: str, secret: str, api_pass_phrase: str) -> Client:
-    return Client(api_key=key, api_secret=secret, passphrase=api_pass_phrase)
+    if not order_ids:
+        return dict()
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(order_ids))) as pool:
+        return {
+            order_id: order for order_id, order in zip(order_ids, pool.map(fetch, order_ids)) if order is not None
+        }
 
 
 def monitor(event, context):
-    client = get_kucoin_client(HC.kucoin_secret, HC.kucoin_key, HC.kucoin_api_passphrase)
-    for record in event["Records"]:
-        print(record)
-        msg = SQSMessage(record)
-        order = client.get_order(msg.order_id)
-
-        order_is_active = order.get("isActive")
-        order_is_cancelled = order.get("cancelExist")
-        order_side = order.get("side")
-
-        # For BUY side
-        if order_side == "buy":
-            if order_is_active:
-                # Still waiting on fill or timeout
-                # Send back to SQS
-                pass
-            if not order_is_active and order_is_cancelled:
-                # Did not fill due to time constraint
-                pass
-            if order_is_active and not order_is_cancelled:
-                # Order filled
-                pass
-
-        # For SELL side
-        if order_side == "sell":
-            if order_is_active:
-                # Still waiting. HOw long should it wait before changing the order?
-                pass
-            if not order_is_active:
-                # Fill occurred
-                pass
-
-        print(f"Done! No errors occurred for slug {msg.slug}")
+    tracked = [order for record in event["Records"] for order in MonitoredOrder.from_record(record)]
+    client = get_kucoin_client(HC.kucoin_key, HC.kucoin_secret, HC.kucoin_api_passphrase)
+
+    # One listing of every active order serves the whole batch. Orders missing from it are no longer
+    # active and are fetched individually for their final state
+    open_orders = OpenOrderIndex.load(client)
+    finished = fetch_order_details(client, [order.order_id for order in tracked if order.order_id not in open_orders])
+
+    transitions = list()
+    unresolved = list()
+    counts = {state.value: 0 for state in OrderState}
+    for order in tracked:
+        details = open_orders.get(order.order_id) or finished.get(order.order_id)
+        order.attempts += 1
+        if details is None:
+            if order.attempts < MAX_ATTEMPTS:
+                unresolved.append((next_delay(dict(), order.attempts), order))
+            else:
+                print(f"Giving up on order {order.order_id} for {order.slug}")
+            continue
+
+        state = next_state(order.state, details)
+        if state is not None:
+            print(f"{order.slug} {order.order_id}: {order.state} -> {state.value}")
+            transitions.append({
+                "order": {**details, "state_previous": order.state},
+                "slug": order.slug, "strategy_guid": order.strategy_guid, "status": state
+            })
+            order.state = state.value
+        counts[order.state] += 1
+
+        if OrderState(order.state) not in TERMINAL:
+            unresolved.append((next_delay(details, order.attempts), order))
+
+    written = ORDERS.save_many(transitions)
+    sent = SQSMonitor.send_in_batches(create_monitor_messages(unresolved)) if unresolved else {"sent": 0}
+    print(f"Orders: {len(tracked)} Transitions: {len(transitions)} Written: {written} States: {counts} Re-enqueued: {len(unresolved)} "
+          f"Messages: {sent['sent']} KuCoin: {client.metrics()}")
@@ -0,0 +1,219 @@
+"""
+backtest.py
+Offline backtester over harvest-shaped data (the columns the executor writes to TABLE_HARVEST).
+Indicators and trade actions come from `indicators.compute_indicators` evaluated for every slug and date in
+one grouped pass. The portfolio is then stepped day by day with all slugs handled as NumPy vectors, applying
+the same sizing rules as `Account.can_trade` and `Account.get_position_size_max`.
+"""
+import glob
+import os
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from cmd.strategy.indicators import StrategyParams, compute_indicators
+
+HARVEST_KEY_COLUMNS = ["slug", "datetime_metric"]
+
+
+def load_harvest(path: str) -> pd.DataFrame:
+    """
+    Load harvest rows from a Parquet or CSV file, a directory of them, or a harvest lake
+    (`internal.service_lake`) given as a local directory or URI
+    :param path:
+    :return:
+        Dataframe sorted by slug and datetime_metric with float metric columns
+    """
+    if "://" in path or (os.path.isdir(path) and glob.glob(os.path.join(path, "slug=*"))):
+        from internal.service_lake.lake import HarvestLake
+        return HarvestLake(path).read()
+    if os.path.isdir(path):
+        files = sorted(glob.glob(os.path.join(path, "**", "*.parquet"), recursive=True)) \
+                or sorted(glob.glob(os.path.join(path, "**", "*.csv"), recursive=True))
+        df = pd.concat([load_harvest(f) for f in files], ignore_index=True)
+    elif path.endswith(".csv"):
+        df = pd.read_csv(path)
+    else:
+        df = pd.read_parquet(path)
+
+    for col in df.columns:
+        if "datetime" in col or "slug" in col:
+            continue
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+    df["slug"] = df["slug"].astype(str)
+    df["datetime_metric"] = df["datetime_metric"].astype(str)
+    return df.drop_duplicates(subset=HARVEST_KEY_COLUMNS, keep="last") \
+        .sort_values(HARVEST_KEY_COLUMNS) \
+        .reset_index(drop=True)
+
+
+def compute_signals(df: pd.DataFrame, params: StrategyParams) -> pd.DataFrame:
+    """
+    Trade actions for every slug and date. Mirrors `get_trade_action`: OPEN wins over CLOSE.
+    :param df: output of `load_harvest`
+    :param params:
+    :return:
+        Long frame with slug, datetime_metric, price_usd, open and close columns
+    """
+    df = compute_indicators(df[HARVEST_KEY_COLUMNS + ["price_usd", "active_addresses_24h_change_1d"]].copy(),
+                            params, by="slug")
+    return pd.DataFrame({
+        "slug": df["slug"],
+        "datetime_metric": df["datetime_metric"],
+        "price_usd": df["price_usd"],
+        "open": df["trade_open"].to_numpy(),
+        "close": (~df["trade_open"] & df["trade_close"]).to_numpy()
+    })
+
+
+class BacktestResult:
+    def __init__(self, equity: pd.Series, exposure: pd.Series, trades: pd.DataFrame, balance_start: float):
+        self.equity = equity  # Mark-to-market account value per date
+        self.exposure = exposure  # Fraction of the account value held in positions per date
+        self.trades = trades  # One row per closed (or still open, at the last date) position
+        self.balance_start = balance_start
+
+    def summary(self) -> Dict[str, float]:
+        equity = self.equity.to_numpy()
+        drawdown = 1 - equity / np.maximum.accumulate(equity) if len(equity) else np.zeros(1)
+        pnl = self.trades["pnl"] if len(self.trades) else pd.Series(dtype=float)
+        return {
+            "pnl": float(equity[-1] - self.balance_start) if len(equity) else 0.0,
+            "return_pct": float((equity[-1] / self.balance_start - 1) * 100) if len(equity) else 0.0,
+            "trade_count": int(len(self.trades)),
+            "win_rate": float((pnl > 0).mean()) if len(pnl) else 0.0,
+            "exposure_mean": float(self.exposure.mean()) if len(self.exposure) else 0.0,
+            "days_in_market": float((self.exposure > 0).mean()) if len(self.exposure) else 0.0,
+            "max_drawdown_pct": float(drawdown.max() * 100)
+        }
+
+
+def simulate(signals: pd.DataFrame, balance: float = 1000.0, trades_max: int = 7, fee_rate: float = 0.001) -> BacktestResult:
+    """
+    Step the account through every date. Each day open positions with a CLOSE signal are sold at the day's
+    price, then OPEN signals are bought while the account can trade, in slug order. Sizing follows Account:
+        position_max = int(balance / trades_max)
+        can_trade    = trades_open < trades_max and balance_avail >= position_max * 0.5
+        size         = int(min(position_max, balance_avail)) - 1
+    Missing prices carry the last known price for valuation and never trigger a fill.
+    :param signals: output of `compute_signals`
+    :param balance: starting USDT
+    :param trades_max: STRATEGY_MAX_TRADES
+    :param fee_rate: taker fee charged on both sides
+    :return:
+    """
+    dates = np.sort(signals["datetime_metric"].unique())
+    wide = signals.pivot(index="datetime_metric", columns="slug").reindex(dates)
+    return simulate_arrays(
+        dates=dates,
+        slugs=wide["price_usd"].columns.to_numpy(),
+        price_raw=wide["price_usd"].to_numpy(dtype=np.float64),
+        opens=wide["open"].fillna(False).to_numpy(dtype=bool),
+        closes=wide["close"].fillna(False).to_numpy(dtype=bool),
+        balance=balance, trades_max=trades_max, fee_rate=fee_rate
+    )
+
+
+def simulate_arrays(dates: np.ndarray, slugs: np.ndarray, price_raw: np.ndarray, opens: np.ndarray,
+                    closes: np.ndarray, balance: float = 1000.0, trades_max: int = 7,
+                    fee_rate: float = 0.001) -> BacktestResult:
+    """
+    Core of `simulate` on wide (dates x slugs) arrays. NaN prices mark dates without a harvest row.
+    :param dates:
+    :param slugs:
+    :param price_raw: float64 (dates, slugs)
+    :param opens: bool (dates, slugs)
+    :param closes: bool (dates, slugs)
+    :param balance:
+    :param trades_max:
+    :param fee_rate:
+    :return:
+    """
+    tradable = ~np.isnan(price_raw)
+    price = pd.DataFrame(price_raw).ffill().to_numpy()
+    opens = opens & tradable
+    closes = closes & tradable
+
+    cash = float(balance)
+    units = np.zeros(len(slugs))
+    cost = np.zeros(len(slugs))
+    entry = np.full(len(slugs), -1)
+    equity = np.empty(len(dates))
+    exposure = np.empty(len(dates))
+    trades = list()
+
+    def record(i: int, t: int, proceeds: float, is_open: bool):
+        trades.append({
+            "slug": slugs[i], "datetime_open": dates[entry[i]], "datetime_close": None if is_open else dates[t],
+            "cost": cost[i], "proceeds": proceeds, "pnl": proceeds - cost[i]
+        })
+
+    for t in range(len(dates)):
+        held = units > 0
+
+        # Close positions first so their proceeds are available to buys on the same day
+        sell = held & closes[t]
+        if sell.any():
+            proceeds = units[sell] * price_raw[t, sell] * (1 - fee_rate)
+            cash += proceeds.sum()
+            for i, p in zip(sell.nonzero()[0], proceeds):
+                record(i, t, p, is_open=False)
+            units[sell] = 0
+            cost[sell] = 0
+            entry[sell] = -1
+            held = units > 0
+
+        buy = opens[t] & ~held
+        if buy.any():
+            holdings = np.nansum(units * price[t])
+            position_max = int((cash + holdings) / trades_max)
+            trades_open = int(held.sum())
+            for i in buy.nonzero()[0]:
+                if trades_open >= trades_max or cash < position_max * 0.5:
+                    break
+                size = int(min(position_max, cash)) - 1
+                if size <= 0:
+                    break
+                units[i] = size * (1 - fee_rate) / price_raw[t, i]
+                cost[i] = size
+                entry[i] = t
+                cash -= size
+                trades_open += 1
+
+        holdings = np.nansum(units * price[t])
+        equity[t] = cash + holdings
+        exposure[t] = holdings / equity[t] if equity[t] else 0.0
+
+    # Mark positions still open at the end
+    for i in (units > 0).nonzero()[0]:
+        record(i, len(dates) - 1, units[i] * price[-1, i] * (1 - fee_rate), is_open=True)
+
+    return BacktestResult(
+        equity=pd.Series(equity, index=dates, name="equity"),
+        exposure=pd.Series(exposure, index=dates, name="exposure"),
+        trades=pd.DataFrame(trades, columns=["slug", "datetime_open", "datetime_close", "cost", "proceeds", "pnl"]),
+        balance_start=balance
+    )
+
+
+def backtest(df: pd.DataFrame, params: StrategyParams, balance: float = 1000.0, trades_max: int = 7,
+             fee_rate: float = 0.001, date_from: Optional[str] = None, date_to: Optional[str] = None) -> BacktestResult:
+    """
+    Full run: signals for every slug and date, then the account simulation between date_from and date_to.
+    Indicators are computed over the whole history so the first simulated day already has a warm SMA.
+    :param df: output of `load_harvest`
+    :param params:
+    :param balance:
+    :param trades_max:
+    :param fee_rate:
+    :param date_from: inclusive datetime_metric string
+    :param date_to: inclusive datetime_metric string
+    :return:
+    """
+    signals = compute_signals(df, params)
+    if date_from:
+        signals = signals[signals["datetime_metric"] >= date_from]
+    if date_to:
+        signals = signals[signals["datetime_metric"] <= date_to]
+    return simulate(signals, balance=balance, trades_max=trades_max, fee_rate=fee_rate)
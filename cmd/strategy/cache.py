@@ -0,0 +1,154 @@
+"""
+cache.py
+Per-slug harvest time series cache for the strategy Lambda. Entries live in process memory across warm
+invocations and, when pyarrow is available, are mirrored to Parquet files in /tmp. Both tiers are bounded:
+memory by a number of slugs, disk by a byte budget, each evicting the least recently used slug.
+
+pyarrow is not in requirements.txt (see requirements-lake.txt), so the deployed Lambda runs with the memory
+tier only; the disk tier serves local runs where pyarrow is installed.
+
+Each entry carries the backfill stamp of its slug (`datetimeBackfilled` on the discovery table, forwarded
+through the harvest and strategy messages). A backfill can write rows inside an already cached range, which
+the top-up query never reads, so an entry whose stamp differs from the one requested is dropped.
+"""
+import glob
+import os
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401  Parquet support for the disk tier
+except ImportError:
+    pyarrow = None
+
+
+class TimeSeriesCache:
+    def __init__(self, max_entries: int = 512, disk_dir: Optional[str] = "/tmp/harvest_cache",
+                 max_disk_bytes: int = 128 * 2 ** 20):
+        """
+        :param max_entries: number of slugs held in memory before the least recently used is evicted
+        :param disk_dir: directory for the Parquet tier. None, or pyarrow missing, disables it
+        :param max_disk_bytes: size of the Parquet tier. Lambda's /tmp defaults to 512 MB
+        """
+        self.max_entries = max_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.disk_dir = disk_dir if pyarrow is not None else None
+        self.entries = OrderedDict()
+        self.versions = dict()  # {slug: backfill stamp the entry was built with}
+        self.disk = OrderedDict()  # {slug: file size}, least recently used first
+        self.disk_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+        self.invalidations = 0
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._scan_disk()
+
+    def _disk_path(self, slug: str) -> str:
+        return os.path.join(self.disk_dir, f"{slug}.parquet")
+
+    def _scan_disk(self) -> None:
+        """
+        Adopt the files an earlier process of this container left in /tmp, oldest first
+        :return:
+        """
+        paths = sorted(glob.glob(os.path.join(self.disk_dir, "*.parquet")), key=os.path.getmtime)
+        for path in paths:
+            self.disk[os.path.basename(path)[:-len(".parquet")]] = os.path.getsize(path)
+        self.disk_bytes = sum(self.disk.values())
+        self._evict_disk()
+
+    def get(self, slug: str, version: Optional[str] = None) -> Optional[pd.DataFrame]:
+        """
+        Cached frame for the slug or None. Memory is checked first, then the disk tier
+        :param slug:
+        :param version: backfill stamp of the slug. An entry built with another stamp is dropped. Files from an
+            earlier process have no known stamp and are only used for slugs that were never backfilled
+        :return:
+        """
+        if self.versions.get(slug) != version and (slug in self.entries or slug in self.disk):
+            self.invalidate(slug)
+            self.invalidations += 1
+
+        if slug in self.entries:
+            self.entries.move_to_end(slug)
+            self.hits += 1
+            return self.entries[slug]
+
+        if slug in self.disk:
+            try:
+                df = pd.read_parquet(self._disk_path(slug))
+            except Exception as e:
+                print(f"Cache: unreadable disk entry for {slug}: {e}")
+                self._remove_disk(slug)
+            else:
+                self.disk.move_to_end(slug)
+                self.disk_hits += 1
+                self.hits += 1
+                self._put_memory(slug, df)
+                return df
+
+        self.misses += 1
+        return None
+
+    def put(self, slug: str, df: pd.DataFrame, version: Optional[str] = None) -> None:
+        self._put_memory(slug, df)
+        self.versions[slug] = version
+        if self.disk_dir:
+            try:
+                df.to_parquet(self._disk_path(slug), index=False)
+            except Exception as e:
+                print(f"Cache: failed to persist {slug}: {e}")
+                self._remove_disk(slug)
+                return
+            self.disk_bytes += os.path.getsize(self._disk_path(slug)) - self.disk.get(slug, 0)
+            self.disk[slug] = os.path.getsize(self._disk_path(slug))
+            self.disk.move_to_end(slug)
+            self._evict_disk()
+
+    def _put_memory(self, slug: str, df: pd.DataFrame) -> None:
+        self.entries[slug] = df
+        self.entries.move_to_end(slug)
+        while len(self.entries) > self.max_entries:
+            evicted, _ = self.entries.popitem(last=False)
+            self.evictions += 1
+            self._forget(evicted)
+
+    def _evict_disk(self) -> None:
+        while self.disk_bytes > self.max_disk_bytes and self.disk:
+            evicted = next(iter(self.disk))
+            self._remove_disk(evicted)
+            self.disk_evictions += 1
+            self._forget(evicted)
+
+    def _remove_disk(self, slug: str) -> None:
+        self.disk_bytes -= self.disk.pop(slug, 0)
+        if os.path.exists(self._disk_path(slug)):
+            os.remove(self._disk_path(slug))
+
+    def _forget(self, slug: str) -> None:
+        if slug not in self.entries and slug not in self.disk:
+            self.versions.pop(slug, None)
+
+    def invalidate(self, slug: str) -> None:
+        self.entries.pop(slug, None)
+        self.versions.pop(slug, None)
+        if self.disk_dir:
+            self._remove_disk(slug)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "disk_hits": self.disk_hits,
+            "disk_bytes": self.disk_bytes,
+            "evictions": self.evictions,
+            "disk_evictions": self.disk_evictions,
+            "invalidations": self.invalidations
+        }
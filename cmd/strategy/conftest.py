@@ -0,0 +1,30 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from .indicators import StrategyParams
+
+
+@pytest.fixture
+def params() -> StrategyParams:
+    """The thresholds deployed in serverless.yml"""
+    return StrategyParams(
+        daa_enter_lower=-0.02, daa_enter_upper=0.5, daa_exit=-0.46, sma_lookback=2,
+        volatility_enter_lower=0.099, volatility_enter_upper=1.25, volatility_exit=1.7
+    )
+
+
+@pytest.fixture
+def harvest_frame():
+    """Builds daily harvest rows for one slug: a geometric random walk price and a noisy DAA change"""
+    def build(rows: int, seed: int = 3) -> pd.DataFrame:
+        rng = np.random.default_rng(seed)
+        start = datetime.datetime(2020, 1, 1)
+        return pd.DataFrame({
+            "datetime_metric": [(start + datetime.timedelta(days=i)).strftime("%Y-%m-%dT%H:%M:%SZ") for i in range(rows)],
+            "price_usd": 10 * np.exp(np.cumsum(rng.normal(0.002, 0.04, rows))),
+            "active_addresses_24h_change_1d": rng.normal(0, 0.3, rows),
+        })
+    return build
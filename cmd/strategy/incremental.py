@@ -0,0 +1,287 @@
+"""
+incremental.py
+Streaming indicator state for a single slug. Instead of recomputing the 30 day SMA, its derivative and the
+lookback trend over the full history, the state keeps a ring buffer of the SMA window with a running sum, the
+previous SMA and a counter of consecutive positive SMA derivatives. Each new harvest sample is folded in with a
+fixed amount of work and yields the same trade_open / trade_close decision as `indicators.compute_indicators`.
+The running sum is compensated (Kahan) and re-summed exactly once per pass over the window, so rounding
+error cannot accumulate.
+
+The strategy Lambda keeps one state per slug in an `IndicatorStateStore` in /tmp and folds in only the samples
+newer than the state with `advance`; a slug without usable state replays its harvest window once.
+"""
+import json
+import math
+import os
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from cmd.strategy.indicators import StrategyParams, compute_indicators
+
+NAN = float("nan")
+
+
+class IndicatorState:
+    def __init__(self, params: StrategyParams):
+        self.params = params
+        self.buffer = [NAN] * params.sma_window  # Ring buffer of the SMA window
+        self.cursor = 0  # Next slot to overwrite
+        self.count = 0  # Samples seen, capped at the window length
+        self.total = 0.0  # Running sum of the finite values in the buffer
+        self.compensation = 0.0  # Kahan compensation of `total`
+        self.nan_count = params.sma_window  # NaN slots in the buffer, unfilled slots included
+        self.prev_sma = NAN
+        self.positive_streak = 0  # Consecutive SMA derivatives > 0
+        self.finite_streak = 0  # Consecutive SMA derivatives that are not NaN
+        self.datetime_metric = None  # Datetime of the last sample folded in
+        self._undo = None  # Snapshot before the last update, used when the last sample is restated
+
+    def update(self, datetime_metric: str, price_usd: float, active_addresses_24h_change_1d: float) -> Dict:
+        """
+        Fold in one sample. A sample with the same datetime_metric as the previous one replaces it,
+        since the executor rewrites the most recent day on every harvest.
+        :param datetime_metric:
+        :param price_usd:
+        :param active_addresses_24h_change_1d:
+        :return:
+            Indicator values and trade decision for the sample
+        """
+        if self.datetime_metric is not None and datetime_metric <= self.datetime_metric:
+            if datetime_metric < self.datetime_metric or not self._undo:
+                raise ValueError(f"Sample {datetime_metric} is not newer than state {self.datetime_metric}")
+            self._restore(self._undo)
+        self._undo = {**self._scalars(), "slot_value": self.buffer[self.cursor]}
+
+        price = float(price_usd)
+        daa = float(active_addresses_24h_change_1d)
+
+        self._add(self.buffer[self.cursor], -1)  # The value leaving the window
+        self._add(price, 1)
+        self.buffer[self.cursor] = price
+        self.cursor = (self.cursor + 1) % self.params.sma_window
+        self.count = min(self.count + 1, self.params.sma_window)
+        if self.cursor == 0:
+            self._resum()  # Once per pass over the window: O(1) amortized
+
+        # Rolling mean is NaN until the window is full or while it holds a NaN
+        sma = NAN
+        if self.nan_count == 0:
+            sma = self.total / self.params.sma_window
+
+        sma_derivative = sma - self.prev_sma
+        if sma_derivative > 0:
+            self.positive_streak += 1
+        else:
+            self.positive_streak = 0  # Non-positive or NaN breaks the trend
+        self.finite_streak = 0 if math.isnan(sma_derivative) else self.finite_streak + 1
+        self.prev_sma = sma
+        self.datetime_metric = datetime_metric
+
+        if sma == 0:
+            delta = NAN if price == 0 else math.copysign(math.inf, price)
+        else:
+            delta = (price - sma) / sma
+        # The batch rolling window is NaN while it holds a NaN derivative
+        pos_trend = NAN
+        if self.finite_streak >= self.params.sma_lookback:
+            pos_trend = 1.0 if self.positive_streak >= self.params.sma_lookback else 0.0
+        trending = pos_trend == 1 and price > sma
+        volatility_enter_lower = delta < self.params.volatility_enter_lower
+        volatility_enter_upper = delta < self.params.volatility_enter_upper
+        volatility_exit = delta > self.params.volatility_exit
+        daa_enter_lower = daa >= self.params.daa_enter_lower
+        daa_enter_upper = daa <= self.params.daa_enter_upper
+        daa_exit = daa < self.params.daa_exit
+
+        # Same columns as `indicators.compute_indicators`
+        return {
+            "datetime_metric": datetime_metric,
+            "price_usd": price,
+            "active_addresses_24h_change_1d": daa,
+            "sma": sma,
+            "sma_derivative": sma_derivative,
+            "sma_derivative_pos_trend": pos_trend,
+            "delta": delta,
+            "volatility_enter_lower": volatility_enter_lower,
+            "volatility_enter_upper": volatility_enter_upper,
+            "volatility_enter": volatility_enter_lower and volatility_enter_upper,
+            "volatility_exit": volatility_exit,
+            "daa_enter_lower": daa_enter_lower,
+            "daa_enter_upper": daa_enter_upper,
+            "daa_enter": daa_enter_lower and daa_enter_upper,
+            "daa_exit": daa_exit,
+            "trending": trending,
+            "trade_open": daa_enter_lower and daa_enter_upper and trending and volatility_enter_lower
+                          and volatility_enter_upper,
+            "trade_close": daa_exit or volatility_exit or not trending
+        }
+
+    def _add(self, value: float, sign: int) -> None:
+        """
+        Kahan-compensated add to (sign 1) or remove from (sign -1) the running sum. NaN values only move the
+        NaN count
+        :param value:
+        :param sign:
+        :return:
+        """
+        if math.isnan(value):
+            self.nan_count += sign
+            return
+        y = sign * value - self.compensation
+        t = self.total + y
+        self.compensation = (t - self.total) - y
+        self.total = t
+
+    def _resum(self) -> None:
+        self.total = math.fsum(v for v in self.buffer if not math.isnan(v))
+        self.compensation = 0.0
+        self.nan_count = sum(1 for v in self.buffer if math.isnan(v))
+
+    def to_dict(self) -> Dict:
+        return {"params": self.params.to_dict(), "buffer": list(self.buffer), **self._scalars(), "undo": self._undo}
+
+    def _scalars(self) -> Dict:
+        return {
+            "cursor": self.cursor,
+            "count": self.count,
+            "total": self.total,
+            "compensation": self.compensation,
+            "nan_count": self.nan_count,
+            "prev_sma": self.prev_sma,
+            "positive_streak": self.positive_streak,
+            "finite_streak": self.finite_streak,
+            "datetime_metric": self.datetime_metric
+        }
+
+    def _restore(self, data: Dict) -> None:
+        """
+        Undo the last update: put back the slot it overwrote and the scalars from before it
+        :param data: `_undo`
+        :return:
+        """
+        self.cursor = data["cursor"]
+        self.buffer[self.cursor] = data["slot_value"]
+        self.count = data["count"]
+        self.total = data["total"]
+        self.compensation = data["compensation"]
+        self.nan_count = data["nan_count"]
+        self.prev_sma = data["prev_sma"]
+        self.positive_streak = data["positive_streak"]
+        self.finite_streak = data["finite_streak"]
+        self.datetime_metric = data["datetime_metric"]
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "IndicatorState":
+        state = cls(StrategyParams(**data["params"]))
+        state.buffer = list(data["buffer"])
+        state.cursor = data["cursor"]
+        state.count = data["count"]
+        state.prev_sma = data["prev_sma"]
+        state.positive_streak = data["positive_streak"]
+        state.finite_streak = data["finite_streak"]
+        state.datetime_metric = data["datetime_metric"]
+        state._resum()
+        undo = data.get("undo")
+        state._undo = undo if undo and "slot_value" in undo else None  # Older files kept the whole buffer
+        return state
+
+
+class IndicatorStateStore:
+    """
+    Local JSON store of per-slug indicator state, e.g. in /tmp so it survives warm Lambda invocations.
+    Like the harvest cache, each entry carries the backfill stamp of its slug, and a state built before a
+    backfill rewrote part of its window is not returned.
+    """
+
+    def __init__(self, directory: str = "/tmp/indicator_state"):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, slug: str) -> str:
+        return os.path.join(self.directory, f"{slug}.json")
+
+    def get(self, slug: str, version: Optional[str] = None) -> Optional[IndicatorState]:
+        if not os.path.exists(self._path(slug)):
+            return None
+        try:
+            with open(self._path(slug)) as f:
+                data = json.load(f)
+            if data.get("backfilled") != version:
+                return None
+            return IndicatorState.from_dict(data)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Indicator state: unreadable entry for {slug}: {e}")
+            return None
+
+    def put(self, slug: str, state: IndicatorState, version: Optional[str] = None) -> None:
+        # Write then rename so a reader never sees a partial file
+        tmp = f"{self._path(slug)}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({**state.to_dict(), "backfilled": version}, f)
+        os.replace(tmp, self._path(slug))
+
+
+def advance(state: Optional[IndicatorState], df: pd.DataFrame, params: StrategyParams) \
+        -> Tuple[IndicatorState, Dict]:
+    """
+    Bring a slug's state up to the newest sample of its harvest window. A state with the same params whose
+    last sample lies inside the window folds in only the samples from that one onward, the first of them
+    restating it; any other state is replaced by a new one that replays the whole window
+    :param state: the slug's stored state or None
+    :param df: harvest window sorted by datetime_metric, with price_usd and active_addresses_24h_change_1d
+    :param params:
+    :return:
+        (state, indicator row of the newest sample)
+    """
+    last = state.datetime_metric if state is not None else None
+    usable = last is not None and state._undo is not None and state.params.to_dict() == params.to_dict() \
+        and df["datetime_metric"].iloc[0] <= last <= df["datetime_metric"].iloc[-1]
+    if usable:
+        df = df[df["datetime_metric"] >= last]
+    else:
+        state = IndicatorState(params)
+    row = None
+    for dt, price, daa in zip(df["datetime_metric"], df["price_usd"], df["active_addresses_24h_change_1d"]):
+        row = state.update(dt, price, daa)
+    return state, row
+
+
+def replay(df: pd.DataFrame, params: StrategyParams, state: Optional[IndicatorState] = None) -> pd.DataFrame:
+    """
+    Stream a harvest frame through an IndicatorState one row at a time
+    :param df: frame with datetime_metric, price_usd and active_addresses_24h_change_1d
+    :param params:
+    :param state: existing state to continue from
+    :return:
+        One row of indicator values per sample
+    """
+    state = state or IndicatorState(params)
+    rows = [
+        state.update(dt, price, daa) for dt, price, daa in
+        zip(df["datetime_metric"], df["price_usd"], df["active_addresses_24h_change_1d"])
+    ]
+    return pd.DataFrame(rows)
+
+
+def consistency_mismatches(df: pd.DataFrame, params: StrategyParams) -> List[Dict]:
+    """
+    Replays a historical series through the incremental and the batch paths and returns every sample where
+    the trade decision differs. An empty list means both paths agree on the whole history.
+    :param df:
+    :param params:
+    :return:
+    """
+    streamed = replay(df, params)
+    batch = compute_indicators(df.copy().reset_index(drop=True), params)
+    mismatches = list()
+    for col in ("trade_open", "trade_close"):
+        differs = streamed[col].to_numpy() != batch[col].to_numpy()
+        for i in differs.nonzero()[0]:
+            mismatches.append({
+                "datetime_metric": batch["datetime_metric"].iloc[i],
+                "column": col,
+                "streamed": bool(streamed[col].iloc[i]),
+                "batch": bool(batch[col].iloc[i])
+            })
+    return mismatches
@@ -0,0 +1,119 @@
+"""
+indicators.py
+Vectorized indicator engine for the strategy. Every column is computed with NumPy/pandas builtins so no
+Python callback runs per rolling window. Thresholds are passed in explicitly so the same engine serves the
+Lambda, backtests and parameter sweeps.
+"""
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+
+class StrategyParams:
+    def __init__(self, daa_enter_lower: float, daa_enter_upper: float, daa_exit: float, sma_lookback: int,
+                 volatility_enter_lower: float, volatility_enter_upper: float, volatility_exit: float,
+                 sma_window: int = 30):
+        self.daa_enter_lower = float(daa_enter_lower)
+        self.daa_enter_upper = float(daa_enter_upper)
+        self.daa_exit = float(daa_exit)
+        self.sma_lookback = int(sma_lookback)
+        self.volatility_enter_lower = float(volatility_enter_lower)
+        self.volatility_enter_upper = float(volatility_enter_upper)
+        self.volatility_exit = float(volatility_exit)
+        self.sma_window = int(sma_window)
+
+    @classmethod
+    def from_config(cls, config) -> "StrategyParams":
+        """
+        Build from a HarvestConfig (or anything exposing the `strategy_*` attributes)
+        :param config:
+        :return:
+        """
+        return cls(
+            daa_enter_lower=config.strategy_daa_enter_lower,
+            daa_enter_upper=config.strategy_daa_enter_upper,
+            daa_exit=config.strategy_daa_exit,
+            sma_lookback=config.strategy_sma_lookback,
+            volatility_enter_lower=config.strategy_volatility_enter_lower,
+            volatility_enter_upper=config.strategy_volatility_enter_upper,
+            volatility_exit=config.strategy_volatility_exit,
+        )
+
+    def to_dict(self) -> Dict:
+        return {**self.__dict__}
+
+
+def positive_trend(sma_derivative: pd.Series, lookback: int) -> pd.Series:
+    """
+    1.0 when every sample in the trailing `lookback` window is > 0, 0.0 when any is not, NaN when the
+    window is incomplete or holds a NaN. Matches `rolling(lookback).apply(lambda d: all(s > 0 for s in d))`.
+    :param sma_derivative:
+    :param lookback:
+    :return:
+    """
+    positive = (sma_derivative > 0).astype(np.float64)
+    positive[sma_derivative.isna()] = np.nan
+    return positive.rolling(window=lookback).min()
+
+
+def positive_trend_reference(sma_derivative: pd.Series, lookback: int) -> pd.Series:
+    """
+    Original per-window Python implementation. Kept as the reference for tests and benchmarks.
+    :param sma_derivative:
+    :param lookback:
+    :return:
+    """
+    return sma_derivative.rolling(window=lookback).apply(lambda data: all(sample > 0 for sample in data))
+
+
+def compute_indicators(df: pd.DataFrame, params: StrategyParams, by: Optional[str] = None) -> pd.DataFrame:
+    """
+    Adds the indicator and trade decision columns to `df` (in place) and returns it.
+    Requires `price_usd` and `active_addresses_24h_change_1d`.
+
+    With `by` set, `df` is a long-format frame holding many series, each contiguous and in time order.
+    Rolling windows run over the whole column in one pass and any window reaching back into the previous
+    series is set to NaN, which is exactly the per-series result.
+    :param df:
+    :param params:
+    :param by: column identifying each series, e.g. "slug"
+    :return:
+    """
+    position = df.groupby(by, sort=False).cumcount().to_numpy() if by else None
+
+    def within(series: pd.Series, periods: int) -> pd.Series:
+        return series if position is None else series.where(position >= periods)
+
+    # Simple moving average
+    df["sma"] = within(df["price_usd"].rolling(window=params.sma_window).mean(), params.sma_window - 1)
+
+    # SMA daily derivative
+    df["sma_derivative"] = within(df["sma"].diff(), 1)
+
+    # Check for an all positive sma derivative for the strategy_sma_lookback
+    df["sma_derivative_pos_trend"] = within(
+        positive_trend(df["sma_derivative"], params.sma_lookback), params.sma_lookback - 1
+    )
+
+    # Absolute difference between price and SMA
+    df["delta"] = (df["price_usd"] - df["sma"]) / df["sma"]
+    df["volatility_enter_lower"] = df["delta"] < params.volatility_enter_lower
+    df["volatility_enter_upper"] = df["delta"] < params.volatility_enter_upper
+    df["volatility_enter"] = df["volatility_enter_lower"] & df["volatility_enter_upper"]
+    df["volatility_exit"] = df["delta"] > params.volatility_exit
+
+    # Active Addresses Change
+    df["daa_enter_lower"] = df["active_addresses_24h_change_1d"] >= params.daa_enter_lower
+    df["daa_enter_upper"] = df["active_addresses_24h_change_1d"] <= params.daa_enter_upper
+    df["daa_enter"] = df["daa_enter_lower"] & df["daa_enter_upper"]
+    df["daa_exit"] = df["active_addresses_24h_change_1d"] < params.daa_exit
+
+    # Trending
+    df["trending"] = (df["sma_derivative_pos_trend"] == 1) & (df["price_usd"] > df["sma"])
+
+    # Trade actions
+    df["trade_open"] = df["daa_enter"] & df["trending"] & df["volatility_enter"]
+    df["trade_close"] = df["daa_exit"] | df["volatility_exit"] | ~df["trending"]
+
+    return df
@@ -6,15 +6,21 @@ a trade action. If a trade action should be made, publish to an SNS topic, else,
 import datetime
 import enum
 import uuid
-from typing import Dict
+from typing import Dict, List, Optional
 
+import numpy as np
 import pandas as pd
 
-from internal import HC, DYNAMO
+from internal import HC, DYNAMO, Lazy
 from internal.service_sqs.sqs import ServiceSQS
+from cmd.strategy.cache import TimeSeriesCache
+from cmd.strategy.incremental import IndicatorStateStore, advance
+from cmd.strategy.indicators import StrategyParams, compute_indicators
 
-SQSTradeBuy = ServiceSQS(HC.queue_trade_buy)
-SQSTradeSell = ServiceSQS(HC.queue_trade_sell)
+SQSTradeBuy = Lazy(lambda: ServiceSQS(HC.queue_trade_buy))
+SQSTradeSell = Lazy(lambda: ServiceSQS(HC.queue_trade_sell))
+CACHE = TimeSeriesCache()  # Module scope so it survives warm invocations
+STATES = IndicatorStateStore()
 
 
 class TradeAction(enum.Enum):
@@ -29,39 +35,66 @@ def get_sma_lookback_date(datetime_last_updated: str, lookback: int) -> str:
     return dt_lookback.strftime(HC.time_format)
 
 
-def compute_trade_conditions(df: pd.DataFrame) -> Dict:
-    # Simple moving average
-    df["sma"] = df["price_usd"].rolling(window=30).mean()
-
-    # SMA daily derivative
-    df["sma_derivative"] = df["sma"].diff()
+# Harvest columns read by compute_trade_conditions. Projected in the query so nothing else is transferred
+STRATEGY_METRICS = ["price_usd", "active_addresses_24h_change_1d"]
 
-    # Check for an all positive sma derivative for the strategy_sma_lookback
-    df["sma_derivative_pos_trend"] = df["sma_derivative"] \
-        .rolling(window=int(HC.strategy_sma_lookback)) \
-        .apply(lambda data: all(sample > 0 for sample in data))
 
-    # Absolute difference between price and SMA
-    df["delta"] = (df["price_usd"] - df["sma"]) / df["sma"]
-    df["volatility_enter_lower"] = df["delta"] < HC.strategy_volatility_enter_lower
-    df["volatility_enter_upper"] = df["delta"] < HC.strategy_volatility_enter_upper
-    df["volatility_enter"] = df["volatility_enter_lower"] & df["volatility_enter_upper"]
-    df["volatility_exit"] = df["delta"] > HC.strategy_volatility_exit
+def columns_to_frame(columns: Dict[str, np.ndarray]) -> pd.DataFrame:
+    """
+    Wrap the column-oriented query result without copying. The (metrics, rows) float64 array
+    becomes the single float block of the frame.
+    :param columns: result of `harvest_get_columns_for_slug_within_range`
+    :return:
+    """
+    df = pd.DataFrame(columns["values"].T, columns=STRATEGY_METRICS, copy=False)
+    df.insert(0, "datetime_metric", columns["datetime_metric"])
+    return df
 
-    # Active Addresses Change
-    df["daa_enter_lower"] = df["active_addresses_24h_change_1d"] >= HC.strategy_daa_enter_lower
-    df["daa_enter_upper"] = df["active_addresses_24h_change_1d"] <= HC.strategy_daa_enter_upper
-    df["daa_enter"] = df["daa_enter_lower"] & df["daa_enter_upper"]
-    df["daa_exit"] = df["active_addresses_24h_change_1d"] < HC.strategy_daa_exit
 
-    # Trending
-    df["trending"] = (df["sma_derivative_pos_trend"] == 1) & (df["price_usd"] > df["sma"])
+def load_harvest_frame(slug: str, date_from: str, date_to: str, backfilled: Optional[str] = None) \
+        -> Optional[pd.DataFrame]:
+    """
+    Harvest rows for the slug in [date_from, date_to]. A cached frame that already covers date_from is
+    topped up with only the rows from its last datetime_metric onward; otherwise the full window is queried.
+    The last cached row is re-read because the executor rewrites the most recent day on every harvest.
+    :param slug:
+    :param date_from:
+    :param date_to:
+    :param backfilled: stamp of the slug's last backfill. A frame cached under another stamp is reloaded
+    :return:
+        Dataframe sorted by datetime_metric or None when there is no data
+    """
+    cached = CACHE.get(slug, backfilled)
+    if cached is not None and len(cached) and cached["datetime_metric"].iloc[0] <= date_from:
+        last_cached = cached["datetime_metric"].iloc[-1]
+        columns = None
+        if last_cached < date_to:
+            columns = DYNAMO.harvest_get_columns_for_slug_within_range(
+                HC.table_harvest, slug, last_cached, date_to, STRATEGY_METRICS
+            )
+        df = cached
+        if columns is not None:
+            df = pd.concat([cached, columns_to_frame(columns)], ignore_index=True) \
+                .drop_duplicates(subset="datetime_metric", keep="last") \
+                .sort_values("datetime_metric")
+        df = df[df["datetime_metric"] >= date_from].reset_index(drop=True)
+        CACHE.put(slug, df, backfilled)
+        df = df[df["datetime_metric"] <= date_to].reset_index(drop=True)
+        return df if len(df) else None
+
+    # Query results are already sorted and bounded by the range key
+    columns = DYNAMO.harvest_get_columns_for_slug_within_range(
+        HC.table_harvest, slug, date_from, date_to, STRATEGY_METRICS
+    )
+    if columns is None:
+        return None
+    df = columns_to_frame(columns)
+    CACHE.put(slug, df, backfilled)
+    return df
 
-    # Trade actions
-    df["trade_open"] = df["daa_enter"] & df["trending"] & df["volatility_enter"]
-    df["trade_close"] = df["daa_exit"] | df["volatility_exit"] | ~df["trending"]
 
-    return df.iloc[-1].to_dict()
+def compute_trade_conditions(df: pd.DataFrame) -> Dict:
+    return compute_indicators(df, StrategyParams.from_config(HC)).iloc[-1].to_dict()
 
 
 def get_trade_action(row: Dict) -> TradeAction:
@@ -76,57 +109,71 @@ def get_trade_action(row: Dict) -> TradeAction:
 
 
 def strategy(event, context):
-    # Contianers for SQS events used in batch publishing
-    actions_buy = list()
-    actions_sell = list()
+    """
+    Evaluates every record of the SQS batch. Each slug's window is loaded and folded into the slug's
+    persisted indicator state, so a warm slug only processes the samples harvested since its last evaluation.
+    Strategy details and trade signals are then written once for the whole batch.
+    :param event:
+    :param context:
+    :return:
+    """
+    # Latest record wins when a slug appears more than once in the batch
+    records = {record["body"]: record for record in event["Records"]}
 
-    for record in event["Records"]:
-        slug = record["body"]
+    params = StrategyParams.from_config(HC)
+    latest = list()
+    tickers = dict()
+    for slug, record in records.items():
         ticker = record["messageAttributes"]["ticker"]["stringValue"]
         date_to = record["messageAttributes"]["datetime_last_updated"]["stringValue"]
         date_from = get_sma_lookback_date(date_to, HC.strategy_sma_lookback)
+        backfilled = record["messageAttributes"].get("datetime_backfilled", {}).get("stringValue", "null")
 
         # 1. Load data for the given slug between the datetime_last_update and datetime_lookback
-        items = DYNAMO.harvest_get_data_for_slug_within_range(HC.table_harvest, slug, date_from, date_to)
-        if items is None:
+        backfilled = None if backfilled == "null" else backfilled
+        df = load_harvest_frame(slug, date_from, date_to, backfilled)
+        if df is None:
             print(f"NO DATA - Table {HC.table_harvest}, Slug {slug}, DateFrom {date_from}, DateTo: {date_to}")
-            return
-
-        # 2. Convert items list to dataframe. Implement the trade action decision pattern
-        df = pd.DataFrame(items)
-        for col in df.columns:
-            if "datetime" in col or "slug" in col:
-                continue
-            df[col] = df[col].astype(float)  # Covert decimals
-
-        # Key
-        df["slug"] = slug
-        trade_conditions = compute_trade_conditions(df)
+            continue
+
+        # 2. Bring the slug's indicator state up to the latest sample
+        state, trade_conditions = advance(STATES.get(slug, backfilled), df, params)
+        STATES.put(slug, state, backfilled)
+        latest.append({**trade_conditions, "slug": slug})
+        tickers[slug] = ticker
+
+    if not latest:
+        return
+
+    # Contianers for SQS events and StrategyDetails items used in batch publishing
+    actions_buy = list()
+    actions_sell = list()
+    items = list()
+    datetime_proposed = datetime.datetime.utcnow().strftime(HC.time_format)
+    for trade_conditions in latest:
+        slug = trade_conditions["slug"]
         trade_action = get_trade_action(trade_conditions)
 
         # Trade decisions
         if trade_action == TradeAction.PASS:
             print(f"Slug({slug}) - No trade actions")
-            return
+            continue
 
         # Create the StrategyDetails entry
         guid_meta = str(uuid.uuid4())
         guid_details = f"{guid_meta}#{trade_action.value}"
-        trade_conditions["datetime_proposed"] = datetime.datetime.utcnow().strftime(HC.time_format)
+        trade_conditions["datetime_proposed"] = datetime_proposed
         trade_conditions["action"] = trade_action.value
         trade_conditions["guid_meta"] = guid_meta
         trade_conditions["guid_details"] = guid_details
-
-        # Update the databases tables
-        item = DYNAMO.create_item_from_dict(trade_conditions)
-        DYNAMO.strategy_details_create_item(HC.table_strategy_details, item)
+        items.append(DYNAMO.create_item_from_dict(trade_conditions))
 
         # Message to transmit
         sqs_message = create_sqs_message(
             delay_seconds=0,
             message_body=slug,
             trade_action=trade_action.value,
-            ticker=ticker,
+            ticker=tickers[slug],
             guid_details=guid_details
         )
 
@@ -135,8 +182,11 @@ def strategy(event, context):
         if trade_action == TradeAction.CLOSE:
             actions_sell.append(sqs_message)
 
+    # Update the databases tables
+    DYNAMO.batch_write_items(HC.table_strategy_details, items)
     SQSTradeSell.send_in_batches(actions_sell)
     SQSTradeBuy.send_in_batches(actions_buy)
+    print(f"Slugs: {len(latest)} Buy: {len(actions_buy)} Sell: {len(actions_sell)} Harvest cache: {CACHE.stats()}")
 
 
 def create_sqs_message(delay_seconds: int, message_body: str, trade_action: str, ticker: str,
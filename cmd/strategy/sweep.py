@@ -0,0 +1,205 @@
+"""
+sweep.py
+Grid search over the strategy thresholds. The indicator columns that do not depend on any threshold
+(price, SMA, delta, DAA change and the run length of positive SMA derivatives) are computed once, laid out as
+(dates x slugs) arrays and placed in shared memory. Worker processes attach to that block and evaluate each
+parameter combination with a handful of NumPy comparisons plus the account simulation from `backtest`.
+Every finished combination is appended to a CSV so an interrupted sweep resumes where it stopped.
+"""
+import csv
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from cmd.strategy.backtest import simulate_arrays
+from cmd.strategy.indicators import StrategyParams, compute_indicators
+
+SWEEP_FIELDS = [
+    "daa_enter_lower", "daa_enter_upper", "daa_exit", "sma_lookback",
+    "volatility_enter_lower", "volatility_enter_upper", "volatility_exit"
+]
+FEATURES = ["price_usd", "sma", "delta", "daa", "positive_streak"]
+
+# Per-process state set by `_worker_init`
+_WORKER = {}
+
+
+def precompute_features(df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Threshold-independent indicator columns as one float64 array of shape (len(FEATURES), dates, slugs).
+    `positive_streak` counts consecutive SMA derivatives > 0, so for any lookback
+    `positive_streak >= lookback` is the same test as `sma_derivative_pos_trend == 1`.
+    :param df: output of `backtest.load_harvest`
+    :return:
+        features, dates, slugs
+    """
+    # Thresholds do not affect sma, sma_derivative or delta; any params will do here
+    params = StrategyParams(0, 0, 0, 1, 0, 0, 0)
+    long = compute_indicators(
+        df[["slug", "datetime_metric", "price_usd", "active_addresses_24h_change_1d"]].copy(), params, by="slug"
+    )
+
+    positive = (long["sma_derivative"] > 0).to_numpy(copy=True)
+    first = (long["slug"] != long["slug"].shift()).to_numpy()
+    positive[first] = False
+    index = np.arange(len(long))
+    last_reset = np.maximum.accumulate(np.where(~positive, index, -1))
+    long["positive_streak"] = (index - last_reset).astype(np.float64)
+    long["daa"] = long["active_addresses_24h_change_1d"]
+
+    dates = np.sort(long["datetime_metric"].unique())
+    wide = long.pivot(index="datetime_metric", columns="slug", values=FEATURES).reindex(dates)
+    slugs = wide["price_usd"].columns.to_numpy()
+    features = np.stack([wide[feature].to_numpy(dtype=np.float64) for feature in FEATURES])
+    return features, dates, slugs
+
+
+def signals_for(features: np.ndarray, params: StrategyParams) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Trade open / close arrays (dates x slugs) for one parameter combination
+    :param features:
+    :param params:
+    :return:
+    """
+    price, sma, delta, daa, streak = features
+    with np.errstate(invalid="ignore"):
+        trending = (streak >= params.sma_lookback) & (price > sma)
+        daa_enter = (daa >= params.daa_enter_lower) & (daa <= params.daa_enter_upper)
+        volatility_enter = (delta < params.volatility_enter_lower) & (delta < params.volatility_enter_upper)
+        trade_open = daa_enter & trending & volatility_enter
+        trade_close = (daa < params.daa_exit) | (delta > params.volatility_exit) | ~trending
+    return trade_open, ~trade_open & trade_close
+
+
+def _worker_init(shm_name: str, shape: Tuple[int, ...], dates: np.ndarray, slugs: np.ndarray, settings: Dict):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _WORKER["shm"] = shm  # Keep a reference so the mapping stays open
+    _WORKER["features"] = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+    _WORKER["dates"] = dates
+    _WORKER["slugs"] = slugs
+    _WORKER["settings"] = settings
+
+
+def _evaluate(combo: Dict) -> Dict:
+    features = _WORKER["features"]
+    opens, closes = signals_for(features, StrategyParams(**combo))
+    result = simulate_arrays(
+        dates=_WORKER["dates"], slugs=_WORKER["slugs"], price_raw=features[0],
+        opens=opens, closes=closes, **_WORKER["settings"]
+    )
+    return {**combo, **_WORKER["settings"], **result.summary()}
+
+
+def parameter_grid(ranges: Dict[str, Iterable]) -> List[Dict]:
+    """
+    Every combination of the given values. Fields not in `ranges` must be supplied by the caller.
+    Combinations with daa_enter_lower > daa_enter_upper or volatility_enter_lower > volatility_enter_upper
+    can never open a trade and are skipped.
+    :param ranges: {field: values}
+    :return:
+    """
+    fields = list(ranges)
+    combos = list()
+    for values in itertools.product(*(list(ranges[f]) for f in fields)):
+        combo = dict(zip(fields, values))
+        if combo.get("daa_enter_lower", -np.inf) > combo.get("daa_enter_upper", np.inf):
+            continue
+        if combo.get("volatility_enter_lower", -np.inf) > combo.get("volatility_enter_upper", np.inf):
+            continue
+        combos.append(combo)
+    return combos
+
+
+def _combo_key(combo: Dict) -> Tuple:
+    return tuple(round(float(combo[f]), 10) for f in SWEEP_FIELDS)
+
+
+def check_settings(completed: pd.DataFrame, settings: Dict) -> None:
+    """
+    Rows of a results file only count as done when they were simulated with the same account settings
+    :param completed:
+    :param settings:
+    :return:
+    """
+    if completed.empty:
+        return
+    for field, value in settings.items():
+        if field not in completed.columns or not np.allclose(completed[field].astype(float), float(value)):
+            stored = completed[field].unique().tolist() if field in completed.columns else None
+            raise ValueError(
+                f"Results were computed with {field}={stored}, not {value}. Use a new results file to sweep "
+                f"with different settings"
+            )
+
+
+def load_completed(path: str) -> pd.DataFrame:
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return pd.DataFrame()
+    return pd.read_csv(path)
+
+
+def sweep(df: pd.DataFrame, ranges: Dict[str, Iterable], results_path: str, max_workers: int = None,
+          balance: float = 1000.0, trades_max: int = 7, fee_rate: float = 0.001,
+          rank_by: str = "return_pct") -> pd.DataFrame:
+    """
+    Evaluate every parameter combination over the harvest history.
+    Rows are appended to `results_path` as they finish; combinations already present are skipped.
+    A results file written with other balance, trades_max or fee_rate is refused rather than resumed.
+    When all are done the file is rewritten ranked by `rank_by`, best first.
+    :param df: output of `backtest.load_harvest`
+    :param ranges: values for every field of SWEEP_FIELDS
+    :param results_path: CSV for progress and the final ranked table
+    :param max_workers: processes, defaults to the CPU count
+    :param balance:
+    :param trades_max:
+    :param fee_rate:
+    :param rank_by: summary column used for ranking
+    :return:
+        Ranked results
+    """
+    missing = set(SWEEP_FIELDS) - set(ranges)
+    if missing:
+        raise ValueError(f"Missing sweep ranges for {sorted(missing)}")
+
+    settings = {"balance": balance, "trades_max": trades_max, "fee_rate": fee_rate}
+    completed = load_completed(results_path)
+    check_settings(completed, settings)
+    done = {_combo_key(row) for row in completed.to_dict(orient="records")}
+    pending = [combo for combo in parameter_grid(ranges) if _combo_key(combo) not in done]
+    print(f"Sweep: {len(done)} combinations already done, {len(pending)} pending")
+
+    if pending:
+        features, dates, slugs = precompute_features(df)
+        shm = shared_memory.SharedMemory(create=True, size=features.nbytes)
+        try:
+            np.ndarray(features.shape, dtype=np.float64, buffer=shm.buf)[:] = features
+            write_header = completed.empty
+            with open(results_path, "a", newline="") as f, ProcessPoolExecutor(
+                    max_workers=max_workers, initializer=_worker_init,
+                    initargs=(shm.name, features.shape, dates, slugs, settings)
+            ) as pool:
+                writer = None
+                futures = [pool.submit(_evaluate, combo) for combo in pending]
+                for n, future in enumerate(as_completed(futures), start=1):
+                    row = future.result()
+                    if writer is None:
+                        fieldnames = list(completed.columns) if not completed.empty else list(row)
+                        writer = csv.DictWriter(f, fieldnames=fieldnames)
+                        if write_header:
+                            writer.writeheader()
+                    writer.writerow(row)
+                    f.flush()
+                    if n % 100 == 0:
+                        print(f"Sweep: {n}/{len(pending)}")
+        finally:
+            shm.close()
+            shm.unlink()
+
+    ranked = load_completed(results_path).sort_values(rank_by, ascending=False).reset_index(drop=True)
+    ranked.to_csv(results_path, index=False)
+    return ranked
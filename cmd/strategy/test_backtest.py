@@ -0,0 +1,28 @@
+import pandas as pd
+
+from .backtest import simulate
+
+
+def signals(rows):
+    return pd.DataFrame(rows, columns=["slug", "datetime_metric", "price_usd", "open", "close"])
+
+
+class TestSimulate:
+    def test_round_trip_pnl(self):
+        result = simulate(signals([
+            ("a", "d1", 10.0, True, False),
+            ("a", "d2", 20.0, False, True),
+        ]), balance=100.0, trades_max=1, fee_rate=0.0)
+        # position_max = 100, size = int(min(100, 100)) - 1 = 99
+        assert result.trades["cost"].tolist() == [99.0]
+        assert result.summary()["pnl"] == 99.0
+
+    def test_trades_max_and_half_position_rule(self):
+        result = simulate(signals([
+            ("a", "d1", 1.0, True, False),
+            ("b", "d1", 1.0, True, False),
+            ("c", "d1", 1.0, True, False),
+        ]), balance=100.0, trades_max=2, fee_rate=0.0)
+        # position_max = 50: a takes 49, b takes 49, c is blocked by trades_max
+        assert sorted(result.trades["slug"]) == ["a", "b"]
+        assert result.trades["datetime_close"].isna().all()
@@ -0,0 +1,44 @@
+import os
+
+import pandas as pd
+import pytest
+
+from .cache import TimeSeriesCache
+
+
+def frame(rows: int) -> pd.DataFrame:
+    return pd.DataFrame({
+        "datetime_metric": [f"2021-01-{i + 1:02d}T00:00:00Z" for i in range(rows)],
+        "price_usd": [float(i) for i in range(rows)]
+    })
+
+
+class TestTimeSeriesCache:
+    def test_memory_lru(self):
+        cache = TimeSeriesCache(max_entries=2, disk_dir=None)
+        for slug in ("a", "b", "c"):
+            cache.put(slug, frame(3))
+        assert cache.get("a") is None
+        assert cache.get("c") is not None
+        assert cache.stats()["evictions"] == 1 and cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+    def test_backfill_stamp_invalidates(self):
+        cache = TimeSeriesCache(disk_dir=None)
+        cache.put("bitcoin", frame(3))
+        assert cache.get("bitcoin") is not None
+        assert cache.get("bitcoin", "2021-02-01T00:00:00Z") is None  # Backfilled since it was cached
+        cache.put("bitcoin", frame(5), "2021-02-01T00:00:00Z")
+        assert len(cache.get("bitcoin", "2021-02-01T00:00:00Z")) == 5
+        assert cache.stats()["invalidations"] == 1
+
+    def test_disk_tier_is_bounded(self, tmp_path):
+        pytest.importorskip("pyarrow")
+        TimeSeriesCache(disk_dir=str(tmp_path)).put("bitcoin", frame(30))
+        size = os.path.getsize(tmp_path / "bitcoin.parquet")
+        cache = TimeSeriesCache(max_entries=1, disk_dir=str(tmp_path), max_disk_bytes=2 * size)
+        assert cache.disk_bytes == size  # Files of an earlier process are adopted
+        for slug in ("ethereum", "cardano"):
+            cache.put(slug, frame(30))
+        assert sorted(os.listdir(tmp_path)) == ["cardano.parquet", "ethereum.parquet"]
+        assert cache.disk_bytes == 2 * size and cache.stats()["disk_evictions"] == 1
+        assert len(cache.get("ethereum")) == 30 and cache.stats()["disk_hits"] == 1
@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from .incremental import IndicatorState, IndicatorStateStore, advance, consistency_mismatches, replay
+from .indicators import StrategyParams, compute_indicators
+
+
+class TestConsistency:
+    def test_replay_matches_batch(self, params, harvest_frame):
+        for seed in range(5):
+            assert consistency_mismatches(harvest_frame(730, seed), params) == []
+
+    def test_gaps_and_flat_prices(self, params, harvest_frame):
+        df = harvest_frame(200)
+        df.loc[50:52, "price_usd"] = np.nan
+        df.loc[120:160, "price_usd"] = 12.5
+        df.loc[90, "active_addresses_24h_change_1d"] = np.nan
+        assert consistency_mismatches(df, params) == []
+
+    def test_rows_match_batch_columns(self, params, harvest_frame):
+        df = harvest_frame(200)
+        df.loc[50:52, "price_usd"] = np.nan
+        streamed = replay(df, params)
+        batch = compute_indicators(df.copy(), params)
+        assert list(streamed.columns) == list(batch.columns)
+        pd.testing.assert_frame_equal(streamed, batch, check_dtype=False)
+
+    def test_other_lookbacks(self, params, harvest_frame):
+        for lookback in (1, 3, 7):
+            lookback_params = StrategyParams(**{**params.to_dict(), "sma_lookback": lookback})
+            assert consistency_mismatches(harvest_frame(300), lookback_params) == []
+
+
+class TestIndicatorState:
+    def test_restated_sample_replaces_last(self, params, harvest_frame):
+        df = harvest_frame(100)
+        state = IndicatorState(params)
+        replay(df.iloc[:-1], params, state)
+        last = df.iloc[-1]
+        state.update(last["datetime_metric"], last["price_usd"] * 2, 0.0)
+        restated = state.update(last["datetime_metric"], last["price_usd"], last["active_addresses_24h_change_1d"])
+        expected = replay(df, params).iloc[-1]
+        assert restated["trade_open"] == expected["trade_open"]
+        assert restated["sma"] == expected["sma"]
+
+    def test_store_round_trip(self, tmp_path, params, harvest_frame):
+        df = harvest_frame(80)
+        store = IndicatorStateStore(str(tmp_path))
+        state = IndicatorState(params)
+        replay(df.iloc[:60], params, state)
+        store.put("bitcoin", state)
+        resumed = replay(df.iloc[60:], params, store.get("bitcoin"))
+        full = replay(df, params).iloc[60:].reset_index(drop=True)
+        pd.testing.assert_frame_equal(resumed, full)
+
+    def test_running_sum_tracks_the_window(self, params):
+        state = IndicatorState(params)
+        rng = np.random.default_rng(11)
+        for i, price in enumerate(rng.lognormal(5, 2, 5000)):
+            state.update(f"{i:06d}", np.nan if i % 97 == 0 else price, 0.0)
+        finite = [v for v in state.buffer if not np.isnan(v)]
+        assert state.nan_count == len(state.buffer) - len(finite)
+        assert np.isclose(state.total, np.sum(finite), rtol=1e-12)
+
+
+class TestAdvance:
+    def test_warm_state_folds_only_new_samples(self, tmp_path, params, harvest_frame):
+        df = harvest_frame(150)
+        store = IndicatorStateStore(str(tmp_path))
+        state, _ = advance(None, df.iloc[:120], params)
+        store.put("bitcoin", state, "2021-09-01T00:00:00Z")
+        assert store.get("bitcoin") is None  # Built before another backfill
+
+        # The next window starts later and restates the previous last sample. Rows before it are already in
+        # the state, so blanking them must not change the result
+        window = df.iloc[30:].copy()
+        window.loc[119, "price_usd"] *= 1.01
+        state, row = advance(store.get("bitcoin", "2021-09-01T00:00:00Z"), window.assign(
+            price_usd=window["price_usd"].where(window.index >= 119)
+        ), params)
+
+        expected = compute_indicators(pd.concat([df.iloc[:119], window.loc[119:]]), params).iloc[-1]
+        assert row["sma"] == pytest.approx(expected["sma"])
+        assert (row["trade_open"], row["trade_close"]) == (expected["trade_open"], expected["trade_close"])
+
+    def test_unusable_state_replays_the_window(self, params, harvest_frame):
+        df = harvest_frame(150)
+        state, _ = advance(None, df.iloc[:60], params)
+        _, row = advance(state, df.iloc[80:], params)  # Gap after the state's last sample
+        expected = compute_indicators(df.iloc[80:].copy(), params).iloc[-1]
+        assert row["sma"] == pytest.approx(expected["sma"])
+
+        other = StrategyParams(**{**params.to_dict(), "sma_lookback": params.sma_lookback + 1})
+        state, row = advance(state, df, other)
+        assert state.params is other
+        assert row["trending"] == compute_indicators(df.copy(), other).iloc[-1]["trending"]
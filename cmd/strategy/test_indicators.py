@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+from .indicators import StrategyParams, compute_indicators, positive_trend, positive_trend_reference
+
+
+class TestPositiveTrend:
+    def test_matches_reference(self, harvest_frame):
+        for lookback in (1, 2, 5):
+            sma_derivative = harvest_frame(500)["price_usd"].rolling(30).mean().diff()
+            pd.testing.assert_series_equal(
+                positive_trend(sma_derivative, lookback),
+                positive_trend_reference(sma_derivative, lookback)
+            )
+
+    def test_nan_edges(self):
+        sma_derivative = pd.Series([np.nan, 1.0, 2.0, np.nan, 3.0, -1.0, 0.0, 4.0, 5.0])
+        pd.testing.assert_series_equal(
+            positive_trend(sma_derivative, 2),
+            positive_trend_reference(sma_derivative, 2)
+        )
+
+    def test_short_series(self):
+        sma_derivative = pd.Series([1.0])
+        assert positive_trend(sma_derivative, 2).isna().all()
+
+
+def reference_indicators(df: pd.DataFrame, params: StrategyParams) -> pd.DataFrame:
+    """The row-wise compute_trade_conditions the engine replaced, with the thresholds passed in"""
+    df["sma"] = df["price_usd"].rolling(window=params.sma_window).mean()
+    df["sma_derivative"] = df["sma"].diff()
+    df["sma_derivative_pos_trend"] = positive_trend_reference(df["sma_derivative"], params.sma_lookback)
+    df["delta"] = (df["price_usd"] - df["sma"]) / df["sma"]
+    df["volatility_enter_lower"] = df["delta"] < params.volatility_enter_lower
+    df["volatility_enter_upper"] = df["delta"] < params.volatility_enter_upper
+    df["volatility_enter"] = df["volatility_enter_lower"] & df["volatility_enter_upper"]
+    df["volatility_exit"] = df["delta"] > params.volatility_exit
+    df["daa_enter_lower"] = df["active_addresses_24h_change_1d"] >= params.daa_enter_lower
+    df["daa_enter_upper"] = df["active_addresses_24h_change_1d"] <= params.daa_enter_upper
+    df["daa_enter"] = df["daa_enter_lower"] & df["daa_enter_upper"]
+    df["daa_exit"] = df["active_addresses_24h_change_1d"] < params.daa_exit
+    df["trending"] = (df["sma_derivative_pos_trend"] == 1) & (df["price_usd"] > df["sma"])
+    df["trade_open"] = df["daa_enter"] & df["trending"] & df["volatility_enter"]
+    df["trade_close"] = df["daa_exit"] | df["volatility_exit"] | ~df["trending"]
+    return df
+
+
+class TestComputeIndicators:
+    def test_trade_columns_match_reference(self, params, harvest_frame):
+        df = harvest_frame(400)
+        df.loc[150:152, "price_usd"] = np.nan
+        df.loc[250, "active_addresses_24h_change_1d"] = np.nan
+        vectorized = compute_indicators(df.copy(), params)
+        reference = reference_indicators(df.copy(), params)
+        for col in ("sma_derivative_pos_trend", "trending", "trade_open", "trade_close"):
+            pd.testing.assert_series_equal(vectorized[col], reference[col])
+        assert vectorized["trade_open"].any() and not vectorized["trade_close"].all()
+
+    def test_grouped_matches_per_series(self, params, harvest_frame):
+        frames = [harvest_frame(rows, seed).assign(slug=f"slug-{seed}") for seed, rows in enumerate((5, 40, 120))]
+        grouped = compute_indicators(pd.concat(frames, ignore_index=True), params, by="slug")
+        per_series = pd.concat([compute_indicators(frame.copy(), params) for frame in frames], ignore_index=True)
+        pd.testing.assert_frame_equal(grouped, per_series)
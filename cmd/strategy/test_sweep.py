@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from .backtest import backtest, compute_signals
+from .indicators import StrategyParams
+from .sweep import precompute_features, signals_for, sweep
+
+
+@pytest.fixture
+def universe(harvest_frame) -> pd.DataFrame:
+    frames = [harvest_frame(rows, seed).assign(slug=f"slug-{seed}") for seed, rows in enumerate((90, 200, 365))]
+    return pd.concat(frames, ignore_index=True).sort_values(["slug", "datetime_metric"]).reset_index(drop=True)
+
+
+class TestSweep:
+    def test_precomputed_signals_match_backtest(self, params, universe):
+        df = universe
+        features, dates, slugs = precompute_features(df)
+        for lookback in (1, 2, 3):
+            lookback_params = StrategyParams(**{**params.to_dict(), "sma_lookback": lookback})
+            opens, closes = signals_for(features, lookback_params)
+            wide = compute_signals(df, lookback_params).pivot(index="datetime_metric", columns="slug").reindex(dates)
+            tradable = ~np.isnan(features[0])
+            np.testing.assert_array_equal(opens, wide["open"][slugs].fillna(False).to_numpy(dtype=bool))
+            np.testing.assert_array_equal(
+                closes & tradable, wide["close"][slugs].fillna(False).to_numpy(dtype=bool) & tradable
+            )
+
+    def test_resume_skips_completed(self, tmp_path, params, universe):
+        df = universe
+        ranges = {field: [value] for field, value in params.to_dict().items() if field != "sma_window"}
+        ranges["sma_lookback"] = [1, 2]
+        results = str(tmp_path / "results.csv")
+        first = sweep(df, ranges, results, max_workers=2)
+        assert len(first) == 2
+        assert first.iloc[0]["return_pct"] >= first.iloc[1]["return_pct"]
+
+        ranges["sma_lookback"] = [1, 2, 3]
+        second = sweep(df, ranges, results, max_workers=2)
+        assert len(second) == 3
+        single = backtest(df, StrategyParams(**{**params.to_dict(), "sma_lookback": 3}))
+        row = second[second["sma_lookback"] == 3].iloc[0]
+        assert np.isclose(row["return_pct"], single.summary()["return_pct"])
+        with pytest.raises(ValueError):
+            sweep(df, ranges, results, max_workers=2, fee_rate=0.002)  # Stale rows are not reused
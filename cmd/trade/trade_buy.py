@@ -2,17 +2,20 @@
 trade_buy.py
 Trade Buy implments the logic required to open a position
 """
-from collections import namedtuple
-
 import kucoin.exceptions
 
-from internal import HC, DYNAMO, ACCOUNT
+from internal import HC, ACCOUNT, ORDERS, Lazy
+from internal.service_kucoin.order_state import classify
+from internal.service_sqs.signal_monitor import MonitoredOrder, create_monitor_messages
 from internal.service_sqs.signal_strategy import SignalStrategy
+from internal.service_sqs.sqs import ServiceSQS
 
-Order = namedtuple("Order", ["order_id", "slug", "strategy_guid"])
+SQSMonitor = Lazy(lambda: ServiceSQS(HC.queue_monitor))
+MONITOR_DELAY_SECONDS = 60
 
 
 def trade_buy(event, context):
+    ACCOUNT.refresh()  # Current balances and open orders; symbols and quotes are reused when warm
     strategy_signals = {
         record["messageAttributes"]["ticker"]["stringValue"]: SignalStrategy(record) for record in event["Records"]
     }
@@ -29,56 +32,41 @@ def trade_buy(event, context):
             del strategy_signals[kucoin_account.currency]
             continue
 
-    orders = list()
+    candidates = list()
     for signal in strategy_signals.values():
         if ACCOUNT.has_active_buy_order_for_symbol(signal.ticker_kucoin):
             print(f"{signal.slug} has open buy order")
             continue
+        candidates.append((signal.ticker, signal))
 
-        # No open position. No active orders. But account is maxed on trades or not enough balance
-        # Yes, it was checked above. But if a sell has happened and there is sufficient balance for more
-        # than a single order, this should be checked again. The account is reinitialized after each buy order is placed
-        # to ensure correct values
-        if not ACCOUNT.can_trade():
-            print(
-                f"Account cannot trade: NumOpenTrades: {ACCOUNT.trades_open} BalanceAvail: {ACCOUNT.balance_avail} Position Max: {ACCOUNT.position_max} SLUG: {signal.slug}")
-            continue
+    # No open position. No active orders. The whole batch is sized against one view of the balance and open
+    # trades, so it cannot overshoot trades_max or the available balance. Orders are then placed concurrently
+    orders = ACCOUNT.plan_buy_orders(candidates)
+    placed, failed = ACCOUNT.place_limit_orders(orders)
+    for order, _ in placed:
+        print(f"Buy: {order.symbol} Price: {order.price} Size: {order.size}")
 
-        # Finally. Time to create a buy order
-        position_size = ACCOUNT.get_position_size_max()
-        price, size = ACCOUNT.compute_price_and_size(
-            symbol=signal.ticker,
-            position_size=position_size
-        )
-        print(f"Avail: {ACCOUNT.balance_avail} PositionSize: {position_size} Price: {price} Size: {size}")
-        try:
-            print(f"Buy: {signal.ticker_kucoin} Price: {price} Size: {size}")
-            order_id = ACCOUNT.create_limit_order_buy(
-                symbol=signal.ticker_kucoin,
-                price=price,
-                size=size
-            )
-            orders.append(
-                Order(
-                    order_id=order_id.get("orderId"),
-                    slug=signal.slug,
-                    strategy_guid=signal.strategy_guid
-                )
-            )
-            ACCOUNT.init_account()
-        except kucoin.exceptions.KucoinAPIException as e:
-            if e.code == "900001":
-                print(f"{signal.slug}: {signal.ticker_kucoin} does not exist")
-                continue
-            raise e
+    # Nothing placed, nothing to refresh, record or monitor
+    if placed:
+        ACCOUNT.refresh_balances()
 
-    # For each order, get the order details and write to dynamo
-    for order in orders:
-        order_details = ACCOUNT.get_order(order.order_id)
-        order_details["slug"] = order.slug
-        order_details["strategy_guid"] = order.strategy_guid
-        item = DYNAMO.create_item_from_dict(order_details)
-        DYNAMO.strategy_details_create_item(
-            tablename=HC.table_orders,
-            data=item
+        # For each order, get the order details and write to dynamo
+        details = ACCOUNT.get_orders_details([response["orderId"] for _, response in placed])
+        ORDERS.save_many(
+            {"order": order_details, "slug": order.meta.slug, "strategy_guid": order.meta.strategy_guid,
+             "status": classify(order_details)}
+            for (order, _), order_details in zip(placed, details)
         )
+
+        # Hand the placed orders to the monitor
+        SQSMonitor.send_in_batches(create_monitor_messages([
+            (MONITOR_DELAY_SECONDS, MonitoredOrder(response["orderId"], order.meta.slug, order.meta.strategy_guid))
+            for order, response in placed
+        ]))
+
+    # Placed orders are recorded before any placement error is raised
+    for order, e in failed:
+        if isinstance(e, kucoin.exceptions.KucoinAPIException) and e.code == "900001":
+            print(f"{order.meta.slug}: {order.symbol} does not exist")
+            continue
+        raise e
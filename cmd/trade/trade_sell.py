@@ -2,14 +2,17 @@
 trade_sell.py
 Trade Sell implements the logic required to close an open position
 """
-from collections import namedtuple
-
 import kucoin.exceptions
 
-from internal import HC, DYNAMO, ACCOUNT
+from internal import HC, ACCOUNT, ORDERS, Lazy
+from internal.service_kucoin.order_state import classify
+from internal.service_kucoin.account import OrderRequest
+from internal.service_sqs.signal_monitor import MonitoredOrder, create_monitor_messages
 from internal.service_sqs.signal_strategy import SignalStrategy
+from internal.service_sqs.sqs import ServiceSQS
 
-Order = namedtuple("Order", ["order_id", "slug", "strategy_guid"])
+SQSMonitor = Lazy(lambda: ServiceSQS(HC.queue_monitor))
+MONITOR_DELAY_SECONDS = 60
 
 
 def trade_sell(event, context):
@@ -19,8 +22,7 @@ def trade_sell(event, context):
     :param context:
     :return:
     """
-    if ACCOUNT.trade_accounts is None:
-        ACCOUNT.init_account()  # Calls to Kucoin to get current value
+    ACCOUNT.refresh()  # Calls to Kucoin to get current balances and open orders
 
     # Create a dict for easy processing: { ticker: Signal, ...} -> { FRONT: Signal, XRP: Signal, Theta: Signal, ...}
     # Processes in batches
@@ -39,40 +41,47 @@ def trade_sell(event, context):
             continue
 
         # Open sell order to close the position
+        if ACCOUNT.has_active_sell_order_for_symbol(kucoin_account.currency):
+            print(f"{kucoin_account.currency}-USDT has open sell order")
+            continue
         if kucoin_account.holds == kucoin_account.balance:
             print(
                 f"{kucoin_account.currency}-USDT has open order. Holds: {kucoin_account.holds} Balance: {kucoin_account.balance}")
             continue
 
-        # Create a new order to close the position
-        try:
-            print(
-                f"Sell: {kucoin_account.currency}-USDT Price:{kucoin_account.current_usdt} Size: {kucoin_account.balance}")
-            order_id = ACCOUNT.create_limit_order_sell(
-                symbol=f"{kucoin_account.currency}-USDT",
-                price=kucoin_account.current_usdt,
-                size=kucoin_account.balance
+        # Create a new order to close the position. Priced at the best bid, else the fiat snapshot price
+        symbol = f"{kucoin_account.currency}-USDT"
+        price = ACCOUNT.limit_price(symbol, "sell") or kucoin_account.current_usdt
+        print(f"Sell: {symbol} Price:{price} Size: {kucoin_account.balance}")
+        orders.append(
+            OrderRequest(
+                symbol=symbol, side="sell", price=price, size=kucoin_account.balance,
+                meta=strategy_signals[kucoin_account.currency]
             )
-            orders.append(
-                Order(
-                    order_id=order_id.get("orderId"),
-                    slug=strategy_signals[kucoin_account.currency].slug,
-                    strategy_guid=strategy_signals[kucoin_account.currency].strategy_guid
-                )
-            )
-        except kucoin.exceptions.KucoinAPIException as e:
-            if e.code == "900001":
-                print(f"{strategy_signals[kucoin_account.currency].slug}-USDT not exist")
-                print(e)
-                continue
-            raise e
-    # For each order, get the order details and write to a dynamo table
-    for order in orders:
-        order_details = ACCOUNT.get_order(order.order_id)
-        order_details["slug"] = order.slug
-        order_details["strategy_guid"] = order.strategy_guid
-        item = DYNAMO.create_item_from_dict(order_details)
-        DYNAMO.strategy_details_create_item(
-            tablename=HC.table_orders,
-            data=item
         )
+
+    # Every position is closed concurrently
+    placed, failed = ACCOUNT.place_limit_orders(orders)
+
+    if placed:
+        # For each order, get the order details and write to a dynamo table
+        details = ACCOUNT.get_orders_details([response["orderId"] for _, response in placed])
+        ORDERS.save_many(
+            {"order": order_details, "slug": order.meta.slug, "strategy_guid": order.meta.strategy_guid,
+             "status": classify(order_details)}
+            for (order, _), order_details in zip(placed, details)
+        )
+
+        # Hand the placed orders to the monitor
+        SQSMonitor.send_in_batches(create_monitor_messages([
+            (MONITOR_DELAY_SECONDS, MonitoredOrder(response["orderId"], order.meta.slug, order.meta.strategy_guid))
+            for order, response in placed
+        ]))
+
+    # Placed orders are recorded before any placement error is raised
+    for order, e in failed:
+        if isinstance(e, kucoin.exceptions.KucoinAPIException) and e.code == "900001":
+            print(f"{order.meta.slug}-USDT not exist")
+            print(e)
+            continue
+        raise e
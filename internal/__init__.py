@@ -1,18 +1,21 @@
 from .config.config import HarvestConfig
+from .lazy.lazy import Lazy
 from .service_dynamo.dynamo import ServiceDynamo
+from .service_dynamo.orders import OrderRepository
 from .service_kucoin.account import Account
 from .service_ses.ses import ServiceSES
 from .service_sns.sns import ServiceSNS
 
-HC = HarvestConfig()
-DYNAMO = ServiceDynamo()
-SES = ServiceSES()
-SNS = ServiceSNS()
+# Services are built on first use. Handlers that trade call ACCOUNT.refresh()
+HC = Lazy(HarvestConfig)
+DYNAMO = Lazy(ServiceDynamo)
+SES = Lazy(ServiceSES)
+SNS = Lazy(ServiceSNS)
+ORDERS = Lazy(lambda: OrderRepository(DYNAMO, HC.table_orders))
 
-ACCOUNT = Account(
+ACCOUNT = Lazy(lambda: Account(
     dynamo=DYNAMO, tablename=HC.table_account,
     key=HC.kucoin_key, secret=HC.kucoin_secret, api_pass_phrase=HC.kucoin_api_passphrase,
     max_trades=HC.strategy_max_trades,
     name="TRADE"
-)
-ACCOUNT.init_account()
+))
@@ -19,6 +19,8 @@ class HarvestConfig:
         # self.table_trade_meta = os.getenv("TABLE_TRADE_META", None)
         # self.table_trade_details = os.getenv("TABLE_TRADE_DETAILS", None)
         self.table_orders = os.getenv("TABLE_ORDERS", None)
+        self.harvest_float32 = os.getenv("HARVEST_FLOAT32", "false").lower() == "true"  # Pack harvest metrics as float32
+        self.harvest_lake_uri = os.getenv("HARVEST_LAKE_URI", "")  # Parquet mirror of the harvest table. Off when empty
         self.queue_harvest = os.getenv("QUEUE_HARVEST", None)
         self.queue_strategy = os.getenv("QUEUE_STRATEGY", None)
         #self.queue_trade = os.getenv("QUEUE_TRADE", None)
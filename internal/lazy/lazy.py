@@ -0,0 +1,38 @@
+"""
+lazy.py
+Deferred construction of module level services. A Lazy proxy builds its object on first attribute access,
+so importing a handler module no longer pays for boto3 clients, queue lookups or KuCoin calls it never uses.
+"""
+import threading
+from typing import Any, Callable
+
+
+class Lazy:
+    def __init__(self, factory: Callable[[], Any]):
+        object.__setattr__(self, "_factory", factory)
+        object.__setattr__(self, "_instance", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def _get(self) -> Any:
+        instance = object.__getattribute__(self, "_instance")
+        if instance is None:
+            with object.__getattribute__(self, "_lock"):
+                instance = object.__getattribute__(self, "_instance")
+                if instance is None:
+                    instance = object.__getattribute__(self, "_factory")()
+                    object.__setattr__(self, "_instance", instance)
+        return instance
+
+    def is_built(self) -> bool:
+        return object.__getattribute__(self, "_instance") is not None
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._get(), name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(self._get(), name, value)
+
+    def __repr__(self) -> str:
+        if not self.is_built():
+            return f"Lazy({object.__getattribute__(self, '_factory')!r})"
+        return repr(self._get())
@@ -0,0 +1,172 @@
+"""
+codec.py
+Typed, compact DynamoDB encodings.
+    * `marshal_value`: numbers are stored as N, booleans as BOOL and bytes as B. NaN and None are left out,
+      DynamoDB has no representation for them and a missing attribute reads back as NaN
+    * `ColumnarCodec`: one harvest item per slug and datetime_metric with every metric packed into a single
+      B attribute. The blob is a 4 byte header <version u8><itemsize u8><count u16> followed by `count`
+      little-endian float32 or float64 values, in `metrics` order
+"""
+import datetime
+import math
+import struct
+from decimal import Decimal
+from typing import Dict, List, Optional, Iterable, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Values in the harvest blob, in order. Append only: blobs written before a metric was added read it as NaN
+HARVEST_METRICS = [
+    "price_usd", "marketcap_usd",
+    "exchange_outflow_change_1d", "exchange_inflow_change_1d",
+    "age_consumed",
+    "active_addresses_24h_change_1d", "volume_usd_change_1d", "volume_usd"
+]
+BLOB_ATTRIBUTE = "metrics"
+BLOB_VERSION = 1
+BLOB_HEADER = struct.Struct("<BBH")
+BLOB_DTYPES = {4: np.dtype("<f4"), 8: np.dtype("<f8")}
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+def marshal_value(value, kind: str = None) -> Optional[Dict]:
+    """
+    DynamoDB attribute value for a Python or NumPy value
+    :param value:
+    :param kind: force the attribute type, "N" or "S". Strings like "1.5" become N when kind is "N"
+    :return:
+        None when the value cannot be stored (None, NaN, inf, or not a number for kind "N")
+    """
+    if value is None:
+        return None
+    if isinstance(value, dict):
+        return value  # Already an attribute value
+    if kind == "S":
+        return {"S": str(value)}
+    if kind == "N" and isinstance(value, str):
+        try:
+            value = float(value)
+        except ValueError:
+            return None
+    if isinstance(value, (bool, np.bool_)):
+        return {"BOOL": bool(value)}
+    if isinstance(value, (int, np.integer, Decimal)):
+        return {"N": str(value)}
+    if isinstance(value, (float, np.floating)):
+        return {"N": repr(float(value))} if math.isfinite(value) else None
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {"B": bytes(value)}
+    if isinstance(value, datetime.datetime):
+        return {"S": value.strftime(TIME_FORMAT)}
+    return {"S": str(value)}
+
+
+class ColumnarCodec:
+    def __init__(self, metrics: List[str] = None, float32: bool = False, attribute: str = BLOB_ATTRIBUTE):
+        """
+        :param metrics: blob layout
+        :param float32: pack values as float32, halving the blob. Prices keep about 7 significant digits
+        :param attribute: name of the B attribute
+        """
+        self.metrics = list(metrics or HARVEST_METRICS)
+        self.dtype = BLOB_DTYPES[4 if float32 else 8]
+        self.attribute = attribute
+
+    def encode(self, values: np.ndarray) -> List[bytes]:
+        """
+        One blob per row. The array is converted once and sliced, values are never touched one by one
+        :param values: shape (rows, len(metrics))
+        :return:
+        """
+        values = np.ascontiguousarray(values, dtype=self.dtype)
+        rows, count = values.shape
+        header = BLOB_HEADER.pack(BLOB_VERSION, self.dtype.itemsize, count)
+        buffer = values.tobytes()
+        width = count * self.dtype.itemsize
+        return [header + buffer[i * width:(i + 1) * width] for i in range(rows)]
+
+    def decode(self, blobs: List[bytes]) -> np.ndarray:
+        """
+        :param blobs:
+        :return:
+            float64 array of shape (len(blobs), len(metrics)); metrics a blob does not carry are NaN
+        """
+        values = np.full((len(blobs), len(self.metrics)), np.nan)
+        groups = dict()
+        for i, blob in enumerate(blobs):
+            groups.setdefault(bytes(blob[:BLOB_HEADER.size]), list()).append(i)
+        for header, rows in groups.items():
+            version, itemsize, count = BLOB_HEADER.unpack(header)
+            if version != BLOB_VERSION:
+                raise ValueError(f"Unknown harvest blob version {version}")
+            payload = b"".join(bytes(blobs[i][BLOB_HEADER.size:]) for i in rows)
+            decoded = np.frombuffer(payload, dtype=BLOB_DTYPES[itemsize]).reshape(len(rows), count)
+            n = min(count, len(self.metrics))
+            values[rows, :n] = decoded[:, :n]
+        return values
+
+    def items_from_frame(self, df: pd.DataFrame) -> List[Dict]:
+        """
+        Harvest items for a frame with slug, datetime_metric and metric columns. Missing metric columns are NaN
+        :param df:
+        :return:
+            Items in the low-level client format, ready for `ServiceDynamo.batch_write_items`
+        """
+        values = df.reindex(columns=self.metrics).to_numpy(dtype=np.float64)
+        created = {"S": datetime.datetime.utcnow().strftime(TIME_FORMAT)}
+        return [
+            {"slug": {"S": slug}, "datetime_metric": {"S": dt}, self.attribute: {"B": blob}, "datetime_created": created}
+            for slug, dt, blob in zip(df["slug"].astype(str), df["datetime_metric"].astype(str), self.encode(values))
+        ]
+
+    def columns_from_items(self, items: Iterable[Dict], metrics: List[str] = None) -> Tuple[List[str], np.ndarray]:
+        """
+        Decode harvest items in the low-level client format. Blob items are decoded in one pass; items written
+        before the blob layout, with one attribute per metric, are read attribute by attribute
+        :param items:
+        :param metrics: columns to return, defaults to every metric of the codec
+        :return:
+            (datetime_metric of each item, float64 array of shape (items, len(metrics)))
+        """
+        items = list(items)
+        metrics = metrics or self.metrics
+        datetimes = [item["datetime_metric"]["S"] for item in items]
+        values = np.full((len(items), len(metrics)), np.nan)
+
+        blob_rows, blobs = list(), list()
+        for i, item in enumerate(items):
+            attribute = item.get(self.attribute)
+            if attribute is not None:
+                blob_rows.append(i)
+                blobs.append(getattr(attribute["B"], "value", attribute["B"]))
+                continue
+            for j, metric in enumerate(metrics):
+                legacy = item.get(metric)
+                if legacy:
+                    values[i, j] = float(next(iter(legacy.values())))
+
+        if blobs:
+            decoded = self.decode(blobs)
+            for j, metric in enumerate(metrics):
+                if metric in self.metrics:
+                    values[blob_rows, j] = decoded[:, self.metrics.index(metric)]
+        return datetimes, values
+
+    def frame_from_items(self, items: Iterable[Dict], metrics: List[str] = None) -> pd.DataFrame:
+        """
+        :param items: harvest items in the low-level client format
+        :param metrics:
+        :return:
+            Frame with slug, datetime_metric and float64 metric columns
+        """
+        items = list(items)
+        metrics = metrics or self.metrics
+        datetimes, values = self.columns_from_items(items, metrics)
+        df = pd.DataFrame(values, columns=metrics, copy=False)
+        df.insert(0, "datetime_metric", datetimes)
+        df.insert(0, "slug", [item["slug"]["S"] for item in items])
+        return df
+
+
+HARVEST_CODEC = ColumnarCodec()  # Decodes float32 and float64 blobs alike
@@ -1,10 +1,17 @@
 import datetime
-from typing import Dict, Union, List
+import queue
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Union, List, Iterator, Optional
 from math import floor
 
 import boto3
+import numpy as np
 from boto3.dynamodb.conditions import Key
 
+from .codec import ColumnarCodec, HARVEST_CODEC, marshal_value
+
 
 class ItemDiscovery:
     def __init__(self, **kwargs):
@@ -12,6 +19,7 @@ class ItemDiscovery:
         self.ticker = kwargs.get("ticker", {}).get("S", None)
         self.slug = kwargs.get("slug", {}).get("S", None)
         self.datetime_last_updated = kwargs.get("datetimeLastUpdate", {}).get("S", "null")
+        self.datetime_backfilled = kwargs.get("datetimeBackfilled", {}).get("S", "null")
 
     def to_sqs_format(self, delay_seconds: int = 0):
         return {
@@ -25,12 +33,21 @@ class ItemDiscovery:
                 "ticker": {
                     "StringValue": self.ticker,
                     "DataType": "String"
+                },
+                "datetime_backfilled": {
+                    "StringValue": self.datetime_backfilled,
+                    "DataType": "String"
                 }
             }
         }
 
 
 class ServiceDynamo:
+    BATCH_WRITE_MAX_ITEMS = 25  # DynamoDB hard limit per BatchWriteItem call
+    BATCH_WRITE_MAX_RETRIES = 8
+    BATCH_WRITE_BACKOFF_BASE = 0.05  # Seconds
+    BATCH_WRITE_BACKOFF_CAP = 5.0  # Seconds
+
     def __init__(self):
         self.client = boto3.client("dynamodb")
         self.resource = boto3.resource("dynamodb")
@@ -69,43 +86,203 @@ class ServiceDynamo:
         return
 
     @staticmethod
-    def create_item_from_dict(data: Dict) -> Dict:
+    def create_item_from_dict(data: Dict, schema: Dict[str, str] = None) -> Dict:
+        """
+        Item in the low-level client format. Numbers (Python or NumPy) are stored as N, booleans as BOOL;
+        None and NaN are left out. See `codec.marshal_value`
+        :param data:
+        :param schema: attribute type per key, e.g. {"price": "N"} stores the string "1.5" as a number
+        :return:
+        """
         item = {}
+        schema = schema or dict()
         try:
             for k, v in data.items():
-                if type(v) is dict and "S" in v:
-                    item[k] = v["S"]
-                    continue
-                if type(v) in (float, int):
-                    item[k] = {"N": str(v)}
-                if type(v) is datetime.datetime:
-                    item[k] = {"S": v.strftime("%Y-%m-%dT%H:%M:%SZ")}
-                    continue
-                else:
-                    item[k] = {"S": str(v)}
+                attribute = marshal_value(v, schema.get(k))
+                if attribute is not None:
+                    item[k] = attribute
             item["datetime_created"] = {"S": datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")}
         except Exception as e:
             print(e)
             print("DATA: \n", data)
         return item
 
+    def batch_write_items(self, tablename: str, items: List[Dict], max_workers: int = 1) -> Dict:
+        """
+        Write items with BatchWriteItem in chunks of 25. UnprocessedItems are retried with
+        full-jitter exponential backoff. When max_workers > 1 the chunks are written concurrently.
+        :param tablename:
+        :param items: items in the format returned by `create_item_from_dict`
+        :param max_workers: number of threads used to write chunks
+        :return:
+            {"items": int, "calls": int, "unprocessed": int, "consumed_capacity": [float, ...]}
+        """
+        chunks = [
+            items[i: i + self.BATCH_WRITE_MAX_ITEMS]
+            for i in range(0, len(items), self.BATCH_WRITE_MAX_ITEMS)
+        ]
+        if max_workers > 1 and len(chunks) > 1:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as pool:
+                reports = list(pool.map(lambda chunk: self._batch_write_chunk(tablename, chunk), chunks))
+        else:
+            reports = [self._batch_write_chunk(tablename, chunk) for chunk in chunks]
+
+        return {
+            "items": len(items),
+            "calls": sum(r["calls"] for r in reports),
+            "unprocessed": sum(r["unprocessed"] for r in reports),
+            "consumed_capacity": [units for r in reports for units in r["consumed_capacity"]]
+        }
+
+    def _batch_write_chunk(self, tablename: str, chunk: List[Dict]) -> Dict:
+        """
+        Write a single chunk (<= 25 items), retrying UnprocessedItems until drained or retries exhausted
+        :param tablename:
+        :param chunk:
+        :return:
+        """
+        request_items = {tablename: [{"PutRequest": {"Item": item}} for item in chunk]}
+        report = {"calls": 0, "unprocessed": 0, "consumed_capacity": []}
+        for attempt in range(self.BATCH_WRITE_MAX_RETRIES + 1):
+            if attempt:
+                backoff = min(self.BATCH_WRITE_BACKOFF_CAP, self.BATCH_WRITE_BACKOFF_BASE * 2 ** attempt)
+                time.sleep(random.uniform(0, backoff))
+            response = self.client.batch_write_item(
+                RequestItems=request_items,
+                ReturnConsumedCapacity="TOTAL"
+            )
+            report["calls"] += 1
+            report["consumed_capacity"].extend(
+                capacity.get("CapacityUnits", 0.0) for capacity in response.get("ConsumedCapacity", [])
+            )
+            request_items = response.get("UnprocessedItems", {})
+            if not request_items:
+                return report
+
+        report["unprocessed"] = sum(len(requests) for requests in request_items.values())
+        print(f"BatchWrite {tablename}: {report['unprocessed']} items unprocessed after {report['calls']} calls")
+        return report
+
+    def scan_iter(self, tablename: str, projection: Optional[str] = None, total_segments: int = 1) -> Iterator[Dict]:
+        """
+        Stream raw items from a table scan. Follows LastEvaluatedKey until the table is exhausted.
+        With total_segments > 1 a parallel scan is run, one thread per segment, and items are
+        yielded as soon as any segment returns a page.
+        :param tablename:
+        :param projection: ProjectionExpression, e.g. "slug, ticker"
+        :param total_segments: number of parallel scan segments
+        :return:
+            Generator of items in the low-level client format
+        """
+        if total_segments <= 1:
+            for page in self._scan_segment_pages(tablename, projection):
+                yield from page
+            return
+
+        pages = queue.Queue()
+        done = object()
+
+        def worker(segment: int):
+            try:
+                for page in self._scan_segment_pages(tablename, projection, segment, total_segments):
+                    pages.put(page)
+            except Exception as e:
+                pages.put(e)
+            finally:
+                pages.put(done)
+
+        with ThreadPoolExecutor(max_workers=total_segments) as pool:
+            for segment in range(total_segments):
+                pool.submit(worker, segment)
+            remaining = total_segments
+            while remaining:
+                page = pages.get()
+                if page is done:
+                    remaining -= 1
+                    continue
+                if isinstance(page, Exception):
+                    raise page
+                yield from page
+
+    def _scan_segment_pages(self, tablename: str, projection: Optional[str] = None, segment: int = None,
+                            total_segments: int = None) -> Iterator[List[Dict]]:
+        scan_kwargs = {"TableName": tablename}
+        if projection:
+            scan_kwargs["ProjectionExpression"] = projection
+        else:
+            scan_kwargs["Select"] = "ALL_ATTRIBUTES"
+        if total_segments:
+            scan_kwargs["Segment"] = segment
+            scan_kwargs["TotalSegments"] = total_segments
+
+        while True:
+            response = self.client.scan(**scan_kwargs)
+            yield response.get("Items", [])
+            start_key = response.get("LastEvaluatedKey", None)
+            if start_key is None:
+                return
+            scan_kwargs["ExclusiveStartKey"] = start_key
+
+    def discovery_scan_iter(self, tablename: str, total_segments: int = 1) -> Iterator[ItemDiscovery]:
+        """
+        Stream the Discovery table, projecting only the attributes needed to prime the harvest
+        :param tablename:
+        :param total_segments: number of parallel scan segments
+        :return:
+        """
+        items = self.scan_iter(
+            tablename, projection="slug, ticker, datetimeLastUpdate, datetimeBackfilled", total_segments=total_segments
+        )
+        return (ItemDiscovery(**item) for item in items)
+
     def discovery_scan(self, tablename: str) -> List[ItemDiscovery]:
-        items = list()
-        scan_kwargs = {}
-        done = False
-        start_key = None
-        while not done:
-            if start_key:
-                scan_kwargs["ExclusiveStartKey"] = start_key
-            response = self.client.scan(
+        return [ItemDiscovery(**item) for item in self.scan_iter(tablename)]
+
+    def discovery_set_watermark(self, tablename: str, slug: str, watermark: str) -> bool:
+        """
+        Advance the harvest high-watermark (`datetimeLastUpdate`) of a slug. The write is conditional: it only
+        lands when the slug is still in the table and the stored watermark is missing or older, so a replayed
+        or out of order harvest can never move it backwards.
+        :param tablename:
+        :param slug:
+        :param watermark: datetime of the newest harvested sample, "%Y-%m-%dT%H:%M:%SZ"
+        :return:
+            False when the condition failed
+        """
+        try:
+            self.client.update_item(
                 TableName=tablename,
-                Select="ALL_ATTRIBUTES"
+                Key={"slug": {"S": slug}},
+                UpdateExpression="SET datetimeLastUpdate = :watermark",
+                ConditionExpression="attribute_exists(slug) AND "
+                                    "(attribute_not_exists(datetimeLastUpdate) OR datetimeLastUpdate < :watermark)",
+                ExpressionAttributeValues={":watermark": {"S": watermark}}
             )
-            items.extend(response.get("Items", []))
-            start_key = response.get("LastEvaluatedKey", None)
-            done = start_key is None
-        items = [ItemDiscovery(**item) for item in items]
-        return items
+        except self.client.exceptions.ConditionalCheckFailedException:
+            return False
+        return True
+
+    def discovery_set_backfilled(self, tablename: str, slug: str, datetime_backfilled: str) -> bool:
+        """
+        Stamp a slug whose history was rewritten by a backfill (`datetimeBackfilled`). The stamp travels with
+        the harvest and strategy messages, so caches of the slug's series know to reload it
+        :param tablename:
+        :param slug:
+        :param datetime_backfilled: "%Y-%m-%dT%H:%M:%SZ"
+        :return:
+            False when the slug is not in the table
+        """
+        try:
+            self.client.update_item(
+                TableName=tablename,
+                Key={"slug": {"S": slug}},
+                UpdateExpression="SET datetimeBackfilled = :stamp",
+                ConditionExpression="attribute_exists(slug)",
+                ExpressionAttributeValues={":stamp": {"S": datetime_backfilled}}
+            )
+        except self.client.exceptions.ConditionalCheckFailedException:
+            return False
+        return True
 
     def discovery_delete_item(self, tablename: str, slug: str) -> None:
         self.client.delete_item(
@@ -141,10 +318,55 @@ class ServiceDynamo:
     def harvest_get_data_for_slug_within_range(self, tablename: str, slug: str, date_from: str, date_to: str) -> List[
         Dict]:
         table = self.resource.Table(tablename)
-        response = table.query(
-            KeyConditionExpression=Key("slug").eq(slug) & Key("datetime_metric").between(date_from, date_to)
+        query_kwargs = {
+            "KeyConditionExpression": Key("slug").eq(slug) & Key("datetime_metric").between(date_from, date_to)
+        }
+        items = list()
+        while True:
+            response = table.query(**query_kwargs)
+            items.extend(response["Items"])
+            if "LastEvaluatedKey" not in response:
+                break
+            query_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+        return items if len(items) else None
+
+    def harvest_get_columns_for_slug_within_range(self, tablename: str, slug: str, date_from: str, date_to: str,
+                                                  metrics: List[str], codec: ColumnarCodec = HARVEST_CODEC) \
+            -> Union[Dict[str, np.ndarray], None]:
+        """
+        Paginated query projecting only `datetime_metric`, the metrics blob and, for items written before the
+        blob layout, the requested metric attributes. Values are decoded into float64 arrays; missing metrics
+        become NaN.
+        :param tablename:
+        :param slug:
+        :param date_from: inclusive
+        :param date_to: inclusive
+        :param metrics: metric names
+        :param codec: blob layout
+        :return:
+            None when there is no data, else
+            {"datetime_metric": ndarray[str], "values": ndarray[float64] with shape (len(metrics), rows)}
+        """
+        names = {f"#m{i}": metric for i, metric in enumerate(metrics)}
+        names["#slug"] = "slug"
+        names["#dt"] = "datetime_metric"
+        names["#blob"] = codec.attribute
+        paginator = self.client.get_paginator("query")
+        pages = paginator.paginate(
+            TableName=tablename,
+            KeyConditionExpression="#slug = :slug AND #dt BETWEEN :date_from AND :date_to",
+            ProjectionExpression=", ".join(["#dt", "#blob"] + [f"#m{i}" for i in range(len(metrics))]),
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues={
+                ":slug": {"S": slug}, ":date_from": {"S": date_from}, ":date_to": {"S": date_to}
+            }
         )
-        return response["Items"] if len(response["Items"]) else None
+
+        items = [item for page in pages for item in page.get("Items", [])]
+        if not items:
+            return None
+        datetimes, values = codec.columns_from_items(items, metrics)
+        return {"datetime_metric": np.array(datetimes, dtype=object), "values": values.T}
 
     def strategy_meta_create_item(self, tablename: str, data: Dict[str, Union[str, float]]) -> None:
         """
@@ -278,6 +500,32 @@ class ServiceDynamo:
             }
         )
 
+    def account_put_market_snapshot(self, tablename: str, payload: bytes, account_name: str = "MARKET_SNAPSHOT"):
+        """
+        Store the compressed market data snapshot as a binary attribute on a reserved account record
+        :param tablename:
+        :param payload: MarketCache.to_bytes()
+        :param account_name:
+        :return:
+        """
+        self.client.put_item(
+            TableName=tablename,
+            Item={
+                "account_name": {"S": account_name},
+                "snapshot": {"B": payload},
+                "datetime_updated": {"S": datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")}
+            }
+        )
+
+    def account_get_market_snapshot(self, tablename: str, account_name: str = "MARKET_SNAPSHOT") -> Optional[bytes]:
+        resp = self.client.get_item(
+            TableName=tablename,
+            Key={
+                "account_name": {"S": account_name}
+            }
+        )
+        return resp.get("Item", {}).get("snapshot", {}).get("B", None)
+
     def account_log_put_item(self, tablename: str, item: Dict):
         resp = self.client.put_item(
             TableName=tablename,
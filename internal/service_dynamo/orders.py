@@ -0,0 +1,184 @@
+"""
+orders.py
+Order lifecycle store on the orders table (HASH slug, RANGE id).
+    * numeric fields are stored as N and flags as BOOL, so they can be compared and summed in queries
+    * `status` and `symbol` back the status-symbol-index GSI: open orders are an indexed query, not a scan
+    * terminal orders (filled, cancelled) get an `expires_at` TTL
+    * writes are conditional on the stored status rank and dealSize, so replays and stale reads are no-ops
+"""
+import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from typing import Dict, List, Optional, Iterable
+
+from boto3.dynamodb.types import TypeDeserializer
+
+from ..service_kucoin.order_state import OrderState, TERMINAL
+
+STATUS_INDEX = "status-symbol-index"
+OPEN_STATUSES = [OrderState.ACTIVE, OrderState.PARTIALLY_FILLED]
+STATUS_RANK = {
+    OrderState.ACTIVE: 0,
+    OrderState.PARTIALLY_FILLED: 1,
+    OrderState.FILLED: 2,
+    OrderState.CANCELLED: 2,
+}
+NUMERIC_FIELDS = {
+    "price", "size", "funds", "dealFunds", "dealSize", "fee", "stopPrice", "visibleSize", "cancelAfter", "createdAt"
+}
+INTEGER_FIELDS = {"createdAt", "cancelAfter", "expires_at", "status_rank"}
+KEY_FIELDS = {"slug", "id"}
+
+
+def marshal_order(order: Dict) -> Dict:
+    """
+    DynamoDB attribute values for an order dict. Known numeric fields and Python numbers become N,
+    booleans BOOL, None and empty strings are dropped and everything else is stored as S
+    :param order:
+    :return:
+    """
+    item = dict()
+    for k, v in order.items():
+        if v is None or v == "":
+            continue
+        if isinstance(v, bool):
+            item[k] = {"BOOL": v}
+        elif isinstance(v, (int, float, Decimal)) or k in NUMERIC_FIELDS:
+            try:
+                item[k] = {"N": str(Decimal(str(v)))}
+            except ArithmeticError:
+                item[k] = {"S": str(v)}
+        else:
+            item[k] = {"S": str(v)}
+    return item
+
+
+def unmarshal_order(item: Dict) -> Dict:
+    deserializer = TypeDeserializer()
+    order = dict()
+    for k, v in item.items():
+        value = deserializer.deserialize(v)
+        if isinstance(value, Decimal):
+            value = int(value) if k in INTEGER_FIELDS else float(value)
+        order[k] = value
+    return order
+
+
+class OrderRepository:
+    def __init__(self, dynamo, tablename: str, ttl_days: float = 30):
+        """
+        :param dynamo: ServiceDynamo
+        :param tablename:
+        :param ttl_days: lifetime of terminal orders
+        """
+        self.dynamo = dynamo
+        self.tablename = tablename
+        self.ttl_days = ttl_days
+
+    def save(self, order: Dict, slug: str, strategy_guid: str, status: OrderState) -> bool:
+        """
+        Record an order in `status`. The write only lands when it moves the order forward: a higher status rank,
+        or the same rank with at least the stored dealSize. Repeating a write stores the same values.
+        :param order: KuCoin order details
+        :param slug:
+        :param strategy_guid:
+        :param status:
+        :return:
+            False when the stored order is already at or past this point
+        """
+        now = datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
+        fields = {
+            **order,
+            "strategy_guid": strategy_guid,
+            "status": status.value,
+            "status_rank": STATUS_RANK[status],
+            "datetime_updated": now,
+        }
+        if status in TERMINAL:
+            fields["expires_at"] = int(time.time() + self.ttl_days * 86400)
+        values = marshal_order({k: v for k, v in fields.items() if k not in KEY_FIELDS})
+        values.setdefault("dealSize", {"N": "0"})
+
+        names = {f"#f{i}": k for i, k in enumerate(values)}
+        placeholders = {f"#f{i}": f":v{i}" for i in range(len(values))}
+        try:
+            self.dynamo.client.update_item(
+                TableName=self.tablename,
+                Key={"slug": {"S": slug}, "id": {"S": order["id"]}},
+                UpdateExpression="SET " + ", ".join(f"{n} = {placeholders[n]}" for n in names)
+                                 + ", #created = if_not_exists(#created, :created)",
+                ConditionExpression="attribute_not_exists(#id) OR #rank < :rank "
+                                    "OR (#rank = :rank AND #deal_size <= :deal_size)",
+                ExpressionAttributeNames={
+                    **names, "#id": "id", "#rank": "status_rank", "#deal_size": "dealSize",
+                    "#created": "datetime_created"
+                },
+                ExpressionAttributeValues={
+                    **{placeholders[n]: values[k] for n, k in names.items()},
+                    ":rank": values["status_rank"], ":deal_size": values["dealSize"], ":created": {"S": now}
+                }
+            )
+        except self.dynamo.client.exceptions.ConditionalCheckFailedException:
+            return False
+        return True
+
+    def save_many(self, orders: Iterable[Dict], max_workers: int = 8) -> Dict[str, int]:
+        """
+        Conditional writes run concurrently; BatchWriteItem cannot carry conditions
+        :param orders: {"order": dict, "slug": str, "strategy_guid": str, "status": OrderState}
+        :param max_workers:
+        :return:
+            {"written": int, "skipped": int}
+        """
+        orders = list(orders)
+        if not orders:
+            return {"written": 0, "skipped": 0}
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(orders))) as pool:
+            results = list(pool.map(lambda kwargs: self.save(**kwargs), orders))
+        return {"written": sum(results), "skipped": len(results) - sum(results)}
+
+    def get(self, slug: str, order_id: str) -> Optional[Dict]:
+        resp = self.dynamo.client.get_item(
+            TableName=self.tablename,
+            Key={"slug": {"S": slug}, "id": {"S": order_id}}
+        )
+        return unmarshal_order(resp["Item"]) if resp.get("Item") else None
+
+    def query_status(self, status: OrderState, symbol: str = None) -> List[Dict]:
+        """
+        Orders in one status, optionally for one symbol, from the status-symbol-index
+        :param status:
+        :param symbol: trading pair, e.g. BTC-USDT
+        :return:
+        """
+        kwargs = {
+            "TableName": self.tablename,
+            "IndexName": STATUS_INDEX,
+            "KeyConditionExpression": "#status = :status",
+            "ExpressionAttributeNames": {"#status": "status"},
+            "ExpressionAttributeValues": {":status": {"S": status.value}},
+        }
+        if symbol:
+            kwargs["KeyConditionExpression"] += " AND #symbol = :symbol"
+            kwargs["ExpressionAttributeNames"]["#symbol"] = "symbol"
+            kwargs["ExpressionAttributeValues"][":symbol"] = {"S": symbol}
+
+        orders = list()
+        while True:
+            resp = self.dynamo.client.query(**kwargs)
+            orders.extend(unmarshal_order(item) for item in resp.get("Items", []))
+            if "LastEvaluatedKey" not in resp:
+                return orders
+            kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+    def open_orders(self, symbol: str = None) -> List[Dict]:
+        """
+        Every active or partially filled order, optionally for one symbol. One index query per open status,
+        run concurrently
+        :param symbol:
+        :return:
+        """
+        with ThreadPoolExecutor(max_workers=len(OPEN_STATUSES)) as pool:
+            results = pool.map(lambda status: self.query_status(status, symbol), OPEN_STATUSES)
+        return [order for orders in results for order in orders]
@@ -0,0 +1,67 @@
+import os
+
+import boto3
+import numpy as np
+import pandas as pd
+from moto import mock_aws
+
+from .codec import ColumnarCodec, HARVEST_METRICS
+from .dynamo import ServiceDynamo
+
+
+def harvest_frame(rows: int) -> pd.DataFrame:
+    values = np.random.default_rng(5).normal(100, 10, size=(rows, len(HARVEST_METRICS)))
+    df = pd.DataFrame(values, columns=HARVEST_METRICS)
+    df.loc[1, "age_consumed"] = np.nan
+    df["datetime_metric"] = pd.date_range("2021-01-01", periods=rows, freq="D").strftime("%Y-%m-%dT%H:%M:%SZ")
+    df["slug"] = "bitcoin"
+    return df
+
+
+class TestCreateItemFromDict:
+    def test_typed_attributes(self):
+        item = ServiceDynamo.create_item_from_dict(
+            {"slug": "bitcoin", "price": 1.5, "count": np.int64(3), "open": True, "gap": np.nan, "size": "2"},
+            schema={"size": "N"}
+        )
+        assert item["price"] == {"N": "1.5"} and item["count"] == {"N": "3"} and item["size"] == {"N": "2.0"}
+        assert item["open"] == {"BOOL": True} and item["slug"] == {"S": "bitcoin"}
+        assert "gap" not in item
+
+
+class TestColumnarCodec:
+    def test_round_trip(self):
+        df = harvest_frame(4)
+        for float32 in (False, True):
+            codec = ColumnarCodec(float32=float32)
+            items = codec.items_from_frame(df)
+            assert len(items[0]["metrics"]["B"]) == 4 + len(HARVEST_METRICS) * (4 if float32 else 8)
+            decoded = codec.frame_from_items(items)
+            np.testing.assert_allclose(decoded[HARVEST_METRICS], df[HARVEST_METRICS], rtol=1e-6 if float32 else 0)
+            assert np.isnan(decoded.loc[1, "age_consumed"])
+
+    def test_appended_metric_reads_as_nan(self):
+        items = ColumnarCodec(HARVEST_METRICS[:2]).items_from_frame(harvest_frame(2))
+        values = ColumnarCodec(HARVEST_METRICS[:3]).decode([item["metrics"]["B"] for item in items])
+        assert np.isnan(values[:, 2]).all() and not np.isnan(values[:, :2]).any()
+
+    @mock_aws
+    def test_query_reads_blob_and_legacy_items(self):
+        os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+        boto3.client("dynamodb").create_table(
+            TableName="harvest",
+            AttributeDefinitions=[{"AttributeName": n, "AttributeType": "S"} for n in ["slug", "datetime_metric"]],
+            KeySchema=[{"AttributeName": "slug", "KeyType": "HASH"}, {"AttributeName": "datetime_metric", "KeyType": "RANGE"}],
+            BillingMode="PAY_PER_REQUEST"
+        )
+        dynamo = ServiceDynamo()
+        df = harvest_frame(3)
+        legacy = ServiceDynamo.create_item_from_dict(df.iloc[0].astype(str).to_dict())  # Written before the blob
+        dynamo.batch_write_items("harvest", [legacy] + ColumnarCodec().items_from_frame(df.iloc[1:]))
+
+        metrics = ["price_usd", "age_consumed"]
+        columns = dynamo.harvest_get_columns_for_slug_within_range(
+            "harvest", "bitcoin", "2021-01-01", "2021-01-04", metrics
+        )
+        assert list(columns["datetime_metric"]) == list(df["datetime_metric"])
+        np.testing.assert_allclose(columns["values"], df[metrics].to_numpy().T)
@@ -0,0 +1,60 @@
+import os
+
+import boto3
+from moto import mock_aws
+
+from .dynamo import ServiceDynamo
+from .orders import OrderRepository, STATUS_INDEX
+from ..service_kucoin.order_state import OrderState
+
+ORDER = {
+    "id": "5c35c02703aa673ceec2a168", "symbol": "BTC-USDT", "side": "buy", "price": "10", "size": "2",
+    "dealSize": "0", "isActive": True, "cancelExist": False, "createdAt": 1547026471000, "remark": None
+}
+
+
+def create_table():
+    boto3.client("dynamodb").create_table(
+        TableName="orders",
+        AttributeDefinitions=[{"AttributeName": name, "AttributeType": "S"} for name in ["slug", "id", "status", "symbol"]],
+        KeySchema=[{"AttributeName": "slug", "KeyType": "HASH"}, {"AttributeName": "id", "KeyType": "RANGE"}],
+        GlobalSecondaryIndexes=[{
+            "IndexName": STATUS_INDEX,
+            "KeySchema": [{"AttributeName": "status", "KeyType": "HASH"}, {"AttributeName": "symbol", "KeyType": "RANGE"}],
+            "Projection": {"ProjectionType": "ALL"}
+        }],
+        BillingMode="PAY_PER_REQUEST"
+    )
+
+
+class TestOrderRepository:
+    def setup_method(self):
+        os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+    @mock_aws
+    def test_typed_attributes_and_open_query(self):
+        create_table()
+        orders = OrderRepository(ServiceDynamo(), "orders")
+        assert orders.save(ORDER, "bitcoin", "guid", OrderState.ACTIVE)
+        item = boto3.client("dynamodb").get_item(
+            TableName="orders", Key={"slug": {"S": "bitcoin"}, "id": {"S": ORDER["id"]}}
+        )["Item"]
+        assert item["price"] == {"N": "10"}
+        assert item["isActive"] == {"BOOL": True}
+        assert "remark" not in item and "expires_at" not in item
+        assert [o["id"] for o in orders.open_orders()] == [ORDER["id"]]
+        assert orders.open_orders(symbol="ETH-USDT") == []
+
+    @mock_aws
+    def test_writes_only_move_forward(self):
+        create_table()
+        orders = OrderRepository(ServiceDynamo(), "orders")
+        filled = {**ORDER, "isActive": False, "dealSize": "2"}
+        assert orders.save(filled, "bitcoin", "guid", OrderState.FILLED)
+        assert not orders.save(ORDER, "bitcoin", "guid", OrderState.ACTIVE)
+        assert orders.save(filled, "bitcoin", "guid", OrderState.FILLED)  # Replay is harmless
+        stored = orders.get("bitcoin", ORDER["id"])
+        assert stored["status"] == "filled"
+        assert stored["dealSize"] == 2.0
+        assert stored["expires_at"] > 0
+        assert orders.open_orders() == []
@@ -2,10 +2,25 @@
 account.py
 Implements the basic account computations required create trades.
 """
-from typing import List, Union, Tuple, Dict
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Union, Tuple, Dict, Iterable
 
 import boto3
 from kucoin.client import Client
+from requests.adapters import HTTPAdapter
+
+from .client import RateLimitedClient
+from .market import MarketCache
+from .orders import OpenOrderIndex, fetch_active_orders
+from .prices import PriceService
+from .symbols import SymbolTable
+
+MARKET_MAX_AGE = 60  # Seconds a market snapshot is used before it is reloaded
+
+# A limit order to place. `meta` is carried through untouched, e.g. the strategy signal behind the order
+OrderRequest = namedtuple("OrderRequest", ["symbol", "side", "price", "size", "meta"])
 
 
 class KuCoinAcct:
@@ -21,18 +36,11 @@ class KuCoinAcct:
     def to_dict(self):
         return self.__dict__
 
-    def get_usdt_equivalent(self, client: Client, override: bool = False) -> float:
-        current_usdt = client.get_fiat_prices(symbol=self.currency)
-        self.current_usdt = float(current_usdt[self.currency])  # Set on object to cut down on calls
+    def get_usdt_equivalent(self, prices: PriceService) -> float:
+        self.current_usdt = prices.get(self.currency)  # Set on object to cut down on calls
         return self.current_usdt
 
 
-class Symbol:
-    def __init__(self, **kwargs):
-        for key, value in kwargs.items():
-            self.__setattr__(key, value)
-
-
 class Account:
     def __init__(self, dynamo: boto3.client, tablename: str, key: str, secret: str, api_pass_phrase: str,
                  max_trades: int = 10, name: str = "TRADE"):
@@ -45,12 +53,16 @@ class Account:
         self.api_pass_phrase = api_pass_phrase
 
         self.client = None
+        self.prices = None
+        self.market = None
         self.symbols = None
         self.trade_accounts = None
         self.trades_open = None
         self.balance = None
         self.balance_avail = None
         self.position_max = None
+        self.open_orders = None
+        self.open_orders_lock = threading.Lock()
         self.orders_open_sell = None
 
     def init_account(self):
@@ -62,15 +74,69 @@ class Account:
         """
         # Init the KuCoin client.
         # Load trades, total balance, and available balance
-        self.client = Client(self.key, self.secret, self.api_pass_phrase)
-        self.symbols = [Symbol(**symbol) for symbol in self.client.get_symbols()]
-        self.trade_accounts = self.get_trade_accounts()  # All non-zero trade accounts
-        self.trades_open = self.get_trades_open()  # All non-zero trade accounts NOT USDT
-        self.balance = self.get_trade_balance_total()  # All trade account balances converted to USDT
-        self.balance_avail = self.get_trade_balance_available()  # Available USDT
-        self.orders_open_sell = self.get_open_sell_orders()
+        if self.client is None:
+            self.client = self.create_client()
+            self.prices = PriceService(self.client)
+
+        # Symbols, accounts, prices, market quotes and active orders (both sides) are independent.
+        # Fetch them concurrently
+        load_symbols = self.symbols is None or self.symbols.expired()
+        with ThreadPoolExecutor(max_workers=5) as pool:
+            symbols = pool.submit(SymbolTable.load, self.client) if load_symbols else None
+            market = pool.submit(self.load_market)
+            accounts = pool.submit(self.client.get_accounts)
+            orders = pool.submit(fetch_active_orders, self.client)
+            pool.submit(self.prices.snapshot).result()
+            if symbols is not None:
+                self.symbols = symbols.result()
+            market.result()
+            self.apply_snapshot(accounts.result(), orders.result())
+        self.update_account_record()
+
+    def refresh(self):
+        """
+        Make the account current at the start of a handler invocation. The first call loads everything with
+        `init_account`. A warm container keeps the client, the symbols and a fresh market cache; balances and
+        the open order index change between invocations and are re-fetched, concurrently
+        :return:
+        """
+        if self.trade_accounts is None:
+            self.init_account()
+            return
 
-        # Make any updates to dynamo
+        load_symbols = self.symbols is None or self.symbols.expired()
+        load_market = self.market is None or self.market.age() > MARKET_MAX_AGE
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            symbols = pool.submit(SymbolTable.load, self.client) if load_symbols else None
+            market = pool.submit(self.load_market) if load_market else None
+            accounts = pool.submit(self.client.get_accounts)
+            self.refresh_open_orders()
+            if symbols is not None:
+                self.symbols = symbols.result()
+            if market is not None:
+                market.result()
+            self.apply_snapshot(accounts.result())
+        self.update_account_record()
+
+    def load_market(self):
+        """
+        Quotes from the market feed's snapshots. Only the snapshots are used: a cold start without one must not
+        download allTickers
+        :return:
+        """
+        try:
+            self.market = MarketCache.load(dynamo=self.dynamo, tablename=self.tablename, url=None,
+                                           max_age=MARKET_MAX_AGE)
+        except Exception as e:
+            # Quotes are an optimisation. Without them limit prices come from the per-symbol calls
+            print(f"Market cache not loaded: {e}")
+            self.market = None
+
+    def update_account_record(self):
+        """
+        Write the account totals to dynamo and derive position_max from the balance
+        :return:
+        """
         self.dynamo.account_update(
             self.tablename, account_name=self.name,
             trades_max=self.trades_max, trades_open=self.trades_open,
@@ -80,15 +146,63 @@ class Account:
 
         self.position_max = int(self.balance / self.trades_max)
 
+    def refresh_balances(self):
+        """
+        Delta refresh after placing an order: re-fetch only balances. The open order index is kept current
+        by the order methods, symbols and the price snapshot are reused and the dynamo account record is not
+        rewritten. position_max keeps its value from the last `init_account` or `refresh`.
+        :return:
+        """
+        self.apply_snapshot(self.client.get_accounts())
+
+    def create_client(self) -> RateLimitedClient:
+        """
+        Rate limited KuCoin client whose requests session pools enough connections for the concurrent loads
+        :return:
+        """
+        client = Client(self.key, self.secret, self.api_pass_phrase)
+        session = getattr(client, "session", None)
+        if session is not None:
+            session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+        return RateLimitedClient(client)
+
+    def apply_snapshot(self, accounts: List[Dict], orders: List[Dict] = None):
+        """
+        Derive the account state from raw `get_accounts` and active order listings
+        :param accounts:
+        :param orders: every active order. The current open order index is kept when not given
+        :return:
+        """
+        if orders is not None:
+            self.open_orders = OpenOrderIndex(orders)
+        self.trade_accounts = self.get_trade_accounts(accounts)  # All non-zero trade accounts
+        self.trades_open = self.get_trades_open()  # All non-zero trade accounts NOT USDT
+        self.balance = self.get_trade_balance_total()  # All trade account balances converted to USDT
+        self.balance_avail = self.get_trade_balance_available()  # Available USDT
+        self.orders_open_sell = self.get_open_sell_orders()
+
+    def refresh_open_orders(self):
+        """
+        Rebuild the open order index from one active order listing. Between invocations orders fill, are
+        cancelled or are placed elsewhere, so a warm container must not answer from the previous index
+        :return:
+        """
+        orders = fetch_active_orders(self.client)
+        with self.open_orders_lock:
+            self.open_orders = OpenOrderIndex(orders)
+            self.orders_open_sell = self.get_open_sell_orders()
+
     def get_open_sell_orders(self) -> List[str]:
-        return [
-            item.get("symbol") for item in
-            self.client.get_orders(side=self.client.SIDE_SELL, status="active").get("items")
-        ]
+        return self.open_orders.symbols(self.client.SIDE_SELL)
 
     def to_dict(self):
         dict_copy = {**self.__dict__}
         del dict_copy["client"]
+        del dict_copy["prices"]
+        del dict_copy["market"]
+        del dict_copy["symbols"]
+        del dict_copy["open_orders"]
+        del dict_copy["open_orders_lock"]
         del dict_copy["dynamo"]
         del dict_copy["secret"]
         del dict_copy["api_pass_phrase"]
@@ -110,29 +224,22 @@ class Account:
         return True
 
     def get_price_increment_for_symbol(self, ticker_kucoin: str) -> int:
-        for symbol in self.symbols:
-            if symbol.symbol == ticker_kucoin:
-                increment = symbol.baseIncrement  # String value "0.0001"
-                num_decimals = increment.split(".")[-1]
-                return len(num_decimals) - 1
-        return 4  # small enough for most all trading pairs (just in case)
+        return self.symbols.price_decimals(ticker_kucoin)
 
     def get_base_increment_for_symbol(self, ticker_kucoin: str) -> int:
-        for symbol in self.symbols:
-            if symbol.symbol == ticker_kucoin:
-                increment = symbol.baseIncrement
-                num_decimals = increment.split(".")[-1]
-                return len(num_decimals)
-        return 4
+        return self.symbols.base_decimals(ticker_kucoin)
 
-    def get_trade_accounts(self) -> List[KuCoinAcct]:
+    def get_trade_accounts(self, accounts: List[Dict] = None) -> List[KuCoinAcct]:
         """
         Get list of all TRADE accounts where balance is above a near-zero threshold
+        :param accounts: raw `get_accounts` response. Fetched when not given
         :return:
         List of KuCoinAcct objects
         """
+        if accounts is None:
+            accounts = self.client.get_accounts()
         return [
-            KuCoinAcct(**act) for act in self.client.get_accounts()
+            KuCoinAcct(**act) for act in accounts
             if ((float(act["balance"]) > 0.01) and (act["type"] == "trade"))  # Nonzero traiding pairs
                or ((act["currency"] == "USDT") and (act["type"] == "trade"))  # Just USDT
         ]
@@ -145,7 +252,7 @@ class Account:
         """
         # Trade accounts with non-zero balance
         return sum(
-            acct.get_usdt_equivalent(self.client) * acct.balance
+            acct.get_usdt_equivalent(self.prices) * acct.balance
             for acct in self.trade_accounts
         )
 
@@ -181,13 +288,26 @@ class Account:
         Trades are placed in the base currency. BTC-USDT: BTC is the base. USDT is the quote
         To place a trade, the USDT position size must be converted to the corresponding amount in the
         base pair.
-        :param symbol:
+        The price comes from the market cache (best ask) and falls back to the fiat price snapshot.
+        :param symbol: base currency
         :param position_size: number of dollars to spend
         :return:
         """
-        quote_usdt = float(self.client.get_fiat_prices(symbol=symbol)[symbol])
+        quote_usdt = self.limit_price(f"{symbol}-USDT", self.client.SIDE_BUY) or self.prices.get(symbol)
         return quote_usdt, position_size / quote_usdt
 
+    def limit_price(self, symbol: str, side: str) -> Union[float, None]:
+        """
+        Limit price from the local market cache: best ask to buy, best bid to sell
+        :param symbol: trading pair, e.g. BTC-USDT
+        :param side:
+        :return:
+            None when the symbol is not in the cache
+        """
+        if self.market is None:
+            return None
+        return self.market.limit_price(symbol, side)
+
     def create_limit_order_buy(self, symbol: str, price: float, size: float) -> Union[Dict[str, str], None]:
         """
         Creation of limit order to buy. Order is good for 1 hour
@@ -212,6 +332,7 @@ class Account:
             cancel_after=str(3600)  # Cancel after 1 hour
         )
         print(f"OrderId: {order_id}")
+        self.record_open_order(order_id, symbol, self.client.SIDE_BUY, price, size)
         return order_id
 
     def create_limit_order_sell(self, symbol: str, price: float, size: float) -> Union[Dict[str, str], None]:
@@ -240,31 +361,125 @@ class Account:
             time_in_force=self.client.TIMEINFORCE_GOOD_TILL_TIME,
             cancel_after=str(5400)  # Cancel after 1.5 hour
         )
+        self.record_open_order(order_id, symbol, self.client.SIDE_SELL, price, size)
         return order_id
 
+    def record_open_order(self, order_id: Dict[str, str], symbol: str, side: str, price: float, size: float):
+        """
+        Add a freshly placed order to the open order index so later checks in this invocation see it
+        :param order_id: `create_limit_order` response
+        :param symbol:
+        :param side:
+        :param price:
+        :param size:
+        :return:
+        """
+        if not order_id or not order_id.get("orderId"):
+            return
+        with self.open_orders_lock:  # Orders may be placed from several threads
+            self.open_orders.add({
+                "id": order_id["orderId"], "symbol": symbol, "side": side,
+                "price": str(price), "size": str(size), "isActive": True
+            })
+            if side == self.client.SIDE_SELL:
+                self.orders_open_sell = self.get_open_sell_orders()
+
+    def plan_buy_orders(self, candidates: Iterable[Tuple[str, object]]) -> List[OrderRequest]:
+        """
+        Size buy orders for a batch of candidates against a single view of the budget. Each planned order
+        reserves a trade slot and its position size before the next candidate is checked with `can_trade`,
+        so the batch as a whole never exceeds trades_max or the available balance.
+        The reservations are replaced by real values on the next `refresh_balances`.
+        :param candidates: (base currency, meta) pairs, e.g. ("BTC", signal)
+        :return:
+        """
+        position_max_from_db = None
+        planned = list()
+        for currency, meta in candidates:
+            if not self.can_trade():
+                print(
+                    f"Account cannot trade: NumOpenTrades: {self.trades_open} BalanceAvail: {self.balance_avail} Position Max: {self.position_max} Currency: {currency}")
+                continue
+            if position_max_from_db is None:
+                position_max_from_db = self.dynamo.account_get_max_position_size(self.tablename, self.name)
+            position_size = self.get_position_size_max(position_max_from_db)
+            price, size = self.compute_price_and_size(symbol=currency, position_size=position_size)
+            print(f"Avail: {self.balance_avail} PositionSize: {position_size} Price: {price} Size: {size}")
+            planned.append(OrderRequest(f"{currency}-USDT", self.client.SIDE_BUY, price, size, meta))
+            self.trades_open += 1
+            self.balance_avail -= position_size
+        return planned
+
+    def place_limit_orders(self, orders: List[OrderRequest], max_workers: int = 8) -> Tuple[List, List]:
+        """
+        Place limit orders concurrently. The client's rate limiter paces the trade endpoint.
+        KuCoin's multi-order endpoint only takes orders for a single symbol, so orders are placed individually.
+        :param orders:
+        :param max_workers:
+        :return:
+            placed [(OrderRequest, create_limit_order response)], failed [(OrderRequest, exception)]
+        """
+        def place(order: OrderRequest):
+            create = self.create_limit_order_buy if order.side == self.client.SIDE_BUY else self.create_limit_order_sell
+            return create(symbol=order.symbol, price=order.price, size=order.size)
+
+        placed, failed = list(), list()
+        if not orders:
+            return placed, failed
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(orders))) as pool:
+            futures = [(order, pool.submit(place, order)) for order in orders]
+            for order, future in futures:
+                try:
+                    response = future.result()
+                except Exception as e:
+                    failed.append((order, e))
+                    continue
+                if response and response.get("orderId"):
+                    placed.append((order, response))
+        return placed, failed
+
+    def get_orders_details(self, order_ids: List[str], max_workers: int = 8) -> List[Dict]:
+        """
+        `get_order` for several orders concurrently, in the order given
+        :param order_ids:
+        :param max_workers:
+        :return:
+        """
+        if not order_ids:
+            return list()
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(order_ids))) as pool:
+            return list(pool.map(self.get_order, order_ids))
+
     def get_open_position_by_symbol(self, symbol: str) -> Union[KuCoinAcct, None]:
         for acct in self.trade_accounts:
             if acct.currency == symbol:
                 return acct
         return
 
-    def get_position_size_max(self):
-        position_max_from_db = self.dynamo.account_get_max_position_size(
-            self.tablename, self.name
-        )
+    def get_position_size_max(self, position_max_from_db: float = None):
+        if position_max_from_db is None:
+            position_max_from_db = self.dynamo.account_get_max_position_size(
+                self.tablename, self.name
+            )
         return int(min(position_max_from_db, self.balance_avail)) - 1
 
     def get_order(self, order_id: str) -> Dict:
         return self.client.get_order(order_id)
 
-    def has_active_buy_order_for_symbol(self, symbol: str) -> bool:
+    def has_active_order_for_symbol(self, symbol: str, side: str = None) -> bool:
+        """
+        Answered from the open order index; no REST call
+        :param symbol: trading pair or base ticker (USDT quote assumed)
+        :param side: buy, sell or None for either
+        :return:
+        """
         if "-USDT" not in symbol:
             symbol = f"{symbol}-USDT"
+        return self.open_orders.has(symbol, side)
 
-        items = self.client.get_orders(
-            side=self.client.SIDE_BUY,
-            symbol=symbol,
-            status="active"
-        ).get("items")
-        return bool(items)
+    def has_active_buy_order_for_symbol(self, symbol: str) -> bool:
+        return self.has_active_order_for_symbol(symbol, self.client.SIDE_BUY)
+
+    def has_active_sell_order_for_symbol(self, symbol: str) -> bool:
+        return self.has_active_order_for_symbol(symbol, self.client.SIDE_SELL)
 
@@ -0,0 +1,159 @@
+"""
+client.py
+Rate limited wrapper around `kucoin.client.Client`. Every public method call is
+    1. throttled by a token bucket for its endpoint class (public, private, trade)
+    2. retried with full-jitter exponential backoff on 429, 5xx, 503000 and connection errors
+    3. coalesced with an identical `get_*` call already in flight, so concurrent callers share one request
+Calls, throttling and retries are counted in `metrics()`.
+"""
+import copy
+import random
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, Optional
+
+import requests
+from kucoin.client import Client
+from kucoin.exceptions import KucoinAPIException
+
+from ..ratelimit.ratelimit import TokenBucket
+
+PUBLIC_METHODS = {
+    "get_timestamp", "get_status", "get_symbols", "get_ticker", "get_24hr_stats", "get_markets", "get_currencies",
+    "get_currency", "get_fiat_prices", "get_order_book", "get_full_order_book", "get_trade_histories",
+    "get_kline_data", "get_ws_endpoint",
+}
+RETRYABLE_CODES = {"429000", "500000", "503000"}
+
+
+class RateLimitedClient:
+    # Requests per second and burst per endpoint class. Conservative against KuCoin's published limits
+    DEFAULT_LIMITS = {
+        "public": (10.0, 10),
+        "private": (6.0, 6),
+        "trade": (4.0, 4),
+    }
+
+    def __init__(self, client: Client, limits: Optional[Dict] = None, max_retries: int = 4,
+                 backoff_base: float = 0.25, backoff_cap: float = 8.0):
+        self.client = client
+        self.buckets = {
+            name: TokenBucket(rate, capacity)
+            for name, (rate, capacity) in {**self.DEFAULT_LIMITS, **(limits or {})}.items()
+        }
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.in_flight = dict()
+        self.in_flight_lock = threading.Lock()
+        self.stats = {
+            "calls": 0, "requests": 0, "coalesced": 0, "throttled": 0, "throttle_seconds": 0.0,
+            "retries": 0, "retry_seconds": 0.0, "errors": 0, "by_method": dict()
+        }
+        self.stats_lock = threading.Lock()
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.client, name)
+        if name.startswith("_") or not callable(attr):
+            return attr  # Constants such as SIDE_BUY and the requests session pass straight through
+
+        def call(*args, **kwargs):
+            return self._call(name, attr, args, kwargs)
+
+        return call
+
+    @staticmethod
+    def endpoint_class(name: str) -> str:
+        if name.startswith("create_") or name.startswith("cancel_"):
+            return "trade"
+        if name in PUBLIC_METHODS:
+            return "public"
+        return "private"
+
+    def _count(self, **increments):
+        with self.stats_lock:
+            for key, value in increments.items():
+                self.stats[key] += value
+
+    def _call(self, name: str, method, args, kwargs):
+        with self.stats_lock:
+            self.stats["calls"] += 1
+            self.stats["by_method"][name] = self.stats["by_method"].get(name, 0) + 1
+
+        if not name.startswith("get_"):
+            return self._execute(name, method, args, kwargs)
+
+        # Coalesce identical reads that are already in flight
+        key = (name, repr(args), repr(sorted(kwargs.items())))
+        with self.in_flight_lock:
+            future = self.in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self.in_flight[key] = future
+        if not leader:
+            self._count(coalesced=1)
+            return copy.deepcopy(future.result())
+
+        try:
+            result = self._execute(name, method, args, kwargs)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self.in_flight_lock:
+                self.in_flight.pop(key, None)
+
+    def _execute(self, name: str, method, args, kwargs):
+        endpoint_class = self.endpoint_class(name)
+        bucket = self.buckets[endpoint_class]
+        retry_started = None
+        for attempt in range(self.max_retries + 1):
+            waited = bucket.acquire()
+            if waited:
+                self._count(throttled=1, throttle_seconds=waited)
+            try:
+                self._count(requests=1)
+                result = method(*args, **kwargs)
+            except Exception as e:
+                if attempt == self.max_retries or not self.is_retryable(e, endpoint_class):
+                    self._count(errors=1)
+                    raise
+                retry_started = retry_started or time.monotonic()
+                backoff = min(self.backoff_cap, self.backoff_base * 2 ** attempt)
+                print(f"KuCoin {name} retry {attempt + 1}/{self.max_retries}: {e}")
+                self._count(retries=1)
+                time.sleep(random.uniform(0, backoff))
+            else:
+                if retry_started:
+                    self._count(retry_seconds=time.monotonic() - retry_started)
+                return result
+
+    @staticmethod
+    def is_retryable(e: Exception, endpoint_class: str) -> bool:
+        """
+        429 is always safe to retry; the request was rejected before processing. Server errors and dropped
+        connections are retried for reads only, since an order may have been placed before the failure.
+        :param e:
+        :param endpoint_class:
+        :return:
+        """
+        if isinstance(e, KucoinAPIException):
+            status_code = getattr(e, "status_code", None)
+            code = str(getattr(e, "code", ""))
+            if status_code == 429 or code == "429000":
+                return True
+            if endpoint_class == "trade":
+                return False
+            return code in RETRYABLE_CODES or (status_code is not None and status_code >= 500)
+        if isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+            return endpoint_class != "trade"
+        return False
+
+    def metrics(self) -> Dict:
+        with self.stats_lock:
+            return {**self.stats, "by_method": dict(self.stats["by_method"])}
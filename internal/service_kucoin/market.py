@@ -0,0 +1,302 @@
+"""
+market.py
+Local market data cache: best bid, best ask and last price per symbol.
+    * MarketFeed keeps it warm from KuCoin's public WebSocket ticker channel in a long-running process
+      (scripts/market_feed.py) and periodically writes snapshots to a local file and to DynamoDB
+    * Lambdas load the freshest snapshot (local file, then DynamoDB) and fall back to one bulk REST call
+      to allTickers when both are stale
+Trade pricing is then a dictionary lookup.
+"""
+import asyncio
+import json
+import os
+import time
+import uuid
+import zlib
+from typing import Callable, Dict, Optional
+
+import requests
+import websockets
+
+ALL_TICKERS_URL = "https://api.kucoin.com/api/v1/market/allTickers"
+BULLET_PUBLIC_URL = "https://api.kucoin.com/api/v1/bullet-public"
+TICKER_TOPIC = "/market/ticker:all"
+SNAPSHOT_PATH = "/tmp/kucoin_market.json"
+
+
+def _float(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class Quote:
+    __slots__ = ("symbol", "bid", "ask", "last", "updated_at")
+
+    def __init__(self, symbol: str, bid: Optional[float], ask: Optional[float], last: Optional[float],
+                 updated_at: float):
+        self.symbol = symbol
+        self.bid = bid
+        self.ask = ask
+        self.last = last
+        self.updated_at = updated_at
+
+    def to_list(self):
+        return [getattr(self, name) for name in self.__slots__]
+
+
+class MarketCache:
+    def __init__(self, quotes: Dict[str, Quote] = None, updated_at: float = 0.0):
+        self.quotes = quotes or dict()
+        self.updated_at = updated_at  # Wall clock of the newest update so age carries across processes
+
+    def __len__(self):
+        return len(self.quotes)
+
+    def __contains__(self, symbol: str):
+        return symbol in self.quotes
+
+    def get(self, symbol: str) -> Optional[Quote]:
+        return self.quotes.get(symbol)
+
+    def age(self) -> float:
+        return time.time() - self.updated_at
+
+    def update(self, symbol: str, bid: Optional[float], ask: Optional[float], last: Optional[float],
+               updated_at: float = None) -> None:
+        updated_at = updated_at or time.time()
+        self.quotes[symbol] = Quote(symbol, bid, ask, last, updated_at)
+        self.updated_at = max(self.updated_at, updated_at)
+
+    def limit_price(self, symbol: str, side: str) -> Optional[float]:
+        """
+        Price for a limit order that trades against the current book: the best ask for a buy, the best bid
+        for a sell. Falls back to the last trade price when that side of the book is empty.
+        :param symbol: trading pair, e.g. BTC-USDT
+        :param side: buy or sell
+        :return:
+            None when the symbol is unknown
+        """
+        quote = self.quotes.get(symbol)
+        if quote is None:
+            return None
+        price = quote.ask if side == "buy" else quote.bid
+        return price or quote.last
+
+    def apply_ticker_message(self, message: Dict) -> bool:
+        """
+        Update from a `/market/ticker:all` WebSocket message
+        :param message:
+        :return:
+            True when a quote was updated
+        """
+        if message.get("type") != "message" or not message.get("topic", "").startswith("/market/ticker"):
+            return False
+        data = message.get("data") or {}
+        symbol = message.get("subject") or data.get("symbol")
+        if not symbol:
+            return False
+        updated_at = data.get("time")
+        self.update(
+            symbol, _float(data.get("bestBid")), _float(data.get("bestAsk")), _float(data.get("price")),
+            updated_at / 1000 if updated_at else None
+        )
+        return True
+
+    def apply_all_tickers(self, response: Dict) -> None:
+        """
+        Update from the REST allTickers response
+        :param response: parsed JSON body
+        :return:
+        """
+        data = response["data"]
+        updated_at = data.get("time")
+        updated_at = updated_at / 1000 if updated_at else time.time()
+        for ticker in data["ticker"]:
+            self.update(
+                ticker["symbol"], _float(ticker.get("buy")), _float(ticker.get("sell")), _float(ticker.get("last")),
+                updated_at
+            )
+
+    def refresh_rest(self, url: str = ALL_TICKERS_URL, timeout: float = 10) -> None:
+        response = requests.get(url, timeout=timeout)
+        response.raise_for_status()
+        self.apply_all_tickers(response.json())
+
+    def to_bytes(self) -> bytes:
+        return zlib.compress(json.dumps({
+            "updated_at": self.updated_at,
+            "fields": list(Quote.__slots__),
+            "rows": [quote.to_list() for quote in self.quotes.values()]
+        }).encode())
+
+    @classmethod
+    def from_bytes(cls, payload: bytes) -> Optional["MarketCache"]:
+        try:
+            data = json.loads(zlib.decompress(payload))
+        except (zlib.error, ValueError):
+            return None
+        if data.get("fields") != list(Quote.__slots__):
+            return None
+        return cls({row[0]: Quote(*row) for row in data["rows"]}, data["updated_at"])
+
+    def dump(self, path: str = SNAPSHOT_PATH) -> None:
+        # Write then rename so readers never see a partial file
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(self.to_bytes())
+        os.replace(tmp, path)
+
+    @classmethod
+    def read(cls, path: str = SNAPSHOT_PATH) -> Optional["MarketCache"]:
+        try:
+            with open(path, "rb") as f:
+                return cls.from_bytes(f.read())
+        except OSError:
+            return None
+
+    @classmethod
+    def load(cls, path: str = SNAPSHOT_PATH, dynamo=None, tablename: str = None, url: str = ALL_TICKERS_URL,
+             max_age: float = 60) -> "MarketCache":
+        """
+        Freshest available cache: the local file, then the DynamoDB snapshot, then one bulk REST call.
+        A snapshot older than `max_age` seconds is skipped. The REST result is written back to `path`.
+        :param path:
+        :param dynamo: ServiceDynamo, optional
+        :param tablename: table holding the snapshot
+        :param url: allTickers endpoint. None skips the REST call
+        :param max_age:
+        :return:
+            None when there is no fresh snapshot and `url` is None
+        """
+        cache = cls.read(path)
+        if cache is not None and cache.age() <= max_age:
+            return cache
+
+        if dynamo is not None and tablename:
+            payload = dynamo.account_get_market_snapshot(tablename)
+            cache = cls.from_bytes(payload) if payload else None
+            if cache is not None and cache.age() <= max_age:
+                return cache
+
+        if url is None:
+            return None
+        cache = cls()
+        cache.refresh_rest(url)
+        try:
+            cache.dump(path)
+        except OSError as e:
+            print(f"Market snapshot not persisted: {e}")
+        return cache
+
+
+def negotiate_public_endpoint(url: str = BULLET_PUBLIC_URL, timeout: float = 10) -> Dict:
+    """
+    Public WebSocket endpoint and ping interval from KuCoin's bullet-public token call
+    :param url:
+    :param timeout:
+    :return:
+        {"url": str, "ping_interval": seconds}
+    """
+    response = requests.post(url, timeout=timeout)
+    response.raise_for_status()
+    data = response.json()["data"]
+    server = data["instanceServers"][0]
+    return {
+        "url": f"{server['endpoint']}?token={data['token']}&connectId={uuid.uuid4().hex}",
+        "ping_interval": server.get("pingInterval", 18000) / 1000
+    }
+
+
+class MarketFeed:
+    def __init__(self, cache: MarketCache, url: str = None, ping_interval: float = 18,
+                 rest_url: Optional[str] = ALL_TICKERS_URL, on_snapshot: Callable[[MarketCache], None] = None,
+                 snapshot_interval: float = 5, reconnect_delay: float = 1, reconnect_delay_max: float = 30):
+        """
+        :param cache: updated in place
+        :param url: WebSocket URL. Negotiated through bullet-public for every connection when not given
+        :param ping_interval: seconds between keepalive pings
+        :param rest_url: allTickers endpoint used to refill the cache after a disconnect. None disables it
+        :param on_snapshot: called with the cache every `snapshot_interval` seconds while messages arrive
+        :param snapshot_interval:
+        :param reconnect_delay:
+        :param reconnect_delay_max:
+        """
+        self.cache = cache
+        self.url = url
+        self.ping_interval = ping_interval
+        self.rest_url = rest_url
+        self.on_snapshot = on_snapshot
+        self.snapshot_interval = snapshot_interval
+        self.reconnect_delay = reconnect_delay
+        self.reconnect_delay_max = reconnect_delay_max
+        self.stats = {"connections": 0, "messages": 0, "updates": 0, "snapshots": 0, "rest_refreshes": 0}
+        self.last_snapshot = time.monotonic()
+
+    async def run(self, stop: asyncio.Event = None) -> None:
+        """
+        Stream tickers into the cache until `stop` is set, reconnecting with backoff on errors
+        :param stop:
+        :return:
+        """
+        stop = stop or asyncio.Event()
+        delay = self.reconnect_delay
+        while not stop.is_set():
+            try:
+                await self.session(stop)
+                delay = self.reconnect_delay
+            except (OSError, asyncio.TimeoutError, requests.RequestException,
+                    websockets.exceptions.WebSocketException) as e:
+                print(f"Market feed disconnected: {e}")
+            if stop.is_set():
+                break
+            await self.refresh_rest()
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            delay = min(self.reconnect_delay_max, delay * 2)
+        self.snapshot()
+
+    async def session(self, stop: asyncio.Event) -> None:
+        url, ping_interval = self.url, self.ping_interval
+        if url is None:
+            endpoint = await asyncio.get_running_loop().run_in_executor(None, negotiate_public_endpoint)
+            url, ping_interval = endpoint["url"], endpoint["ping_interval"]
+
+        async with websockets.connect(url, ping_interval=None) as ws:
+            self.stats["connections"] += 1
+            await ws.send(json.dumps({
+                "id": uuid.uuid4().hex, "type": "subscribe", "topic": TICKER_TOPIC,
+                "privateChannel": False, "response": True
+            }))
+            last_ping = time.monotonic()
+            while not stop.is_set():
+                if time.monotonic() - last_ping >= ping_interval:
+                    await ws.send(json.dumps({"id": uuid.uuid4().hex, "type": "ping"}))
+                    last_ping = time.monotonic()
+                try:
+                    raw = await asyncio.wait_for(ws.recv(), timeout=min(1.0, ping_interval))
+                except asyncio.TimeoutError:
+                    continue
+                self.stats["messages"] += 1
+                if self.cache.apply_ticker_message(json.loads(raw)):
+                    self.stats["updates"] += 1
+                if time.monotonic() - self.last_snapshot >= self.snapshot_interval:
+                    self.snapshot()
+
+    async def refresh_rest(self) -> None:
+        if not self.rest_url:
+            return
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self.cache.refresh_rest, self.rest_url)
+            self.stats["rest_refreshes"] += 1
+        except requests.RequestException as e:
+            print(f"Market REST refresh failed: {e}")
+
+    def snapshot(self) -> None:
+        self.last_snapshot = time.monotonic()
+        if self.on_snapshot is not None and len(self.cache):
+            self.on_snapshot(self.cache)
+            self.stats["snapshots"] += 1
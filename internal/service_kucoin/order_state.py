@@ -0,0 +1,78 @@
+"""
+order_state.py
+Order state machine shared by the trade services, the monitor and the order repository.
+KuCoin order details are reduced to one of four states:
+
+    active -> partially_filled -> filled
+       |             |
+       +-------------+---------> cancelled
+
+filled and cancelled are terminal. A cancelled order may carry a partial fill in its dealSize.
+"""
+import enum
+import time
+from typing import Dict, Optional
+
+
+class OrderState(enum.Enum):
+    ACTIVE = "active"
+    PARTIALLY_FILLED = "partially_filled"
+    FILLED = "filled"
+    CANCELLED = "cancelled"
+
+
+TERMINAL = {OrderState.FILLED, OrderState.CANCELLED}
+TRANSITIONS = {
+    OrderState.ACTIVE: {OrderState.PARTIALLY_FILLED, OrderState.FILLED, OrderState.CANCELLED},
+    OrderState.PARTIALLY_FILLED: {OrderState.FILLED, OrderState.CANCELLED},
+    OrderState.FILLED: set(),
+    OrderState.CANCELLED: set(),
+}
+
+
+def classify(order: Dict) -> OrderState:
+    """
+    State of a KuCoin order from `get_order` or an active `get_orders` item
+    :param order:
+    :return:
+    """
+    size = float(order.get("size") or 0)
+    deal_size = float(order.get("dealSize") or 0)
+    if order.get("isActive"):
+        return OrderState.PARTIALLY_FILLED if deal_size > 0 else OrderState.ACTIVE
+    if order.get("cancelExist") and (size == 0 or deal_size < size):
+        return OrderState.CANCELLED
+    return OrderState.FILLED
+
+
+def next_state(current: str, order: Dict) -> Optional[OrderState]:
+    """
+    New state when `order` moves the state machine forward, else None.
+    Stale reads that would move an order backwards are ignored.
+    :param current: last recorded state value
+    :param order:
+    :return:
+    """
+    new = classify(order)
+    return new if new in TRANSITIONS[OrderState(current)] else None
+
+
+def next_delay(order: Dict, attempts: int, base: int = 30, cap: int = 900, now: float = None) -> int:
+    """
+    Seconds until an unresolved order is checked again. Backs off exponentially with the number of checks,
+    but never past the time KuCoin will cancel a good-till-time order, so the cancellation is picked up promptly.
+    :param order:
+    :param attempts: checks so far
+    :param base:
+    :param cap: SQS maximum delay
+    :param now: epoch seconds, for tests
+    :return:
+    """
+    delay = min(cap, base * 2 ** max(0, attempts - 1))
+    created_at = order.get("createdAt")
+    cancel_after = int(order.get("cancelAfter") or 0)
+    if created_at and cancel_after > 0:
+        now = time.time() if now is None else now
+        until_cancel = created_at / 1000 + cancel_after - now
+        delay = min(delay, max(base, int(until_cancel) + 5))
+    return int(delay)
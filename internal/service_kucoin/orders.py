@@ -0,0 +1,83 @@
+"""
+orders.py
+In-memory index of active KuCoin orders, keyed by symbol and side. Built from a single `get_orders` listing
+per invocation and kept current as orders are created, so per-ticker checks need no further REST calls.
+"""
+from typing import Dict, Iterable, List, Optional
+
+from kucoin.client import Client
+
+
+def fetch_active_orders(client: Client, page_size: int = 500) -> List[Dict]:
+    """
+    Every active order on the account, both sides. Follows the pagination of `get_orders`
+    :param client:
+    :param page_size:
+    :return:
+        Raw order dicts
+    """
+    orders = list()
+    page = 1
+    while True:
+        response = client.get_orders(status="active", page=page, limit=page_size)
+        orders.extend(response.get("items") or [])
+        if page >= int(response.get("totalPage") or 1):
+            return orders
+        page += 1
+
+
+class OpenOrderIndex:
+    def __init__(self, orders: Iterable[Dict] = ()):
+        self.by_key = dict()  # {(symbol, side): {order_id: order}}
+        self.by_id = dict()  # {order_id: order}
+        for order in orders:
+            self.add(order)
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def __contains__(self, order_id: str):
+        return order_id in self.by_id
+
+    @classmethod
+    def load(cls, client: Client) -> "OpenOrderIndex":
+        return cls(fetch_active_orders(client))
+
+    def add(self, order: Dict) -> None:
+        """
+        Index an order. Accepts a `get_orders` item or a locally built dict with id, symbol and side
+        :param order:
+        :return:
+        """
+        order_id = order.get("id") or order.get("orderId")
+        self.remove(order_id)
+        self.by_id[order_id] = order
+        self.by_key.setdefault((order.get("symbol"), order.get("side")), dict())[order_id] = order
+
+    def remove(self, order_id: str) -> Optional[Dict]:
+        order = self.by_id.pop(order_id, None)
+        if order is not None:
+            key = (order.get("symbol"), order.get("side"))
+            self.by_key[key].pop(order_id, None)
+            if not self.by_key[key]:
+                del self.by_key[key]
+        return order
+
+    def get(self, order_id: str) -> Optional[Dict]:
+        return self.by_id.get(order_id)
+
+    def for_symbol(self, symbol: str, side: str = None) -> List[Dict]:
+        """
+        Active orders for a trading pair, optionally limited to one side
+        :param symbol: e.g. BTC-USDT
+        :param side: buy, sell or None for both
+        :return:
+        """
+        sides = [side] if side else ["buy", "sell"]
+        return [order for s in sides for order in self.by_key.get((symbol, s), dict()).values()]
+
+    def has(self, symbol: str, side: str = None) -> bool:
+        return bool(self.for_symbol(symbol, side))
+
+    def symbols(self, side: str) -> List[str]:
+        return sorted(symbol for symbol, s in self.by_key if s == side)
@@ -0,0 +1,46 @@
+"""
+prices.py
+Fiat (USD) price snapshot for every KuCoin currency. One `get_fiat_prices()` call returns all currencies,
+so the snapshot replaces the per-currency calls and is reused until its TTL expires.
+"""
+import time
+from typing import Dict
+
+from kucoin.client import Client
+
+
+class PriceService:
+    def __init__(self, client: Client, ttl_seconds: float = 30):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.prices = dict()
+        self.fetched_at = 0.0
+        self.calls = 0
+
+    def snapshot(self, force: bool = False) -> Dict[str, float]:
+        """
+        Prices for all currencies. Fetched in a single call when stale or forced
+        :param force: ignore the TTL
+        :return:
+            {currency: price}
+        """
+        if force or not self.prices or time.monotonic() - self.fetched_at > self.ttl_seconds:
+            response = self.client.get_fiat_prices()
+            self.calls += 1
+            self.prices = {currency: float(price) for currency, price in response.items() if price is not None}
+            self.fetched_at = time.monotonic()
+        return self.prices
+
+    def get(self, currency: str) -> float:
+        """
+        Price of a single currency from the snapshot. Currencies missing from the bulk response
+        are fetched individually and added to the snapshot.
+        :param currency: base currency, e.g. BTC
+        :return:
+        """
+        prices = self.snapshot()
+        if currency not in prices:
+            response = self.client.get_fiat_prices(symbol=currency)
+            self.calls += 1
+            prices[currency] = float(response[currency])
+        return prices[currency]
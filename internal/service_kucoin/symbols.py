@@ -0,0 +1,138 @@
+"""
+symbols.py
+Symbol metadata from KuCoin `get_symbols()`, indexed by symbol with the increment precisions precomputed.
+The table is loaded once per container and persisted to /tmp so a cold start within the TTL skips the call.
+"""
+import json
+import os
+import time
+from decimal import Decimal, InvalidOperation
+from typing import Dict, List, Optional
+
+from kucoin.client import Client
+
+DEFAULT_DECIMALS = 4  # small enough for most all trading pairs (just in case)
+
+
+def count_decimals(increment: Optional[str]) -> int:
+    """
+    Number of decimal places in an increment string. "0.0001" -> 4, "0.10" -> 1, "1" -> 0
+    :param increment:
+    :return:
+    """
+    try:
+        exponent = Decimal(increment).normalize().as_tuple().exponent
+    except (InvalidOperation, TypeError, ValueError):
+        return DEFAULT_DECIMALS
+    return max(0, -exponent)
+
+
+class SymbolInfo:
+    __slots__ = (
+        "symbol", "base_currency", "quote_currency", "enable_trading",
+        "price_decimals", "base_decimals", "quote_decimals",
+        "base_min_size", "quote_min_size", "min_funds"
+    )
+
+    def __init__(self, symbol: str, base_currency: str, quote_currency: str, enable_trading: bool,
+                 price_decimals: int, base_decimals: int, quote_decimals: int,
+                 base_min_size: float, quote_min_size: float, min_funds: float):
+        self.symbol = symbol
+        self.base_currency = base_currency
+        self.quote_currency = quote_currency
+        self.enable_trading = enable_trading
+        self.price_decimals = price_decimals
+        self.base_decimals = base_decimals
+        self.quote_decimals = quote_decimals
+        self.base_min_size = base_min_size
+        self.quote_min_size = quote_min_size
+        self.min_funds = min_funds
+
+    @classmethod
+    def from_kucoin(cls, data: Dict) -> "SymbolInfo":
+        return cls(
+            symbol=data["symbol"],
+            base_currency=data.get("baseCurrency"),
+            quote_currency=data.get("quoteCurrency"),
+            enable_trading=bool(data.get("enableTrading", True)),
+            price_decimals=count_decimals(data.get("priceIncrement")),
+            base_decimals=count_decimals(data.get("baseIncrement")),
+            quote_decimals=count_decimals(data.get("quoteIncrement")),
+            base_min_size=float(data.get("baseMinSize") or 0),
+            quote_min_size=float(data.get("quoteMinSize") or 0),
+            min_funds=float(data.get("minFunds") or 0)
+        )
+
+    def to_list(self) -> List:
+        return [getattr(self, name) for name in self.__slots__]
+
+
+class SymbolTable:
+    def __init__(self, symbols: Dict[str, SymbolInfo], loaded_at: float, ttl_seconds: float = 3600):
+        self.symbols = symbols
+        self.loaded_at = loaded_at  # Wall clock so the age carries across containers through /tmp
+        self.ttl_seconds = ttl_seconds
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __contains__(self, symbol: str):
+        return symbol in self.symbols
+
+    def get(self, symbol: str) -> Optional[SymbolInfo]:
+        return self.symbols.get(symbol)
+
+    def expired(self) -> bool:
+        return time.time() - self.loaded_at > self.ttl_seconds
+
+    def price_decimals(self, symbol: str) -> int:
+        info = self.symbols.get(symbol)
+        return info.price_decimals if info else DEFAULT_DECIMALS
+
+    def base_decimals(self, symbol: str) -> int:
+        info = self.symbols.get(symbol)
+        return info.base_decimals if info else DEFAULT_DECIMALS
+
+    @classmethod
+    def from_kucoin(cls, symbols: List[Dict], ttl_seconds: float = 3600) -> "SymbolTable":
+        return cls({s["symbol"]: SymbolInfo.from_kucoin(s) for s in symbols}, time.time(), ttl_seconds)
+
+    def dump(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump({
+                "loaded_at": self.loaded_at,
+                "fields": list(SymbolInfo.__slots__),
+                "rows": [info.to_list() for info in self.symbols.values()]
+            }, f)
+
+    @classmethod
+    def read(cls, path: str, ttl_seconds: float = 3600) -> Optional["SymbolTable"]:
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("fields") != list(SymbolInfo.__slots__):
+            return None
+        symbols = {row[0]: SymbolInfo(*row) for row in data["rows"]}
+        return cls(symbols, data["loaded_at"], ttl_seconds)
+
+    @classmethod
+    def load(cls, client: Client, path: str = "/tmp/kucoin_symbols.json", ttl_seconds: float = 3600) -> "SymbolTable":
+        """
+        Table from `path` when it is younger than the TTL, else from KuCoin (and written back to `path`)
+        :param client:
+        :param path:
+        :param ttl_seconds:
+        :return:
+        """
+        table = cls.read(path, ttl_seconds) if os.path.exists(path) else None
+        if table is not None and not table.expired():
+            return table
+
+        table = cls.from_kucoin(client.get_symbols(), ttl_seconds)
+        try:
+            table.dump(path)
+        except OSError as e:
+            print(f"Symbol table not persisted: {e}")
+        return table
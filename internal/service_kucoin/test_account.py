@@ -1,14 +1,89 @@
-import os
+import time
+
 from .account import Account
+from .prices import PriceService
+from .symbols import SymbolTable
+
+ACCOUNTS = [
+    {"id": "1", "currency": "USDT", "type": "trade", "balance": "600", "available": "500", "holds": "100"},
+    {"id": "2", "currency": "BTC", "type": "trade", "balance": "0.5", "available": "0.5", "holds": "0"},
+    {"id": "3", "currency": "ETH", "type": "main", "balance": "2", "available": "2", "holds": "0"},
+]
+ORDERS = [{"id": "a", "symbol": "BTC-USDT", "side": "sell", "isActive": True}]
+PRICES = {"USDT": "1", "BTC": "1000", "ETH": "100"}
+
+
+class FakeClient:
+    SIDE_BUY = "buy"
+    SIDE_SELL = "sell"
+
+    def __init__(self, accounts, orders):
+        self.accounts = accounts
+        self.orders = orders
+
+    def get_accounts(self):
+        return [dict(account) for account in self.accounts]
+
+    def get_orders(self, status=None, page=1, limit=None):
+        return {"items": [dict(order) for order in self.orders], "totalPage": 1}
+
+    def get_fiat_prices(self, symbol=None):
+        return PRICES if symbol is None else {symbol: PRICES[symbol]}
+
+
+class FakeDynamo:
+    def __init__(self):
+        self.updates = list()
+
+    def account_update(self, tablename, account_name, **kwargs):
+        self.updates.append(kwargs)
+
+    def account_get_market_snapshot(self, tablename):
+        return None
+
+
+def create_account(client: FakeClient) -> Account:
+    account = Account(
+        dynamo=FakeDynamo(), tablename="account", key="key", secret="secret", api_pass_phrase="pass", max_trades=4
+    )
+    account.client = client
+    account.prices = PriceService(client)
+    account.symbols = SymbolTable(dict(), time.time())  # Fresh, so no symbol listing is needed
+    return account
 
 
 class TestAccount:
-    config = {
-        "key": os.getenv("KUCOIN_KEY"),
-        "secret": os.getenv("KUCOIN_SECRET"),
-        "api_pass_phrase": os.getenv("KUCOIN_API_PASSPHRASE"),
-        "max_trades": 10
-    }
-    account = Account(**config)
-    print(account)
+    def test_init_account(self):
+        account = create_account(FakeClient(ACCOUNTS, ORDERS))
+        account.init_account()
+        assert [acct.currency for acct in account.trade_accounts] == ["USDT", "BTC"]
+        assert account.trades_open == 1
+        assert account.balance == 1100
+        assert account.balance_avail == 500
+        assert account.position_max == 275
+        assert account.has_active_sell_order_for_symbol("BTC")
+        assert not account.has_active_buy_order_for_symbol("BTC")
+        assert account.dynamo.updates[-1]["trades_open"] == 1
+
+    def test_refresh_per_invocation(self):
+        client = FakeClient(ACCOUNTS, ORDERS)
+        account = create_account(client)
+        account.refresh()  # Cold container
+        symbols = account.symbols
+        assert account.has_active_sell_order_for_symbol("BTC")
 
+        # Between invocations the BTC sell filled, ETH was bought and a buy order was placed elsewhere
+        client.accounts = [
+            {"id": "1", "currency": "USDT", "type": "trade", "balance": "900", "available": "850", "holds": "50"},
+            {"id": "4", "currency": "ETH", "type": "trade", "balance": "1", "available": "1", "holds": "0"},
+        ]
+        client.orders = [{"id": "b", "symbol": "SOL-USDT", "side": "buy", "isActive": True}]
+        account.refresh()  # Warm container
+        assert [acct.currency for acct in account.trade_accounts] == ["USDT", "ETH"]
+        assert account.balance == 1000
+        assert account.balance_avail == 850
+        assert account.position_max == 250
+        assert not account.has_active_sell_order_for_symbol("BTC")
+        assert account.has_active_buy_order_for_symbol("SOL")
+        assert account.symbols is symbols
+        assert len(account.dynamo.updates) == 2
@@ -0,0 +1,84 @@
+import threading
+import time
+
+from kucoin.exceptions import KucoinAPIException
+
+from .client import RateLimitedClient, TokenBucket
+
+
+class APIError(KucoinAPIException):
+    def __init__(self, status_code, code):
+        self.status_code = status_code
+        self.code = code
+        self.message = "error"
+
+
+class FakeClient:
+    SIDE_BUY = "buy"
+
+    def __init__(self, failures=None, delay=0.0):
+        self.failures = list(failures or [])
+        self.delay = delay
+        self.calls = 0
+
+    def get_accounts(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.failures:
+            raise self.failures.pop(0)
+        return [{"currency": "USDT"}]
+
+    def create_limit_order(self, **kwargs):
+        self.calls += 1
+        if self.failures:
+            raise self.failures.pop(0)
+        return {"orderId": "1"}
+
+
+def fast(client):
+    return RateLimitedClient(client, backoff_base=0.001, backoff_cap=0.001)
+
+
+class TestRateLimitedClient:
+    def test_constants_pass_through(self):
+        assert fast(FakeClient()).SIDE_BUY == "buy"
+
+    def test_retries_503000(self):
+        client = FakeClient(failures=[APIError(200, "503000"), APIError(502, "")])
+        wrapped = fast(client)
+        assert wrapped.get_accounts() == [{"currency": "USDT"}]
+        assert client.calls == 3
+        assert wrapped.metrics()["retries"] == 2
+
+    def test_orders_not_retried_on_server_error(self):
+        client = FakeClient(failures=[APIError(500, "500000")])
+        wrapped = fast(client)
+        try:
+            wrapped.create_limit_order(symbol="BTC-USDT")
+            assert False, "expected KucoinAPIException"
+        except KucoinAPIException:
+            pass
+        assert client.calls == 1
+
+    def test_orders_retried_on_429(self):
+        client = FakeClient(failures=[APIError(429, "429000")])
+        assert fast(client).create_limit_order(symbol="BTC-USDT") == {"orderId": "1"}
+        assert client.calls == 2
+
+    def test_identical_gets_coalesce(self):
+        client = FakeClient(delay=0.2)
+        wrapped = fast(client)
+        results = list()
+        threads = [threading.Thread(target=lambda: results.append(wrapped.get_accounts())) for _ in range(5)]
+        [t.start() for t in threads]
+        [t.join() for t in threads]
+        assert client.calls == 1
+        assert len(results) == 5
+        assert wrapped.metrics()["coalesced"] == 4
+
+
+class TestTokenBucket:
+    def test_waits_when_empty(self):
+        bucket = TokenBucket(rate=50, capacity=1)
+        assert bucket.acquire() == 0.0
+        assert bucket.acquire() > 0
@@ -0,0 +1,78 @@
+import asyncio
+import json
+import os
+import tempfile
+
+import websockets
+
+from .market import MarketCache, MarketFeed
+
+TICKS = [
+    {"symbol": "BTC-USDT", "bestBid": "100.0", "bestAsk": "100.5", "price": "100.2"},
+    {"symbol": "ETH-USDT", "bestBid": "10.0", "bestAsk": "10.1", "price": "10.05"},
+    {"symbol": "BTC-USDT", "bestBid": "101.0", "bestAsk": "101.5", "price": "101.2"},
+]
+
+
+async def fake_kucoin(ws, path=None):
+    """Minimal stand-in for the KuCoin public endpoint: welcome, subscribe ack, ticker messages"""
+    await ws.send(json.dumps({"id": "welcome", "type": "welcome"}))
+    subscribe = json.loads(await ws.recv())
+    assert subscribe["topic"] == "/market/ticker:all"
+    await ws.send(json.dumps({"id": subscribe["id"], "type": "ack"}))
+    for tick in TICKS:
+        await ws.send(json.dumps({
+            "type": "message", "topic": "/market/ticker:all", "subject": tick["symbol"], "data": tick
+        }))
+    async for message in ws:
+        if json.loads(message)["type"] == "ping":
+            await ws.send(json.dumps({"type": "pong"}))
+
+
+async def stream(cache: MarketCache, snapshots: list):
+    async with websockets.serve(fake_kucoin, "127.0.0.1", 0) as server:
+        port = list(server.sockets)[0].getsockname()[1]
+        feed = MarketFeed(
+            cache, url=f"ws://127.0.0.1:{port}", rest_url=None, on_snapshot=snapshots.append, snapshot_interval=0
+        )
+        stop = asyncio.Event()
+        task = asyncio.create_task(feed.run(stop))
+        for _ in range(200):
+            if feed.stats["updates"] == len(TICKS):
+                break
+            await asyncio.sleep(0.01)
+        stop.set()
+        await asyncio.wait_for(task, timeout=5)
+        return feed
+
+
+class TestMarketFeed:
+    def test_streams_quotes_from_fake_server(self):
+        cache = MarketCache()
+        snapshots = list()
+        feed = asyncio.run(stream(cache, snapshots))
+        assert feed.stats["updates"] == 3
+        assert len(cache) == 2
+        assert cache.limit_price("BTC-USDT", "buy") == 101.5
+        assert cache.limit_price("BTC-USDT", "sell") == 101.0
+        assert snapshots
+
+
+class TestMarketCache:
+    def test_all_tickers_and_fallback_to_last(self):
+        cache = MarketCache()
+        cache.apply_all_tickers({"data": {"time": None, "ticker": [
+            {"symbol": "XRP-USDT", "buy": None, "sell": "0.51", "last": "0.5"}
+        ]}})
+        assert cache.limit_price("XRP-USDT", "buy") == 0.51
+        assert cache.limit_price("XRP-USDT", "sell") == 0.5
+        assert cache.limit_price("DOGE-USDT", "buy") is None
+
+    def test_snapshot_round_trip(self):
+        cache = MarketCache()
+        cache.update("BTC-USDT", 1.0, 2.0, 1.5)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "market.json")
+            cache.dump(path)
+            loaded = MarketCache.load(path=path, url=None)
+        assert loaded.get("BTC-USDT").to_list() == cache.get("BTC-USDT").to_list()
@@ -0,0 +1,23 @@
+from .order_state import OrderState, classify, next_delay, next_state
+
+
+class TestOrderState:
+    def test_classify(self):
+        assert classify({"isActive": True, "size": "2", "dealSize": "0"}) == OrderState.ACTIVE
+        assert classify({"isActive": True, "size": "2", "dealSize": "1"}) == OrderState.PARTIALLY_FILLED
+        assert classify({"isActive": False, "size": "2", "dealSize": "2", "cancelExist": False}) == OrderState.FILLED
+        assert classify({"isActive": False, "size": "2", "dealSize": "1", "cancelExist": True}) == OrderState.CANCELLED
+
+    def test_transitions_only_move_forward(self):
+        partial = {"isActive": True, "size": "2", "dealSize": "1"}
+        assert next_state("active", partial) == OrderState.PARTIALLY_FILLED
+        assert next_state("partially_filled", partial) is None
+        assert next_state("partially_filled", {"isActive": True, "size": "2", "dealSize": "0"}) is None
+        assert next_state("filled", {"isActive": False, "size": "2", "dealSize": "0", "cancelExist": True}) is None
+
+    def test_delay_backs_off_until_cancel_time(self):
+        assert next_delay({}, 1) == 30
+        assert next_delay({}, 3) == 120
+        assert next_delay({}, 10) == 900
+        order = {"createdAt": 1_000_000, "cancelAfter": 3600}
+        assert next_delay(order, 10, now=1_000 + 3600 - 100) == 105
@@ -0,0 +1,42 @@
+from .orders import OpenOrderIndex, fetch_active_orders
+
+ORDERS = [
+    {"id": "1", "symbol": "BTC-USDT", "side": "buy", "isActive": True},
+    {"id": "2", "symbol": "ETH-USDT", "side": "sell", "isActive": True},
+    {"id": "3", "symbol": "ETH-USDT", "side": "buy", "isActive": True},
+]
+
+
+class FakeClient:
+    def __init__(self, orders, page_size):
+        self.orders = orders
+        self.page_size = page_size
+        self.calls = 0
+
+    def get_orders(self, status=None, page=1, limit=None):
+        self.calls += 1
+        start = (page - 1) * self.page_size
+        total_page = -(-len(self.orders) // self.page_size)
+        return {"items": self.orders[start:start + self.page_size], "totalPage": total_page}
+
+
+class TestOpenOrderIndex:
+    def test_lookup_by_symbol_and_side(self):
+        index = OpenOrderIndex(ORDERS)
+        assert index.has("BTC-USDT", "buy")
+        assert not index.has("BTC-USDT", "sell")
+        assert len(index.for_symbol("ETH-USDT")) == 2
+        assert index.symbols("sell") == ["ETH-USDT"]
+
+    def test_add_and_remove(self):
+        index = OpenOrderIndex(ORDERS)
+        index.add({"orderId": "4", "symbol": "BTC-USDT", "side": "sell"})
+        assert index.has("BTC-USDT", "sell")
+        assert index.remove("2")["symbol"] == "ETH-USDT"
+        assert index.symbols("sell") == ["BTC-USDT"]
+        assert len(index) == 3
+
+    def test_fetch_follows_pages(self):
+        client = FakeClient(ORDERS, page_size=2)
+        assert len(fetch_active_orders(client, page_size=2)) == 3
+        assert client.calls == 2
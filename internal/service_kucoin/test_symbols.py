@@ -0,0 +1,44 @@
+from .symbols import SymbolTable, count_decimals
+
+SYMBOLS = [
+    {"symbol": "BTC-USDT", "baseCurrency": "BTC", "quoteCurrency": "USDT", "baseIncrement": "0.00000001",
+     "priceIncrement": "0.1", "quoteIncrement": "0.000001", "baseMinSize": "0.00001", "quoteMinSize": "0.1",
+     "minFunds": "0.1", "enableTrading": True},
+    {"symbol": "SHIB-USDT", "baseIncrement": "1", "priceIncrement": "0.00000000010", "quoteIncrement": "0.0001"},
+]
+
+
+class FakeClient:
+    def __init__(self):
+        self.calls = 0
+
+    def get_symbols(self):
+        self.calls += 1
+        return SYMBOLS
+
+
+class TestSymbolTable:
+    def test_count_decimals(self):
+        assert count_decimals("0.0001") == 4
+        assert count_decimals("0.10") == 1
+        assert count_decimals("1") == 0
+        assert count_decimals(None) == 4
+
+    def test_price_uses_price_increment(self):
+        table = SymbolTable.from_kucoin(SYMBOLS)
+        assert table.price_decimals("BTC-USDT") == 1
+        assert table.base_decimals("BTC-USDT") == 8
+        assert table.price_decimals("SHIB-USDT") == 10
+        assert table.base_decimals("SHIB-USDT") == 0
+        assert table.price_decimals("MISSING-USDT") == 4
+
+    def test_load_reuses_tmp_until_expired(self, tmp_path):
+        client = FakeClient()
+        path = str(tmp_path / "symbols.json")
+        SymbolTable.load(client, path)
+        table = SymbolTable.load(client, path)
+        assert client.calls == 1
+        assert table.get("BTC-USDT").base_min_size == 0.00001
+
+        SymbolTable.load(client, path, ttl_seconds=-1)
+        assert client.calls == 2
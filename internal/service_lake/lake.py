@@ -0,0 +1,195 @@
+"""
+lake.py
+Parquet mirror of the harvest table, partitioned by slug and month:
+
+    {root}/slug={slug}/month={YYYY-MM}/part-{ns}-{uuid}.parquet     written per harvested batch
+    {root}/slug={slug}/month={YYYY-MM}/compacted-{ns}.parquet        one per partition after `compact`
+
+Metric columns are float64 and `datetime_metric` keeps the harvest table's string format. Slugs live in the
+partition path and are read back dictionary encoded. The root may be a local path or any URI pyarrow
+understands, e.g. s3://bucket/prefix?endpoint_override=localhost:9000&scheme=http for an S3 stand-in.
+"""
+import time
+import uuid
+from typing import Dict, Iterable, List, Optional, Union
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+KEY_COLUMNS = ["slug", "datetime_metric"]
+PARTITIONING = ds.partitioning(
+    pa.schema([("slug", pa.dictionary(pa.int32(), pa.string())), ("month", pa.string())]),
+    dictionaries="infer", flavor="hive"
+)
+
+
+def rows_to_frame(rows: Union[pd.DataFrame, Iterable[Dict]]) -> pd.DataFrame:
+    """
+    Harvest rows (the string dicts the executor writes to Dynamo, or a frame) with float metric columns
+    :param rows:
+    :return:
+    """
+    df = rows.copy() if isinstance(rows, pd.DataFrame) else pd.DataFrame(list(rows))
+    for col in df.columns:
+        if col in KEY_COLUMNS or "datetime" in col:
+            df[col] = df[col].astype(str)
+        else:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype("float64")
+    return df
+
+
+class HarvestLake:
+    def __init__(self, uri: str, filesystem: pafs.FileSystem = None, compression: str = "zstd"):
+        """
+        :param uri: local directory or filesystem URI
+        :param filesystem: use this filesystem with `uri` as the root path
+        :param compression:
+        """
+        if filesystem is None:
+            filesystem, uri = pafs.FileSystem.from_uri(uri)
+            if isinstance(filesystem, pafs.LocalFileSystem):
+                filesystem = pafs.LocalFileSystem(use_mmap=True)  # Reads map the files instead of copying them
+        self.fs = filesystem
+        self.root = uri.rstrip("/")
+        self.compression = compression
+
+    def partition_dir(self, slug: str, month: str) -> str:
+        return f"{self.root}/slug={slug}/month={month}"
+
+    def write(self, rows: Union[pd.DataFrame, Iterable[Dict]]) -> List[str]:
+        """
+        Append harvested rows as one new file per (slug, month) partition
+        :param rows: must include slug and datetime_metric
+        :return:
+            Paths written
+        """
+        df = rows_to_frame(rows)
+        if df.empty:
+            return list()
+        df["month"] = df["datetime_metric"].str.slice(0, 7)
+        paths = list()
+        for (slug, month), part in df.groupby(["slug", "month"], sort=False):
+            directory = self.partition_dir(slug, month)
+            self.fs.create_dir(directory, recursive=True)
+            path = f"{directory}/part-{time.time_ns()}-{uuid.uuid4().hex[:8]}.parquet"
+            table = pa.Table.from_pandas(
+                part.drop(columns=["slug", "month"]).sort_values("datetime_metric"), preserve_index=False
+            )
+            pq.write_table(table, path, filesystem=self.fs, compression=self.compression)
+            paths.append(path)
+        return paths
+
+    def partition_files(self, slug: str = None) -> Dict[str, List[str]]:
+        """
+        Parquet files per partition directory, in write order (compacted file first, then parts by time)
+        :param slug: limit to one slug
+        :return:
+        """
+        base = f"{self.root}/slug={slug}" if slug else self.root
+        try:
+            infos = self.fs.get_file_info(pafs.FileSelector(base, recursive=True, allow_not_found=True))
+        except FileNotFoundError:
+            return dict()
+        partitions = dict()
+        for info in infos:
+            if info.type == pafs.FileType.File and info.path.endswith(".parquet"):
+                directory, name = info.path.rsplit("/", 1)
+                partitions.setdefault(directory, list()).append(name)
+        return {d: [f"{d}/{name}" for name in sorted(names)] for d, names in partitions.items()}
+
+    def compact(self, slug: str = None, row_group_size: int = 64 * 1024) -> Dict[str, int]:
+        """
+        Merge every partition that has more than one file into a single file sorted by datetime_metric,
+        keeping the newest copy of each row. The new file is written before the old ones are deleted,
+        and readers drop duplicates, so an interrupted compaction loses nothing.
+        :param slug: limit to one slug
+        :param row_group_size:
+        :return:
+            {"partitions": compacted partitions, "files_removed": int, "rows": rows written}
+        """
+        stats = {"partitions": 0, "files_removed": 0, "rows": 0}
+        for directory, files in self.partition_files(slug).items():
+            if len(files) < 2:
+                continue
+            table = pa.concat_tables(
+                [pq.read_table(f, filesystem=self.fs) for f in files], promote_options="default"
+            )
+            df = table.to_pandas().drop_duplicates(subset="datetime_metric", keep="last").sort_values("datetime_metric")
+            path = f"{directory}/compacted-{time.time_ns()}.parquet"
+            pq.write_table(
+                pa.Table.from_pandas(df, preserve_index=False), path, filesystem=self.fs,
+                compression=self.compression, row_group_size=row_group_size
+            )
+            for f in files:
+                self.fs.delete_file(f)
+            stats["partitions"] += 1
+            stats["files_removed"] += len(files)
+            stats["rows"] += len(df)
+        return stats
+
+    def dataset(self, slugs: Optional[Iterable[str]] = None) -> Optional[ds.Dataset]:
+        """
+        Files are discovered in path order: within a partition the compacted file precedes newer parts,
+        which is what keep="last" in `read` relies on
+        :param slugs: only list the directories of these slugs. All slugs when None
+        :return:
+            None when nothing has been written for the slugs
+        """
+        kwargs = {"format": "parquet", "filesystem": self.fs, "partitioning": PARTITIONING}
+        if slugs is None:
+            try:
+                return ds.dataset(self.root, **kwargs)
+            except FileNotFoundError:
+                return None
+        children = list()
+        for slug in slugs:
+            try:
+                children.append(ds.dataset(f"{self.root}/slug={slug}", partition_base_dir=self.root, **kwargs))
+            except FileNotFoundError:
+                continue  # Slug not in the lake
+        return ds.dataset(children) if children else None
+
+    def read(self, slugs: Optional[Iterable[str]] = None, date_from: str = None, date_to: str = None,
+             columns: List[str] = None) -> pd.DataFrame:
+        """
+        Harvest rows for the given slugs and inclusive date range. Only the directories of the requested slugs
+        are listed, the month filter prunes partitions before any file is opened and the datetime_metric filter
+        is pushed down to the Parquet row groups.
+        :param slugs: all slugs when None
+        :param date_from: "%Y-%m-%d" or "%Y-%m-%dT%H:%M:%SZ"
+        :param date_to:
+        :param columns: metric columns, all when None. slug and datetime_metric are always included
+        :return:
+            Frame sorted by slug and datetime_metric, like `backtest.load_harvest`
+        """
+        predicate = None
+
+        def both(expression):
+            return expression if predicate is None else predicate & expression
+
+        if slugs is not None:
+            slugs = list(slugs)
+            predicate = both(ds.field("slug").isin(slugs))
+        if date_from:
+            predicate = both(ds.field("month") >= date_from[:7])
+            predicate = both(ds.field("datetime_metric") >= date_from)
+        if date_to:
+            if len(date_to) == 10:
+                date_to = f"{date_to}T23:59:59Z"
+            predicate = both(ds.field("month") <= date_to[:7])
+            predicate = both(ds.field("datetime_metric") <= date_to)
+
+        dataset = self.dataset(None if slugs is None else list(slugs))
+        if dataset is None:
+            return pd.DataFrame(columns=KEY_COLUMNS)
+        if columns is None:
+            columns = [name for name in dataset.schema.names if name != "month"]
+        columns = KEY_COLUMNS + [c for c in columns if c not in KEY_COLUMNS]
+        df = dataset.to_table(columns=columns, filter=predicate).to_pandas()
+        df["slug"] = df["slug"].astype(str)
+        return df.drop_duplicates(subset=KEY_COLUMNS, keep="last") \
+            .sort_values(KEY_COLUMNS) \
+            .reset_index(drop=True)
@@ -0,0 +1,41 @@
+import pyarrow.fs as pafs
+
+from .lake import HarvestLake
+
+
+def rows(slug, days, price):
+    return [
+        {"slug": slug, "datetime_metric": f"2021-{m:02d}-{d:02d}T00:00:00Z", "price_usd": str(price), "volume_usd": "nan"}
+        for m, d in days
+    ]
+
+
+class TestHarvestLake:
+    def check_lake(self, lake: HarvestLake):
+        lake.write(rows("bitcoin", [(1, 30), (1, 31), (2, 1)], 1.0) + rows("ethereum", [(1, 31)], 2.0))
+        lake.write(rows("bitcoin", [(2, 1), (2, 2)], 3.0))  # Overlaps the first write on 2021-02-01
+
+        df = lake.read()
+        assert list(df["slug"]) == ["bitcoin"] * 4 + ["ethereum"]
+        assert str(df["price_usd"].dtype) == "float64"
+        assert df.set_index(["slug", "datetime_metric"]).loc[("bitcoin", "2021-02-01T00:00:00Z"), "price_usd"] == 3.0
+
+        assert list(lake.read(["ethereum", "dogecoin"])["slug"]) == ["ethereum"]  # Unknown slugs are skipped
+        df = lake.read(["bitcoin"], date_from="2021-01-31", date_to="2021-02-01", columns=["price_usd"])
+        assert list(df.columns) == ["slug", "datetime_metric", "price_usd"]
+        assert list(df["price_usd"]) == [1.0, 3.0]
+
+        stats = lake.compact()
+        assert stats == {"partitions": 1, "files_removed": 2, "rows": 2}  # Only bitcoin/2021-02 had two files
+        assert all(len(files) == 1 for files in lake.partition_files().values())
+        assert len(lake.read()) == 5
+
+    def test_local(self, tmp_path):
+        self.check_lake(HarvestLake(str(tmp_path)))
+
+    def test_object_store(self):
+        # In-memory filesystem standing in for S3: no directories, paths are object keys
+        self.check_lake(HarvestLake("bucket/lake", filesystem=pafs._MockFileSystem()))
+
+    def test_empty(self, tmp_path):
+        assert HarvestLake(str(tmp_path / "missing")).read().empty
@@ -0,0 +1,57 @@
+"""
+signal_monitor.py
+Orders tracked by the Monitor Service. One SQS message carries many orders as a JSON body, so a single
+invocation can follow hundreds of open orders.
+"""
+import json
+import uuid
+from typing import Dict, List, Tuple
+
+
+class MonitoredOrder:
+    """
+    An order the monitor is following and the last state it recorded for it
+    """
+
+    def __init__(self, order_id: str, slug: str, strategy_guid: str, state: str = "active", attempts: int = 0):
+        self.order_id = order_id
+        self.slug = slug
+        self.strategy_guid = strategy_guid
+        self.state = state
+        self.attempts = attempts
+
+    def __repr__(self):
+        return json.dumps(self.__dict__, indent=4)
+
+    def to_dict(self):
+        return self.__dict__
+
+    @classmethod
+    def from_record(cls, record: Dict) -> List["MonitoredOrder"]:
+        """
+        Orders in an SQS record created by `create_monitor_messages`
+        :param record:
+        :return:
+        """
+        return [cls(**order) for order in json.loads(record["body"])["orders"]]
+
+
+def create_monitor_messages(orders: List[Tuple[int, MonitoredOrder]], max_orders: int = 100) -> List[Dict]:
+    """
+    Pack orders into as few SQS messages as possible. Orders are sorted by their requested delay and
+    each message is delayed by the shortest delay among its orders, so no order is checked later than asked.
+    :param orders: [(delay_seconds, order)]. SQS caps the delay at 900 seconds
+    :param max_orders: orders per message
+    :return:
+        SendMessageBatch entries
+    """
+    orders = sorted(orders, key=lambda pair: pair[0])
+    messages = list()
+    for start in range(0, len(orders), max_orders):
+        chunk = orders[start:start + max_orders]
+        messages.append({
+            "Id": str(uuid.uuid4()),
+            "DelaySeconds": max(0, min(900, int(chunk[0][0]))),
+            "MessageBody": json.dumps({"orders": [order.to_dict() for _, order in chunk]})
+        })
+    return messages
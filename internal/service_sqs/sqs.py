@@ -1,8 +1,13 @@
 """
 sqs.py
 """
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Dict, List, Iterable, Tuple
+
 import boto3
-from typing import Dict, List
 
 
 class ServiceSQS:
@@ -24,15 +29,62 @@ class ServiceSQS:
         )
         return response["MessageId"]
 
-    def send_in_batches(self, messages: List[Dict]) -> None:
+    def send_in_batches(self, messages: Iterable[Dict], max_workers: int = 4, max_retries: int = 3) -> Dict[str, int]:
+        """
+        Send messages with SendMessageBatch, 10 per call. Messages may be any iterable; batches are
+        submitted to a bounded thread pool as they are drawn, so a generator starts sending immediately.
+        Messages without an "Id" get one assigned. Per-message DelaySeconds are preserved.
+        Only the entries reported as Failed (and not a sender fault) are retried.
+        :param messages: SendMessageBatch entries without the QueueUrl
+        :param max_workers: number of concurrent batch calls
+        :param max_retries: retries for Failed entries of a batch
+        :return:
+            {"batches": int, "sent": int, "failed": int}
+        """
         max_batch_size = 10
-        for i in range(0, len(messages), max_batch_size):
-            batch = messages[i: i + max_batch_size]
-            self.client.send_message_batch(
+        messages = iter(messages)
+        results = list()
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            while True:
+                batch = list(islice(messages, max_batch_size))
+                if not batch:
+                    break
+                entries = [{"Id": str(i), **message} for i, message in enumerate(batch)]
+                results.append(pool.submit(self._send_batch, entries, max_retries))
+        results = [result.result() for result in results]
+        return {
+            "batches": len(results),
+            "sent": sum(sent for sent, _ in results),
+            "failed": sum(failed for _, failed in results)
+        }
+
+    def _send_batch(self, entries: List[Dict], max_retries: int) -> Tuple[int, int]:
+        """
+        :param entries:
+        :param max_retries:
+        :return:
+            (sent, failed). failed counts sender faults from every attempt plus entries still failing at the end
+        """
+        sent = 0
+        rejected = 0
+        for attempt in range(max_retries + 1):
+            if attempt:
+                time.sleep(random.uniform(0, 0.1 * 2 ** attempt))
+            response = self.client.send_message_batch(
                 QueueUrl=self.queue_url,
-                Entries=batch
+                Entries=entries
             )
-        return
+            sent += len(response.get("Successful", []))
+            failed = response.get("Failed", [])
+            retry_ids = {f["Id"] for f in failed if not f.get("SenderFault")}
+            if len(retry_ids) < len(failed):
+                rejected += len(failed) - len(retry_ids)  # Not retried: the same entry would fail again
+                print(f"SQS {self.queue_name}: sender fault {[f for f in failed if f.get('SenderFault')]}")
+            entries = [entry for entry in entries if entry["Id"] in retry_ids]
+            if not entries:
+                return sent, rejected
+        print(f"SQS {self.queue_name}: {len(entries)} entries failed after {max_retries} retries")
+        return sent, rejected + len(entries)
 
     def delete_message(self, receipt_handle: str):
         self.client.delete_message(
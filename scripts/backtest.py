@@ -0,0 +1,39 @@
+"""
+backtest.py
+Run the strategy over exported harvest data (Parquet or CSV) with the thresholds from serverless.yml
+or overrides given on the command line.
+"""
+import json
+
+from configargparse import ArgParser
+
+from cmd.strategy.backtest import backtest, load_harvest
+from cmd.strategy.indicators import StrategyParams
+
+parser = ArgParser(default_config_files=[], auto_env_var_prefix="")
+parser.add_argument("--data", type=str, required=True, help="Parquet/CSV file or directory of harvest rows")
+parser.add_argument("--date-from", type=str, default=None)
+parser.add_argument("--date-to", type=str, default=None)
+parser.add_argument("--balance", type=float, default=1000.0)
+parser.add_argument("--fee-rate", type=float, default=0.001)
+parser.add_argument("--strategy-max-trades", type=int, default=7)
+parser.add_argument("--strategy-daa-enter-lower", type=float, default=-0.02)
+parser.add_argument("--strategy-daa-enter-upper", type=float, default=0.5)
+parser.add_argument("--strategy-daa-exit", type=float, default=-0.46)
+parser.add_argument("--strategy-sma-lookback", type=int, default=2)
+parser.add_argument("--strategy-volatility-enter-lower", type=float, default=0.099)
+parser.add_argument("--strategy-volatility-enter-upper", type=float, default=1.25)
+parser.add_argument("--strategy-volatility-exit", type=float, default=1.7)
+parser.add_argument("--trades-csv", type=str, default=None, help="Write the trade list to this path")
+
+if __name__ == "__main__":
+    args = parser.parse_known_args()[0]
+    params = StrategyParams.from_config(args)
+    result = backtest(
+        load_harvest(args.data), params,
+        balance=args.balance, trades_max=args.strategy_max_trades, fee_rate=args.fee_rate,
+        date_from=args.date_from, date_to=args.date_to
+    )
+    print(json.dumps(result.summary(), indent=4))
+    if args.trades_csv:
+        result.trades.to_csv(args.trades_csv, index=False)
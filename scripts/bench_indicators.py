@@ -0,0 +1,36 @@
+"""
+bench_indicators.py
+Micro-benchmark of the SMA positive-trend window: the original rolling.apply callback against the
+vectorized rolling min, on synthetic random-walk series.
+"""
+import timeit
+
+import numpy as np
+import pandas as pd
+from configargparse import ArgParser
+
+from cmd.strategy.indicators import positive_trend, positive_trend_reference
+
+parser = ArgParser(default_config_files=[], auto_env_var_prefix="")
+parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1_000, 10_000, 100_000])
+parser.add_argument("--lookback", type=int, default=2)
+parser.add_argument("--repeat", type=int, default=3)
+
+if __name__ == "__main__":
+    args = parser.parse_known_args()[0]
+    rng = np.random.default_rng(0)
+    print(f"{'rows':>8} {'apply (s)':>12} {'vectorized (s)':>15} {'speedup':>9}")
+    for rows in args.sizes:
+        price = pd.Series(100 * np.exp(np.cumsum(rng.normal(0, 0.03, rows))))
+        sma_derivative = price.rolling(30).mean().diff()
+
+        assert positive_trend(sma_derivative, args.lookback).equals(
+            positive_trend_reference(sma_derivative, args.lookback)
+        )
+        t_apply = min(timeit.repeat(
+            lambda: positive_trend_reference(sma_derivative, args.lookback), number=1, repeat=args.repeat
+        ))
+        t_vector = min(timeit.repeat(
+            lambda: positive_trend(sma_derivative, args.lookback), number=1, repeat=args.repeat
+        ))
+        print(f"{rows:>8} {t_apply:>12.5f} {t_vector:>15.5f} {t_apply / t_vector:>8.1f}x")
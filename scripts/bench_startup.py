@@ -0,0 +1,61 @@
+"""
+bench_startup.py
+Cold import cost of every Lambda handler module. Each module is imported in a fresh interpreter, so the
+numbers include dependency imports and anything the module does at import time. Missing env vars are
+filled with placeholders; no AWS or KuCoin call should be needed to import a handler.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from configargparse import ArgParser
+
+HANDLERS = [
+    "cmd.discovery.handler",
+    "cmd.harvest.primer",
+    "cmd.harvest.executor",
+    "cmd.strategy.strategy",
+    "cmd.trade.trade_buy",
+    "cmd.trade.trade_sell",
+    "cmd.monitor.monitor",
+    "cmd.account_log.account_log",
+]
+
+PLACEHOLDER_ENV = {
+    "AWS_DEFAULT_REGION": "ca-central-1",
+    "KUCOIN_URL_ALLTICKERS": "https://api.kucoin.com/api/v1/market/allTickers",
+    "SANTIMENT_KEY": "bench", "KUCOIN_KEY": "bench", "KUCOIN_SECRET": "bench", "KUCOIN_API_PASSPHRASE": "bench",
+    "ENV": "bench",
+}
+
+PROBE = """
+import time, json
+start = time.perf_counter()
+import {module}
+print(json.dumps({{"seconds": time.perf_counter() - start}}))
+"""
+
+parser = ArgParser(default_config_files=[], auto_env_var_prefix="")
+parser.add_argument("--repeat", type=int, default=5)
+parser.add_argument("--modules", type=str, nargs="+", default=HANDLERS)
+
+if __name__ == "__main__":
+    args = parser.parse_known_args()[0]
+    env = {**PLACEHOLDER_ENV, **os.environ}
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    print(f"{'module':<32} {'median (ms)':>12} {'min (ms)':>10}")
+    for module in args.modules:
+        samples = list()
+        for _ in range(args.repeat):
+            proc = subprocess.run(
+                [sys.executable, "-c", PROBE.format(module=module)],
+                cwd=root, env=env, capture_output=True, text=True
+            )
+            if proc.returncode != 0:
+                print(f"{module:<32} failed: {proc.stderr.strip().splitlines()[-1]}")
+                break
+            samples.append(json.loads(proc.stdout.strip().splitlines()[-1])["seconds"] * 1000)
+        if samples:
+            print(f"{module:<32} {statistics.median(samples):>12.1f} {min(samples):>10.1f}")
@@ -0,0 +1,84 @@
+"""
+harvest_backfill.py
+Backfill the harvest table with long history, e.g. years of data for the backtests (see `cmd.harvest.backfill`).
+
+    python -m scripts.harvest_backfill --date-from 2019-01-01 --slugs bitcoin,ethereum --checkpoint backfill.json
+    python -m scripts.harvest_backfill --date-from 2019-01-01 --slugs bitcoin --record santiment.json --dry-run
+    python -m scripts.harvest_backfill --date-from 2019-01-01 --slugs bitcoin --fixture santiment.json --dry-run
+
+Re-running with the same checkpoint resumes; re-running without one rewrites the same items. Every slug
+that received rows is stamped on --table-discovery, so the strategy cache reloads its series.
+"""
+import datetime
+
+import san
+from configargparse import ArgParser
+
+from cmd.harvest.backfill import Backfill, Checkpoint, SantimentFixture, create_engine
+from internal import DYNAMO
+from internal.service_dynamo.codec import ColumnarCodec, HARVEST_METRICS
+
+parser = ArgParser(default_config_files=[], auto_env_var_prefix="")
+parser.add_argument("--date-from", type=str, required=True)
+parser.add_argument("--date-to", type=str, default=datetime.datetime.utcnow().strftime("%Y-%m-%d"))
+parser.add_argument("--slugs", type=str, default=None, help="Comma separated. Every slug of --table-discovery when not given")
+parser.add_argument("--chunk-days", type=int, default=90, help="Days per Santiment query")
+parser.add_argument("--slugs-per-call", type=int, default=5, help="Chunks packed into one Santiment call")
+parser.add_argument("--max-workers", type=int, default=2, help="Santiment calls in flight")
+parser.add_argument("--rate", type=float, default=1.0, help="Santiment calls per second")
+parser.add_argument("--checkpoint", type=str, default=None, help="JSON file of completed chunks")
+parser.add_argument("--fixture", type=str, default=None, help="Replay recorded Santiment responses from this file")
+parser.add_argument("--record", type=str, default=None, help="Record Santiment responses to this file")
+parser.add_argument("--santiment-key", type=str, default=None)
+parser.add_argument("--table-discovery", type=str, default=None)
+parser.add_argument("--table-harvest", type=str, default=None)
+parser.add_argument("--harvest-lake-uri", type=str, default=None, help="Also write to the Parquet lake")
+parser.add_argument("--harvest-float32", action="store_true")
+parser.add_argument("--write-workers", type=int, default=8, help="Concurrent BatchWriteItem calls")
+parser.add_argument("--dry-run", action="store_true", help="Fetch without writing to Dynamo")
+parser.add_argument("--no-wait", action="store_true", help="Stop when rate limited instead of waiting")
+
+if __name__ == "__main__":
+    args = parser.parse_known_args()[0]
+    if args.santiment_key:
+        san.ApiConfig.api_key = args.santiment_key
+
+    fixture = SantimentFixture.load(args.fixture) if args.fixture else None
+    engine = create_engine(
+        rate=args.rate, fixture=fixture, slugs_per_call=args.slugs_per_call, max_workers=args.max_workers
+    )
+    recording = None
+    if args.record:
+        recording = SantimentFixture()
+        engine.execute = recording.recorder(engine.execute)
+
+    if args.slugs:
+        slugs = args.slugs.split(",")
+    else:
+        slugs = [item.slug for item in DYNAMO.discovery_scan_iter(args.table_discovery, total_segments=4)]
+
+    lake = None
+    if args.harvest_lake_uri:
+        from internal.service_lake.lake import HarvestLake
+        lake = HarvestLake(args.harvest_lake_uri)
+    codec = ColumnarCodec(HARVEST_METRICS, float32=args.harvest_float32)
+
+    def write(samples) -> bool:
+        stored = True
+        if not args.dry_run:
+            report = DYNAMO.batch_write_items(args.table_harvest, codec.items_from_frame(samples), max_workers=args.write_workers)
+            stored = report["unprocessed"] == 0
+        if lake is not None:
+            lake.write(samples)
+        return stored
+
+    backfill = Backfill(engine, write, Checkpoint(args.checkpoint), wait_on_rate_limit=not args.no_wait)
+    try:
+        print(backfill.run(slugs, args.date_from, args.date_to, chunk_days=args.chunk_days), engine.stats)
+    finally:
+        if recording is not None:
+            recording.save(args.record)
+        if not args.dry_run and args.table_discovery:
+            stamp = datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
+            for slug in sorted(backfill.slugs_written):
+                DYNAMO.discovery_set_backfilled(args.table_discovery, slug, stamp)
@@ -0,0 +1,38 @@
+"""
+lake_export.py
+Maintenance for the harvest lake (`internal.service_lake`):
+    * export: copy the whole harvest table into the lake, e.g. to seed it before the executor mirror is enabled
+    * compact: merge the small per-batch files of each slug/month partition into one file
+"""
+from configargparse import ArgParser
+
+from internal.service_dynamo.codec import HARVEST_CODEC
+from internal.service_lake.lake import HarvestLake
+
+parser = ArgParser(default_config_files=[], auto_env_var_prefix="")
+parser.add_argument("command", choices=["export", "compact"])
+parser.add_argument("--harvest-lake-uri", type=str, required=True, help="Local directory or URI, e.g. s3://bucket/lake")
+parser.add_argument("--table-harvest", type=str, default=None, help="Harvest table to export")
+parser.add_argument("--slug", type=str, default=None, help="Compact a single slug")
+parser.add_argument("--chunk-size", type=int, default=50000, help="Rows per lake write when exporting")
+parser.add_argument("--total-segments", type=int, default=4, help="Parallel scan segments when exporting")
+
+if __name__ == "__main__":
+    args = parser.parse_known_args()[0]
+    lake = HarvestLake(args.harvest_lake_uri)
+    if args.command == "compact":
+        print(lake.compact(args.slug))
+    else:
+        from internal import DYNAMO
+        rows = list()
+        exported = 0
+        for item in DYNAMO.scan_iter(args.table_harvest, total_segments=args.total_segments):
+            rows.append(item)
+            if len(rows) >= args.chunk_size:
+                lake.write(HARVEST_CODEC.frame_from_items(rows))
+                exported += len(rows)
+                rows = list()
+        if rows:
+            lake.write(HARVEST_CODEC.frame_from_items(rows))
+            exported += len(rows)
+        print(f"Exported {exported} rows. Compacting: {lake.compact()}")
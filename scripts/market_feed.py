@@ -0,0 +1,41 @@
+"""
+market_feed.py
+Long-running process that keeps the market data cache warm from KuCoin's public WebSocket ticker channel.
+The cache is written to a local file every few seconds and to the DynamoDB account table on a slower
+interval, where the trade Lambdas pick it up.
+"""
+import asyncio
+import time
+
+from configargparse import ArgParser
+
+from internal.service_kucoin.market import MarketCache, MarketFeed, SNAPSHOT_PATH
+
+parser = ArgParser(default_config_files=[], auto_env_var_prefix="")
+parser.add_argument("--snapshot-path", type=str, default=SNAPSHOT_PATH)
+parser.add_argument("--snapshot-interval", type=float, default=5.0, help="Seconds between local file snapshots")
+parser.add_argument("--table-account", type=str, default=None, help="Also write snapshots to this DynamoDB table")
+parser.add_argument("--dynamo-interval", type=float, default=30.0, help="Seconds between DynamoDB snapshots")
+parser.add_argument("--url", type=str, default=None, help="WebSocket URL. Negotiated with KuCoin when not given")
+
+if __name__ == "__main__":
+    args = parser.parse_known_args()[0]
+    dynamo = None
+    if args.table_account:
+        from internal import DYNAMO
+        dynamo = DYNAMO
+    last_dynamo = [0.0]
+
+    def on_snapshot(cache: MarketCache):
+        cache.dump(args.snapshot_path)
+        if dynamo is not None and time.monotonic() - last_dynamo[0] >= args.dynamo_interval:
+            dynamo.account_put_market_snapshot(args.table_account, cache.to_bytes())
+            last_dynamo[0] = time.monotonic()
+
+    cache = MarketCache.read(args.snapshot_path) or MarketCache()
+    feed = MarketFeed(cache, url=args.url, on_snapshot=on_snapshot, snapshot_interval=args.snapshot_interval)
+    try:
+        asyncio.run(feed.run())
+    except KeyboardInterrupt:
+        pass
+    print(feed.stats)
@@ -0,0 +1,51 @@
+"""
+sweep.py
+Grid search of the STRATEGY_* thresholds over exported harvest data. Each range is "start:stop:step"
+(stop inclusive) or a comma separated list. Re-running with the same --results file resumes the sweep.
+"""
+from configargparse import ArgParser
+import numpy as np
+
+from cmd.strategy.backtest import load_harvest
+from cmd.strategy.sweep import sweep
+
+parser = ArgParser(default_config_files=[], auto_env_var_prefix="")
+parser.add_argument("--data", type=str, required=True, help="Parquet/CSV file or directory of harvest rows")
+parser.add_argument("--results", type=str, default="sweep_results.csv")
+parser.add_argument("--workers", type=int, default=None)
+parser.add_argument("--balance", type=float, default=1000.0)
+parser.add_argument("--fee-rate", type=float, default=0.001)
+parser.add_argument("--strategy-max-trades", type=int, default=7)
+parser.add_argument("--rank-by", type=str, default="return_pct")
+parser.add_argument("--daa-enter-lower", type=str, default="-0.1:0.0:0.02")
+parser.add_argument("--daa-enter-upper", type=str, default="0.3:0.7:0.1")
+parser.add_argument("--daa-exit", type=str, default="-0.6:-0.3:0.08")
+parser.add_argument("--sma-lookback", type=str, default="1:4:1")
+parser.add_argument("--volatility-enter-lower", type=str, default="0.05:0.15:0.025")
+parser.add_argument("--volatility-enter-upper", type=str, default="1.25")
+parser.add_argument("--volatility-exit", type=str, default="1.3:2.1:0.2")
+
+
+def parse_range(value: str):
+    if ":" in value:
+        start, stop, step = (float(v) for v in value.split(":"))
+        return np.round(np.arange(start, stop + step / 2, step), 10).tolist()
+    return [float(v) for v in value.split(",")]
+
+
+if __name__ == "__main__":
+    args = parser.parse_known_args()[0]
+    ranges = {
+        "daa_enter_lower": parse_range(args.daa_enter_lower),
+        "daa_enter_upper": parse_range(args.daa_enter_upper),
+        "daa_exit": parse_range(args.daa_exit),
+        "sma_lookback": [int(v) for v in parse_range(args.sma_lookback)],
+        "volatility_enter_lower": parse_range(args.volatility_enter_lower),
+        "volatility_enter_upper": parse_range(args.volatility_enter_upper),
+        "volatility_exit": parse_range(args.volatility_exit),
+    }
+    ranked = sweep(
+        load_harvest(args.data), ranges, args.results, max_workers=args.workers,
+        balance=args.balance, trades_max=args.strategy_max_trades, fee_rate=args.fee_rate, rank_by=args.rank_by
+    )
+    print(ranked.head(20).to_string())